@@ -0,0 +1,210 @@
+# Times the importer on the synthetic corpus from generate_corpus.py and
+# saves the results as JSON. Parsing (TSShape.read) and the builder phases are
+# timed separately; the Blender part of the builder is only timed when this
+# runs inside Blender.
+#
+#   python benchmarks/benchmark.py [options]
+#   blender --background --python benchmarks/benchmark.py -- [options]
+#
+# Pass --compare with an earlier results file to list the phases which got
+# slower than --threshold, the exit status is 1 when there are any.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+if __package__ in (None, ""):
+    # run as a script, make the add-on package and the generator importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from io_scene_dtst3d.shapecache import PARSER_VERSION
+from io_scene_dtst3d.tsmesh import TSMesh, weld_vertices
+from io_scene_dtst3d.tsshape import TSShape
+import generate_corpus
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "dtst3d_benchmark_corpus")
+
+
+def time_runs(function, repeat: int) -> dict:
+    """run function repeat times, returns the fastest and median run in seconds"""
+    times = []
+    for _ in range(repeat):
+        time1 = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - time1)
+    return {"min": min(times), "median": statistics.median(times), "runs": repeat}
+
+
+def get_imported_meshes(shape):
+    """the meshes the importer builds, the highest detail level of each object"""
+    meshes = []
+    for shape_object in shape.objects:
+        if shape_object.num_meshes > 0:
+            mesh = shape.meshes[shape_object.start_mesh_index]
+            if isinstance(mesh, TSMesh):
+                meshes.append(mesh)
+    return meshes
+
+
+def benchmark_shape(path: str, repeat: int, bpy=None) -> dict:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    def read():
+        TSShape().read(io.BytesIO(data))
+
+    def read_from_path():
+        TSShape().read_from_path(path)
+
+    shape = TSShape()
+    shape.read(io.BytesIO(data))
+    meshes = get_imported_meshes(shape)
+
+    def triangles():
+        for mesh in meshes:
+            mesh.get_triangles()
+
+    def weld():
+        for mesh in meshes:
+            weld_vertices(mesh.vertices, mesh.normals)
+
+    phases = {
+        "read": time_runs(read, repeat),
+        "read_from_path": time_runs(read_from_path, repeat),
+        "triangles": time_runs(triangles, repeat),
+        "weld": time_runs(weld, repeat),
+    }
+
+    if bpy is not None:
+        from io_scene_dtst3d import import_dts
+
+        def build():
+            import_dts.create_shape_objects(shape)
+
+        # start every run from an empty file, and keep the importer quiet
+        build_times = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(repeat):
+                bpy.ops.wm.read_homefile(use_empty=True)
+                build_times.append(time_runs(build, 1)["min"])
+        phases["build"] = {"min": min(build_times), "median": statistics.median(build_times), "runs": repeat}
+
+    # throughput of the whole file for parsing, and of the imported meshes for the builder
+    total_verts = sum(len(mesh.vertices) for mesh in shape.meshes if isinstance(mesh, TSMesh))
+    imported_verts = sum(len(mesh.vertices) for mesh in meshes)
+    for name, phase in phases.items():
+        verts = total_verts if name.startswith("read") else imported_verts
+        phase["verts_per_sec"] = verts / phase["min"] if phase["min"] > 0 else 0.0
+        phase["mb_per_sec"] = len(data) / (1024 * 1024) / phase["min"] if phase["min"] > 0 else 0.0
+
+    return {
+        "size": len(data),
+        "verts": total_verts,
+        "imported_verts": imported_verts,
+        "meshes": len(shape.meshes),
+        "phases": phases,
+    }
+
+
+def get_environment(bpy=None) -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "blender": bpy.app.version_string if bpy is not None else None,
+        "parser_version": PARSER_VERSION,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare_results(results: dict, baseline: dict, threshold: float) -> list:
+    """phases which are slower than in baseline by more than threshold, as (shape, phase, ratio)"""
+    regressions = []
+    for name, result in results["shapes"].items():
+        base = baseline["shapes"].get(name)
+        if base is None:
+            continue
+        for phase_name, phase in result["phases"].items():
+            base_phase = base["phases"].get(phase_name)
+            if base_phase is None or base_phase["min"] <= 0:
+                continue
+            ratio = phase["min"] / base_phase["min"]
+            if ratio > 1.0 + threshold:
+                regressions.append((name, phase_name, ratio))
+    return regressions
+
+
+def load_corpus(directory: str, scale: float) -> dict:
+    """the corpus manifest, the corpus is (re)generated when missing or written with another scale"""
+    manifest_path = os.path.join(directory, generate_corpus.MANIFEST_NAME)
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest["scale"] == scale and all(os.path.isfile(os.path.join(directory, name)) for name in manifest["shapes"]):
+            return manifest
+
+    print(f"Generating corpus in {directory}")
+    return generate_corpus.generate_corpus(directory, scale)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Benchmark the DTS importer on a synthetic corpus")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR, help="corpus directory, generated when missing")
+    parser.add_argument("--scale", type=float, default=1.0, help="corpus scale, see generate_corpus.py")
+    parser.add_argument("--filter", default="", help="only benchmark shapes whose file name contains this")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="runs of each phase, the fastest counts")
+    parser.add_argument("-o", "--output", default="benchmark-results.json", help="results file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown reported as a regression, 0.1 is 10%%")
+    args = parser.parse_args(argv)
+
+    try:
+        import bpy
+    except ImportError:
+        bpy = None
+        print("Not running inside Blender, the build phase is skipped")
+
+    manifest = load_corpus(args.corpus, args.scale)
+    results = {"environment": get_environment(bpy), "scale": args.scale, "shapes": {}}
+
+    for name, spec in manifest["shapes"].items():
+        if args.filter not in name:
+            continue
+        result = benchmark_shape(os.path.join(args.corpus, name), args.repeat, bpy)
+        result["spec"] = spec
+        results["shapes"][name] = result
+
+        phases = result["phases"]
+        print(f"{name:24} " + "  ".join(f"{phase_name} {phase['min'] * 1000:8.2f} ms" for phase_name, phase in phases.items()) +
+              f"  read {phases['read']['verts_per_sec'] / 1e6:7.2f} Mverts/s {phases['read']['mb_per_sec']:8.1f} MB/s")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for name, phase_name, ratio in regressions:
+            print(f"Regression: {name} {phase_name} is {(ratio - 1.0) * 100:.1f}% slower")
+        if len(regressions) > 0:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold * 100:.0f}% against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+# Writes synthetic DTS shapes for benchmarking the importer. The shapes are
+# valid for TSShape: the 32, 16 and 8-bit buffers are built with
+# TSAllocWriter including guard words, followed by the sequences and the
+# material list.
+#
+#   python benchmarks/generate_corpus.py OUTPUT_DIR [--scale S] [options]
+#
+# Meshes are open cylinders made from a grid of vertices. The last column of
+# the grid repeats the first one with other texture coordinates, like a UV
+# seam, so vertex welding has work to do. The corpus covers every version
+# from 19 to 27 with strip and list primitives, static and skinned.
+import argparse
+import json
+import math
+import os
+import struct
+import sys
+
+import numpy as np
+
+if __package__ in (None, ""):
+    # run as a script, make the add-on package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from io_scene_dtst3d.tsalloc import TSAllocWriter
+from io_scene_dtst3d.tsmateriallist import TSMaterialFlags
+from io_scene_dtst3d.tsmesh import TSDrawPrimitiveType
+from io_scene_dtst3d.tsshape import MeshType, SequenceFlags
+
+VERSIONS = (19, 20, 21, 22, 23, 24, 25, 26, 27)
+MAX_SET_SIZE = 64 * 32 # TSIntegerSet holds 64 words of bits
+MAX_INDICES_16 = 0x7fff # primitive starts are signed 16-bit values before version 26
+
+MANIFEST_NAME = "corpus.json"
+
+
+class MeshGrid:
+    """an open cylinder of columns x rows vertices"""
+    def __init__(self, num_verts: int, offset):
+        self.columns = max(3, int(round(math.sqrt(num_verts))))
+        self.rows = max(2, num_verts // self.columns)
+
+        angles = np.arange(self.columns - 1, dtype=np.float64) * (2.0 * math.pi / (self.columns - 1))
+        ring = np.stack([np.cos(angles), np.sin(angles)], axis=1).astype(np.float32)
+        ring = np.concatenate([ring, ring[:1]]) # the seam repeats the first column exactly
+        heights = np.linspace(0.0, 2.0, self.rows, dtype=np.float32)
+
+        positions = np.zeros((self.rows, self.columns, 3), dtype=np.float32)
+        positions[:, :, :2] = ring
+        positions[:, :, 2] = heights[:, None]
+        self.normals = positions.copy().reshape(-1, 3)
+        self.normals[:, 2] = 0.0
+        positions += np.asarray(offset, dtype=np.float32)
+        self.positions = positions.reshape(-1, 3)
+
+        uvs = np.zeros((self.rows, self.columns, 2), dtype=np.float32)
+        uvs[:, :, 0] = np.linspace(0.0, 1.0, self.columns, dtype=np.float32)
+        uvs[:, :, 1] = np.linspace(0.0, 1.0, self.rows, dtype=np.float32)[:, None]
+        self.uvs = uvs.reshape(-1, 2)
+
+        # height along the cylinder, used for colors and skin weights
+        self.height = np.repeat(np.linspace(0.0, 1.0, self.rows, dtype=np.float32), self.columns)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def get_row_indices(self, strip: bool) -> np.ndarray:
+        """indices of each row of quads, one row per primitive"""
+        bottom = np.arange(self.rows - 1)[:, None] * self.columns + np.arange(self.columns)[None, :]
+        top = bottom + self.columns
+        if strip:
+            return np.stack([top, bottom], axis=2).reshape(self.rows - 1, -1)
+
+        a, b = bottom[:, :-1], bottom[:, 1:]
+        c, d = top[:, :-1], top[:, 1:]
+        return np.stack([a, c, b, b, c, d], axis=2).reshape(self.rows - 1, -1)
+
+
+def write_mesh(writer: TSAllocWriter, version: int, grid: MeshGrid, strip: bool, first_material: int,
+               num_materials: int, bones=None, vertex_offset: int = 0, vertex_size: int = 0):
+    """write a standard mesh, or a skinned mesh when a list of bone node indices is given
+    version 27 meshes place their vertices at vertex_offset of the shape's vertex buffer"""
+    num_verts = len(grid)
+    rows = grid.get_row_indices(strip)
+    indices = rows.reshape(-1)
+    if version <= 25 and (len(indices) > MAX_INDICES_16 or num_verts > 0xFFFF):
+        raise ValueError(f"Meshes of version {version} shapes are limited to {MAX_INDICES_16} indices, "
+                         f"use fewer vertices per mesh")
+
+    writer.write32(MeshType.StandardMeshType if bones is None else MeshType.SkinMeshType)
+    writer.write_guard()
+
+    writer.write32(1) # frames
+    writer.write32(1) # material frames
+    writer.write32(-1) # parent mesh
+
+    bounds_min = grid.positions.min(axis=0)
+    bounds_max = grid.positions.max(axis=0)
+    center = (bounds_min + bounds_max) * 0.5
+    writer.write_float_array(bounds_min)
+    writer.write_float_array(bounds_max)
+    writer.write_float_array(center)
+    writer.write_float(float(np.linalg.norm(grid.positions - center, axis=1).max()))
+    if version >= 27:
+        writer.write32_array([vertex_offset, num_verts, vertex_size])
+
+    writer.write32(num_verts)
+    writer.write_float_array(grid.positions)
+    writer.write32(num_verts)
+    writer.write_float_array(grid.uvs)
+
+    if version > 25:
+        writer.write32(num_verts)
+        writer.write_float_array(grid.uvs[:, ::-1])
+        writer.write32(num_verts)
+        shade = (grid.height * 255.0).astype(np.uint32)
+        writer.write32_array(shade | (shade << 8) | (0x80 << 16) | (0xFF << 24), '<u4')
+
+    writer.write_float_array(grid.normals)
+    if version > 21:
+        writer.write8_array(np.zeros(num_verts)) # encoded normals
+
+    # one primitive per row of quads
+    row_length = rows.shape[1]
+    prim_type = TSDrawPrimitiveType.Strip if strip else TSDrawPrimitiveType.Triangles
+    primitives = np.empty((len(rows), 3), dtype=np.int64)
+    primitives[:, 0] = np.arange(len(rows)) * row_length
+    primitives[:, 1] = row_length
+    primitives[:, 2] = ((first_material + np.arange(len(rows))) % num_materials) | prim_type | TSDrawPrimitiveType.Indexed
+
+    writer.write32(len(primitives))
+    if version > 25:
+        writer.write32_array(primitives)
+        writer.write32(len(indices))
+        writer.write32_array(indices)
+    else:
+        writer.write16_array(primitives[:, :2])
+        writer.write32_array(primitives[:, 2])
+        writer.write32(len(indices))
+        writer.write16_array(indices, '<u2')
+
+    writer.write32(0) # merge indices
+    writer.align32()
+
+    writer.write32(num_verts) # verts per frame
+    writer.write32(0) # flags
+    writer.write_guard()
+
+    if bones is None:
+        return
+
+    if version < 27:
+        writer.write32(num_verts)
+        writer.write_float_array(grid.positions)
+        writer.write_float_array(grid.normals)
+        if version > 21:
+            writer.write8_array(np.zeros(num_verts)) # encoded normals
+    else:
+        writer.write32(len(bones)) # max bones
+
+    writer.write32(len(bones))
+    writer.write_float_array(np.tile(np.eye(4, dtype=np.float32).reshape(-1), len(bones))) # initial transforms
+
+    # every vertex is weighted to the first two bones by height
+    writer.write32(num_verts * 2)
+    writer.write32_array(np.repeat(np.arange(num_verts), 2))
+    writer.write32_array(np.tile([0, min(1, len(bones) - 1)], num_verts))
+    writer.write_float_array(np.stack([1.0 - grid.height, grid.height], axis=1))
+
+    writer.write32(len(bones))
+    writer.write32_array(bones)
+    writer.write_guard()
+
+
+def _pack_integer_set(indices) -> bytes:
+    bits = np.zeros(64, dtype=np.uint32)
+    indices = np.asarray(indices, dtype=np.int64)
+    np.bitwise_or.at(bits, indices >> 5, (np.uint32(1) << (indices & 31).astype(np.uint32)))
+    size = int(np.flatnonzero(bits)[-1]) + 1 if bits.any() else 0
+    return struct.pack('<LL', 0, size) + bits[:size].astype('<u4').tobytes()
+
+
+def build_shape(version: int = 24, num_objects: int = 4, num_details: int = 2, verts_per_mesh: int = 2048,
+                strip: bool = False, skinned: bool = False, num_nodes: int = None, num_sequences: int = 2,
+                num_keyframes: int = 16, num_materials: int = 4) -> bytes:
+    """build the bytes of a shape file, each detail level halves the vertex count of the one before"""
+    if version not in VERSIONS:
+        raise ValueError(f"Can't write version {version} shapes")
+    if num_nodes is None:
+        num_nodes = num_objects + 1
+    if num_nodes < 2 or num_objects < 1 or num_details < 1 or num_materials < 1:
+        raise ValueError("Shapes need at least two nodes, one object, one detail and one material")
+    if num_nodes > MAX_SET_SIZE or num_objects > MAX_SET_SIZE:
+        raise ValueError(f"Sequences can't hold more than {MAX_SET_SIZE} nodes or objects")
+
+    num_meshes = num_objects * num_details
+    num_animated = num_nodes - 1 # every node except the root
+    num_node_keys = num_sequences * num_keyframes * num_animated
+    detail_sizes = [max(1, 256 >> d) for d in range(num_details)]
+
+    names = ["Root"] + [f"Node{x}" for x in range(1, num_nodes)]
+    object_names = len(names)
+    names += [f"Object{x}" for x in range(num_objects)]
+    detail_names = len(names)
+    names += [f"Detail{size}" for size in detail_sizes]
+    sequence_names = len(names)
+    names += [f"Sequence{x}" for x in range(num_sequences)]
+
+    # nodes form a binary tree, objects are spread over the nodes below the root
+    parents = [-1] + [(x - 1) // 2 for x in range(1, num_nodes)]
+    object_nodes = [1 + x % num_animated for x in range(num_objects)]
+    node_translations = np.zeros((num_nodes, 3), dtype=np.float32)
+    node_translations[1:, 0] = 3.0
+
+    writer = TSAllocWriter()
+
+    writer.write32(num_nodes)
+    writer.write32(num_objects)
+    writer.write32(0) # decals
+    writer.write32(1) # sub shapes
+    writer.write32(0) # ifl materials
+    if version < 22:
+        writer.write32(num_node_keys + num_nodes)
+    else:
+        writer.write32(num_node_keys) # rotations
+        writer.write32(num_node_keys) # translations
+        writer.write32(0) # uniform scales
+        writer.write32(0) # aligned scales
+        writer.write32(0) # arbitrary scales
+    if version > 23:
+        writer.write32(0) # ground frames
+    writer.write32(0) # object states
+    writer.write32(0) # decal states
+    writer.write32(0) # triggers
+    writer.write32(num_details)
+    writer.write32(num_meshes)
+    if version < 23:
+        writer.write32(0) # skins
+    writer.write32(len(names))
+    writer.write_float(float(detail_sizes[-1])) # smallest visible size
+    writer.write32(num_details - 1) # smallest visible detail level
+    writer.write_guard()
+
+    radius = 3.0 * num_nodes
+    writer.write_float(radius)
+    writer.write_float(radius) # tube radius
+    writer.write_float_array([0.0, 0.0, 0.0]) # center
+    writer.write_float_array([-radius] * 3)
+    writer.write_float_array([radius] * 3)
+    writer.write_guard()
+
+    for x in range(num_nodes):
+        writer.write32_array([x, parents[x], -1, -1, -1]) # name, parent, then runtime computed values
+    writer.write_guard()
+
+    for x in range(num_objects):
+        writer.write32_array([object_names + x, num_details, x * num_details, object_nodes[x], -1, -1])
+    writer.write_guard()
+    writer.write_guard() # decals
+    writer.write_guard() # ifl decals
+
+    writer.write32_array([0, 0, 0]) # sub shape first node, object and decal
+    writer.write_guard()
+    writer.write32_array([num_nodes, num_objects, 0]) # sub shape node, object and decal counts
+    writer.write_guard()
+
+    # default transforms, then the keyframes of every animated node of every sequence
+    writer.write16_array(np.tile([0, 0, 0, 0x7fff], num_nodes))
+    writer.align32()
+    writer.write_float_array(node_translations)
+
+    keys = np.arange(num_node_keys) % num_keyframes
+    angles = keys * (math.pi / max(1, num_keyframes))
+    translations = np.repeat(node_translations[1:][None], num_sequences * num_keyframes, axis=0).reshape(-1, 3)
+    translations[:, 2] += np.sin(angles).astype(np.float32)
+    writer.write_float_array(translations)
+    rotations = np.zeros((num_node_keys, 4))
+    rotations[:, 2] = np.sin(angles * 0.5)
+    rotations[:, 3] = np.cos(angles * 0.5)
+    writer.write16_array(np.round(rotations * 0x7fff))
+    writer.align32()
+    writer.write_guard()
+
+    if version > 21:
+        writer.align32() # no scales
+        writer.write_guard()
+    if version > 23:
+        writer.align32() # no ground frames
+        writer.write_guard()
+
+    writer.write_guard() # object states
+    writer.write_guard() # decal states
+    writer.write_guard() # triggers
+
+    for x, size in enumerate(detail_sizes):
+        writer.write32_array([detail_names + x, 0, x])
+        writer.write_float_array([size, -1.0, -1.0])
+        writer.write32(0) # poly count
+        if version >= 26:
+            writer.write32_array([0, 0, 0, 0]) # billboard dimension, detail level, equator and polar steps
+            writer.write_float(0.0) # billboard polar angle
+            writer.write32(0) # billboard include poles
+    writer.write_guard()
+
+    # version 27 vertex format: uv2 and color after the base record, then one group of bone influences
+    vertex_size = 60 + (20 if skinned else 0)
+    if version >= 27:
+        writer.write16_array([48, 60 if skinned else -1, 56, 1 if skinned else 0, vertex_size])
+        writer.align32()
+        writer.write_guard()
+
+    vertex_offset = 0
+    for x in range(num_objects):
+        node = object_nodes[x]
+        bones = [node, max(parents[node], 0)] if skinned else None
+        for detail in range(num_details):
+            grid = MeshGrid(verts_per_mesh >> detail, (3.0 * x, 0.0, 0.0))
+            write_mesh(writer, version, grid, strip, x, num_materials, bones, vertex_offset, vertex_size)
+            vertex_offset += len(grid) * vertex_size
+    writer.write_guard()
+
+    writer.write8_array(np.frombuffer(b"".join(name.encode("utf-8") + b"\0" for name in names), dtype=np.uint8))
+    writer.align32()
+    writer.write_guard()
+
+    if version < 23:
+        writer.write_guard() # detail first skin and num skins
+        writer.write_guard() # skins
+
+    size_mem_buffer, start_u16, start_u8, buffer = writer.get_buffer()
+    data = bytearray(struct.pack('<4i', version, size_mem_buffer, start_u16, start_u8))
+    data += buffer
+
+    # sequences
+    animated_nodes = _pack_integer_set(range(1, num_nodes))
+    no_members = _pack_integer_set([])
+    data += struct.pack('<i', num_sequences)
+    for x in range(num_sequences):
+        data += struct.pack('<i', sequence_names + x)
+        if version > 21:
+            data += struct.pack('<L', SequenceFlags.Cyclic)
+        data += struct.pack('<Lf', num_keyframes, 1.0)
+        if version < 22:
+            data += bytes([0, 1, 0]) # blend, cyclic, make path
+        data += struct.pack('<iiL', 0, -1, 0) # priority, ground frames
+        base = x * num_keyframes * num_animated
+        if version > 21:
+            data += struct.pack('<5i', base, base, 0, 0, 0) # rotation, translation, scale, object state, decal state
+        else:
+            data += struct.pack('<3i', base, 0, 0) # rotation and translation, object state, decal state
+        data += struct.pack('<iLf', 0, 0, 0.0) # triggers, tool begin
+
+        data += animated_nodes # rotations
+        if version > 21:
+            data += animated_nodes # translations
+            data += no_members # scales
+        data += no_members * 5 # decals, ifl materials, visibility, frames and material frames
+
+    # material list
+    data += struct.pack('<Bi', 1, num_materials)
+    for x in range(num_materials):
+        name = f"Material{x}".encode("utf-8")
+        data += struct.pack('<B', len(name)) + name
+    data += struct.pack(f'<{num_materials}i', *([TSMaterialFlags.SWrap | TSMaterialFlags.TWrap] * num_materials))
+    data += struct.pack(f'<{num_materials}i', *range(num_materials)) # reflection maps
+    data += struct.pack(f'<{num_materials}i', *([-1] * num_materials)) # bump maps
+    data += struct.pack(f'<{num_materials}i', *([-1] * num_materials)) # detail maps
+    if version == 25:
+        data += struct.pack(f'<{num_materials}i', *([-1] * num_materials))
+    data += struct.pack(f'<{num_materials}f', *([1.0] * num_materials)) # detail scales
+    data += struct.pack(f'<{num_materials}f', *([1.0] * num_materials)) # reflection amounts
+
+    return bytes(data)
+
+
+def write_shape(path: str, **kwargs):
+    """write a shape file, see build_shape for the arguments"""
+    with open(path, "wb") as f:
+        f.write(build_shape(**kwargs))
+
+
+def get_corpus_specs(scale: float = 1.0, versions=VERSIONS, **kwargs) -> dict:
+    """shape arguments by file name, for every version with strip and list primitives, static and skinned
+    scale multiplies the object, node, sequence and material counts, kwargs override any argument"""
+    count = lambda value: max(1, int(round(value * scale)))
+    specs = {}
+    for version in versions:
+        for strip in (False, True):
+            for skinned in (False, True):
+                spec = {
+                    "version": version,
+                    "strip": strip,
+                    "skinned": skinned,
+                    "num_objects": count(8),
+                    "num_details": 2,
+                    "verts_per_mesh": 2048,
+                    "num_nodes": count(8) + 1,
+                    "num_sequences": count(4),
+                    "num_keyframes": 16,
+                    "num_materials": count(4),
+                }
+                spec.update(kwargs)
+                name = f"v{version}_{'strip' if strip else 'list'}_{'skinned' if skinned else 'static'}.dts"
+                specs[name] = spec
+    return specs
+
+
+def generate_corpus(directory: str, scale: float = 1.0, versions=VERSIONS, **kwargs) -> dict:
+    """write the corpus and its manifest to directory, returns the manifest"""
+    os.makedirs(directory, exist_ok=True)
+    specs = get_corpus_specs(scale, versions, **kwargs)
+    for name, spec in specs.items():
+        write_shape(os.path.join(directory, name), **spec)
+
+    manifest = {"scale": scale, "shapes": specs}
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a corpus of synthetic DTS files")
+    parser.add_argument("output_dir")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies object, node, sequence and material counts")
+    parser.add_argument("--versions", type=int, nargs="+", default=list(VERSIONS))
+    parser.add_argument("--objects", dest="num_objects", type=int)
+    parser.add_argument("--details", dest="num_details", type=int)
+    parser.add_argument("--verts", dest="verts_per_mesh", type=int, help="vertices of each highest detail mesh")
+    parser.add_argument("--nodes", dest="num_nodes", type=int)
+    parser.add_argument("--sequences", dest="num_sequences", type=int)
+    parser.add_argument("--keyframes", dest="num_keyframes", type=int)
+    parser.add_argument("--materials", dest="num_materials", type=int)
+    args = vars(parser.parse_args(argv))
+
+    output_dir, scale, versions = args.pop("output_dir"), args.pop("scale"), args.pop("versions")
+    overrides = {k: v for k, v in args.items() if v is not None}
+    manifest = generate_corpus(output_dir, scale, versions, **overrides)
+
+    total_size = sum(os.path.getsize(os.path.join(output_dir, name)) for name in manifest["shapes"])
+    print(f"Wrote {len(manifest['shapes'])} shapes ({total_size / (1024 * 1024):.1f} MB) to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,66 +4,224 @@ bl_info = {
     "version": (0, 0, 5),
     "blender": (3, 6, 0),
     "location": "File > Import-Export",
-    "description": "Import Dynamix Three Space (DTS) models from Torque3D",
+    "description": "Import and export Dynamix Three Space (DTS) models from Torque3D",
     "warning": "",
     "doc_url": "https://github.com/Dummiesman/DynamixThreeSpaceBlenderAddon/",
     "tracker_url": "https://github.com/Dummiesman/DynamixThreeSpaceBlenderAddon/",
     "support": 'COMMUNITY',
     "category": "Import-Export"}
 
-import bpy
-
-from bpy.props import (
-        BoolProperty,
-        EnumProperty,
-        FloatProperty,
-        StringProperty,
-        CollectionProperty,
-        PointerProperty,
-        )
-from bpy_extras.io_utils import (
-        ImportHelper,
-        ExportHelper,
-        )
-
-class ImportDTS(bpy.types.Operator, ImportHelper):
-    """Import from Dynamix Three Space (.DTS)"""
-    bl_idname = "import_scene.dtst3d"
-    bl_label = 'Import Dynamix Three Space'
-    bl_options = {'UNDO'}
-
-    filename_ext = ".dts"
-    filter_glob: StringProperty(default="*.dts", options={'HIDDEN'})
-
-    merge_verts: BoolProperty(
-        name="Merge Vertices",
-        description="The DTS format requires discontinuous normals, UVs, and other vertex attributes to be stored as separate vertices as required for rendering on typical graphics hardware. This option attempts to combine co-located vertices where possible.",
-        default=True,
-        )
-    
-    def execute(self, context):
-        from . import import_dts
-        keywords = self.as_keywords(ignore=("axis_forward",
-                                            "axis_up",
-                                            "filter_glob",
-                                            "check_existing",
-                                            ))
-
-        return import_dts.load(self, context, **keywords)
-    
-def menu_func_import(self, context):
-    self.layout.separator()
-    self.layout.operator(ImportDTS.bl_idname, text="Dynamix Three Space (*.dts)")
-    self.layout.separator()
-
-# Register factories
-def register():
-    bpy.utils.register_class(ImportDTS)
-    bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
-
-def unregister():
-    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
-    bpy.utils.unregister_class(ImportDTS)
-
-if __name__ == "__main__":
-    register()
\ No newline at end of file
+try:
+    import bpy
+except ImportError:
+    # the file format modules have no Blender dependency and are also
+    # imported by plain Python processes, e.g. the batch importer's workers
+    bpy = None
+
+if bpy is not None:
+    from bpy.props import (
+            BoolProperty,
+            EnumProperty,
+            FloatProperty,
+            StringProperty,
+            CollectionProperty,
+            PointerProperty,
+            )
+    from bpy_extras.io_utils import (
+            ImportHelper,
+            ExportHelper,
+            )
+
+    class ImportDTS(bpy.types.Operator, ImportHelper):
+        """Import from Dynamix Three Space (.DTS)"""
+        bl_idname = "import_scene.dtst3d"
+        bl_label = 'Import Dynamix Three Space'
+        bl_options = {'UNDO'}
+
+        filename_ext = ".dts"
+        filter_glob: StringProperty(default="*.dts", options={'HIDDEN'})
+
+        merge_verts: BoolProperty(
+            name="Merge Vertices",
+            description="The DTS format requires discontinuous normals, UVs, and other vertex attributes to be stored as separate vertices as required for rendering on typical graphics hardware. This option attempts to combine co-located vertices where possible.",
+            default=True,
+            )
+
+        import_sequences: BoolProperty(
+            name="Import Sequences",
+            description="Import the node animation of each sequence as actions, with an NLA track per sequence on each animated object",
+            default=True,
+            )
+
+        import_armature: BoolProperty(
+            name="Import Armature",
+            description="Build an armature with a bone for each node. Skinned meshes are bound to it, other objects are parented to the bone of their node, and sequences animate the bones",
+            default=False,
+            )
+
+        import_details: EnumProperty(
+            name="Detail Levels",
+            description="Which detail levels to import. Meshes of the other detail levels are not read",
+            items=(('FIRST', "First Mesh", "Import the first mesh of every object"),
+                   ('HIGHEST_AND_COLLISION', "Highest and Collision", "Import the highest visible detail level and the collision details, each into its own collection"),
+                   ('ALL', "All", "Import every detail level into its own collection"),
+                   ('CUSTOM', "By Name", "Import the detail levels matching Detail Names, each into its own collection")),
+            default='FIRST',
+            )
+
+        detail_names: StringProperty(
+            name="Detail Names",
+            description="Comma separated names of the detail levels to import when Detail Levels is By Name, * and ? are wildcards",
+            default="",
+            )
+
+        profile_output: EnumProperty(
+            name="Profiling Output",
+            description="Write the timings of each import phase next to the imported file",
+            items=(('NONE', "None", "Don't write profiling output"),
+                   ('JSON', "JSON Report", "Write phase timings and counters to <file>.import.json"),
+                   ('CPROFILE', "JSON Report and cProfile", "Also write a cProfile dump to <file>.import.prof")),
+            default='NONE',
+            )
+
+        use_modal: BoolProperty(
+            name="Import in Background",
+            description="Keep Blender responsive while importing, with the progress in the status bar. Esc cancels the import and removes what was imported so far",
+            default=True,
+            )
+
+        # seconds of work per timer event of a background import
+        time_slice = 0.05
+
+        def execute(self, context):
+            from . import import_dts
+            keywords = self.as_keywords(ignore=("axis_forward",
+                                                "axis_up",
+                                                "filter_glob",
+                                                "check_existing",
+                                                "use_modal",
+                                                ))
+
+            # scripts and background mode have no window to report progress in,
+            # and cProfile only sees the main thread, so these import in one go
+            if not self.use_modal or context.window is None or bpy.app.background or self.profile_output == 'CPROFILE':
+                return import_dts.load(self, context, **keywords)
+
+            self._job = import_dts.ImportJob(**keywords)
+            wm = context.window_manager
+            wm.progress_begin(0, 100)
+            wm.modal_handler_add(self)
+            self._timer = wm.event_timer_add(0.01, window=context.window)
+            context.workspace.status_text_set(f"Importing {self._job.name}... (Esc to cancel)")
+            return {'RUNNING_MODAL'}
+
+        def modal(self, context, event):
+            if event.type == 'ESC' and event.value == 'PRESS':
+                self._job.cancel()
+                self._end_modal(context)
+                self.report({'WARNING'}, f"Import of {self._job.name} cancelled")
+                return {'CANCELLED'}
+
+            if event.type != 'TIMER' or event.timer is not self._timer:
+                return {'PASS_THROUGH'}
+
+            try:
+                finished = self._job.step(self.time_slice)
+            except Exception as e:
+                self._job.cancel()
+                self._end_modal(context)
+                self.report({'ERROR'}, f"Couldn't import {self._job.name}: {e}")
+                return {'CANCELLED'}
+
+            if finished:
+                self._end_modal(context)
+                return {'FINISHED'}
+
+            context.window_manager.progress_update(self._job.progress * 100.0)
+            context.workspace.status_text_set(f"Importing {self._job.name}: {self._job.status} (Esc to cancel)")
+            return {'RUNNING_MODAL'}
+
+        def cancel(self, context):
+            # the operator was stopped by Blender, e.g. another file was loaded, so only stop the workers
+            self._job.close()
+            self._end_modal(context)
+
+        def _end_modal(self, context):
+            wm = context.window_manager
+            wm.event_timer_remove(self._timer)
+            wm.progress_end()
+            context.workspace.status_text_set(None)
+        
+    class ExportDTS(bpy.types.Operator, ExportHelper):
+        """Export to Dynamix Three Space (.DTS)"""
+        bl_idname = "export_scene.dtst3d"
+        bl_label = 'Export Dynamix Three Space'
+
+        filename_ext = ".dts"
+        filter_glob: StringProperty(default="*.dts", options={'HIDDEN'})
+
+        use_selection: BoolProperty(
+            name="Selection Only",
+            description="Export the selected objects only",
+            default=False,
+            )
+
+        version: EnumProperty(
+            name="Version",
+            description="Version of the written shape",
+            items=(('24', "24", "Version 24"),
+                   ('25', "25", "Version 25"),
+                   ('26', "26", "Version 26"),
+                   ('27', "27", "Version 27")),
+            default='26',
+            )
+
+        export_sequences: BoolProperty(
+            name="Export Sequences",
+            description="Export the NLA tracks of the exported objects as sequences, one sequence per track name",
+            default=True,
+            )
+
+        detail_size: FloatProperty(
+            name="Detail Size",
+            description="Size of the detail level the meshes are written to",
+            default=2.0,
+            )
+
+        verify: BoolProperty(
+            name="Verify",
+            description="Read the written shape back and check that it writes the same bytes again",
+            default=True,
+            )
+
+        def execute(self, context):
+            from . import export_dts
+            keywords = self.as_keywords(ignore=("filter_glob",
+                                                "check_existing",
+                                                ))
+
+            return export_dts.save(self, context, **keywords)
+
+    def menu_func_import(self, context):
+        self.layout.separator()
+        self.layout.operator(ImportDTS.bl_idname, text="Dynamix Three Space (*.dts)")
+        self.layout.separator()
+
+    def menu_func_export(self, context):
+        self.layout.operator(ExportDTS.bl_idname, text="Dynamix Three Space (*.dts)")
+
+    # Register factories
+    def register():
+        bpy.utils.register_class(ImportDTS)
+        bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+        bpy.utils.register_class(ExportDTS)
+        bpy.types.TOPBAR_MT_file_export.append(menu_func_export)
+
+    def unregister():
+        bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
+        bpy.utils.unregister_class(ExportDTS)
+        bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+        bpy.utils.unregister_class(ImportDTS)
+
+    if __name__ == "__main__":
+        register()
\ No newline at end of file
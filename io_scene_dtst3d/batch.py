@@ -0,0 +1,150 @@
+# Headless batch importer. Shapes are parsed in a pool of worker processes
+# (TSShape has no Blender dependency) and the Blender objects are built from
+# the results on the main thread.
+#
+#   blender --background --python io_scene_dtst3d/batch.py -- [options] INPUT [INPUT ...]
+#
+# INPUT may be a .dts file, a directory or a glob pattern. Each shape is saved
+# to its own .blend in --output-dir, or all shapes go into the single
+# --combined .blend with one collection per shape.
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+if __package__ in (None, ""):
+    # run as a script, make the add-on package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from io_scene_dtst3d.shapecache import get_default_cache
+from io_scene_dtst3d.shapefiles import find_shape_files
+from io_scene_dtst3d.tsshape import TSShape
+
+
+def parse_shape(path):
+    """worker entry point, returns (path, shape, error, parse seconds)"""
+    time1 = time.perf_counter()
+    try:
+        shape = TSShape()
+        shape.read_from_path(path, cache=get_default_cache())
+        return path, shape, None, time.perf_counter() - time1
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}", time.perf_counter() - time1
+
+
+def parse_shapes(paths, jobs):
+    """parse shapes in worker processes, results are yielded in input order
+    with at most two shapes per worker in flight, so memory stays bounded"""
+    if jobs <= 1:
+        for path in paths:
+            yield parse_shape(path)
+        return
+
+    # never fork a running Blender, workers start a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        remaining = iter(paths)
+        pending = deque(executor.submit(parse_shape, path) for path in itertools.islice(remaining, jobs * 2))
+        while pending:
+            result = pending.popleft().result()
+            for path in itertools.islice(remaining, 1):
+                pending.append(executor.submit(parse_shape, path))
+            yield result
+
+
+def get_output_paths(paths, output_dir):
+    """mirror the input directory layout below output_dir so equal file names don't collide"""
+    common = os.path.commonpath([os.path.dirname(path) for path in paths]) if paths else ""
+    output_paths = {}
+    for path in paths:
+        relative = os.path.relpath(os.path.splitext(path)[0], common)
+        output_paths[path] = os.path.join(output_dir, relative + ".blend")
+    return output_paths
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(prog="blender --background --python batch.py --",
+                                     description="Import many DTS files into .blend files")
+    parser.add_argument("inputs", nargs="+", help=".dts files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", help="write one .blend per shape into this directory")
+    parser.add_argument("-c", "--combined", help="write all shapes into this .blend, one collection per shape")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of parser processes")
+    parser.add_argument("-r", "--recursive", action="store_true", help="search directories recursively")
+    parser.add_argument("--no-merge-verts", dest="merge_verts", action="store_false", help="don't merge vertices")
+    parser.add_argument("--no-sequences", dest="import_sequences", action="store_false", help="don't import sequences")
+    parser.add_argument("--armature", action="store_true", help="build an armature from the node hierarchy")
+    parser.add_argument("--details", default="first", choices=("first", "highest-and-collision", "all", "custom"),
+                        help="detail levels to import, all but first put each detail level in its own collection")
+    parser.add_argument("--detail-names", default="", help="comma separated detail name patterns for --details custom")
+    args = parser.parse_args(argv)
+
+    if not args.output_dir and not args.combined:
+        parser.error("one of --output-dir or --combined is required")
+
+    try:
+        import bpy
+    except ImportError:
+        parser.error("this must be run inside Blender")
+
+    from io_scene_dtst3d import import_dts
+
+    import_details = args.details.upper().replace("-", "_")
+    paths = find_shape_files(args.inputs, args.recursive)
+    if len(paths) == 0:
+        parser.error("no .dts files found")
+
+    output_paths = get_output_paths(paths, args.output_dir) if args.output_dir else {}
+    print(f"Importing {len(paths)} shapes with {args.jobs} parser processes")
+
+    time1 = time.perf_counter()
+    bpy.ops.wm.read_homefile(use_empty=True)
+    failures = []
+
+    for index, (path, shape, error, parse_time) in enumerate(parse_shapes(paths, args.jobs)):
+        if shape is None:
+            print(f"[{index + 1}/{len(paths)}] {path}: {error}")
+            failures.append(path)
+            continue
+
+        time2 = time.perf_counter()
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            if args.combined:
+                collection = bpy.data.collections.new(name)
+                bpy.context.scene.collection.children.link(collection)
+                import_dts.create_shape(shape, name, args.merge_verts, collection, args.import_sequences, args.armature,
+                                        import_details, args.detail_names)
+            else:
+                bpy.ops.wm.read_homefile(use_empty=True)
+                import_dts.create_shape(shape, name, args.merge_verts, None, args.import_sequences, args.armature,
+                                        import_details, args.detail_names)
+                os.makedirs(os.path.dirname(output_paths[path]), exist_ok=True)
+                bpy.ops.wm.save_as_mainfile(filepath=output_paths[path])
+        except Exception as e:
+            print(f"[{index + 1}/{len(paths)}] {path}: {type(e).__name__}: {e}")
+            failures.append(path)
+            continue
+
+        print(f"[{index + 1}/{len(paths)}] {path}: parsed in %.4f sec., built in %.4f sec." %
+              (parse_time, time.perf_counter() - time2))
+
+    if args.combined:
+        os.makedirs(os.path.dirname(os.path.abspath(args.combined)), exist_ok=True)
+        bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(args.combined))
+
+    print(f"Imported {len(paths) - len(failures)} of {len(paths)} shapes in %.4f sec." % (time.perf_counter() - time1))
+    if len(failures) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # call main through the package module so worker functions pickle by their package name
+    from io_scene_dtst3d.batch import main as batch_main
+    batch_main()
@@ -0,0 +1,57 @@
+# A minimal read-only stream over a bytes-like object, so parts of a file
+# which are already in memory (or mapped) can be read without copying them
+# into a new stream first. BufferWriter builds such a buffer for the exporter.
+import functools
+import struct
+
+# compiled formats by format string, shared by all readers and writers
+# bounded, formats like f'<{count}i' differ with every count
+_get_struct = functools.lru_cache(maxsize=64)(struct.Struct)
+
+
+class BufferReader:
+    def __init__(self, buffer, offset: int = 0):
+        self._buffer = memoryview(buffer)
+        self._pos = offset
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = len(self._buffer) - self._pos
+        value = bytes(self._buffer[self._pos:self._pos + size])
+        self._pos += len(value)
+        return value
+
+    def unpack(self, fmt: str) -> tuple:
+        """unpack fmt at the cursor straight from the buffer and move past it"""
+        compiled = _get_struct(fmt)
+        values = compiled.unpack_from(self._buffer, self._pos)
+        self._pos += compiled.size
+        return values
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int):
+        self._pos = pos
+
+    def release(self):
+        self._buffer.release()
+
+
+class BufferWriter:
+    """the counterpart of BufferReader, packs values at the end of a growing buffer"""
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+
+    def pack(self, fmt: str, *values):
+        compiled = _get_struct(fmt)
+        self._buffer += compiled.pack(*values)
+
+    def tell(self) -> int:
+        return len(self._buffer)
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buffer)
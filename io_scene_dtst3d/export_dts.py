@@ -0,0 +1,348 @@
+import bpy, mathutils
+import time
+import numpy as np
+
+from io_scene_dtst3d.profiling import ImportReport
+from io_scene_dtst3d.tsshape import *
+
+######################################################
+# HELPERS
+######################################################
+def translate_quaternions_to_ts(quaternions):
+    """Blender (w, x, y, z) arrays to TQuaternion16 (x, y, z, w), the inverse of import_dts.translate_quaternions"""
+    values = np.asarray(quaternions, dtype=np.float64)
+    length = np.linalg.norm(values, axis=-1, keepdims=True)
+    values = np.divide(values, length, out=np.tile([1.0, 0.0, 0.0, 0.0], values.shape[:-1] + (1,)), where=length > 0.0)
+    values = np.stack([-values[..., 1], values[..., 2], values[..., 3], values[..., 0]], axis=-1)
+    return np.rint(np.clip(values, -1.0, 1.0) * TQuaternion16.MAX_VALUE).astype(np.int16)
+
+
+def get_unscaled_matrix(matrix):
+    """location and rotation of a matrix, DTS nodes have no rest scale so it's baked into the meshes"""
+    location, rotation, _ = matrix.decompose()
+    return mathutils.Matrix.Translation(location) @ rotation.to_matrix().to_4x4()
+
+
+def get_export_objects(context, use_selection=False):
+    """mesh and empty objects to export, parents before their children"""
+    candidates = context.selected_objects if use_selection else context.scene.objects
+    exported = set(ob for ob in candidates if ob.type in {'MESH', 'EMPTY'})
+
+    ordered = []
+    def visit(ob):
+        ordered.append(ob)
+        for child in ob.children:
+            if child in exported:
+                visit(child)
+
+    for ob in context.scene.objects:
+        if ob in exported and get_exported_parent(ob, exported) is None:
+            visit(ob)
+    return ordered
+
+
+def get_exported_parent(ob, exported):
+    parent = ob.parent
+    while parent is not None and parent not in exported:
+        parent = parent.parent
+    return parent
+
+######################################################
+# EXPORT
+######################################################
+def get_mesh_streams(ob, depsgraph):
+    """read the evaluated mesh of an object with foreach_get, every array but the positions has one row per face corner
+    returns positions, corner vertices, corner normals, up to two corner UV layers, corner colors or None,
+    and the corners and material slot of each triangle"""
+    ob_eval = ob.evaluated_get(depsgraph)
+    me = ob_eval.to_mesh()
+    try:
+        me.calc_loop_triangles()
+        num_verts = len(me.vertices)
+        num_loops = len(me.loops)
+        num_triangles = len(me.loop_triangles)
+
+        positions = np.empty(num_verts * 3, dtype=np.float32)
+        me.vertices.foreach_get("co", positions)
+
+        loop_vertices = np.empty(num_loops, dtype=np.int32)
+        me.loops.foreach_get("vertex_index", loop_vertices)
+
+        loop_normals = np.empty(num_loops * 3, dtype=np.float32)
+        if bpy.app.version < (4, 1, 0):
+            me.calc_normals_split()
+            me.loops.foreach_get("normal", loop_normals)
+        else:
+            me.corner_normals.foreach_get("vector", loop_normals)
+
+        loop_uvs = []
+        for uv_layer in list(me.uv_layers)[:2]:
+            uvs = np.empty(num_loops * 2, dtype=np.float32)
+            uv_layer.data.foreach_get("uv", uvs)
+            uvs = uvs.reshape(num_loops, 2)
+            uvs[:, 1] = 1.0 - uvs[:, 1]
+            loop_uvs.append(uvs)
+
+        loop_colors = None
+        color_attribute = me.color_attributes.active_color
+        if color_attribute is None and len(me.color_attributes) > 0:
+            color_attribute = me.color_attributes[0]
+        if color_attribute is not None and color_attribute.domain in {'CORNER', 'POINT'}:
+            colors = np.empty(len(color_attribute.data) * 4, dtype=np.float32)
+            color_attribute.data.foreach_get("color_srgb", colors)
+            colors = colors.reshape(-1, 4)
+            loop_colors = colors if color_attribute.domain == 'CORNER' else colors[loop_vertices]
+
+        triangle_loops = np.empty(num_triangles * 3, dtype=np.int32)
+        me.loop_triangles.foreach_get("loops", triangle_loops)
+        triangle_materials = np.empty(num_triangles, dtype=np.int32)
+        me.loop_triangles.foreach_get("material_index", triangle_materials)
+    finally:
+        ob_eval.to_mesh_clear()
+
+    return (positions.reshape(num_verts, 3), loop_vertices, loop_normals.reshape(num_loops, 3), loop_uvs, loop_colors,
+            triangle_loops.reshape(num_triangles, 3), triangle_materials)
+
+
+def create_ts_mesh(shape, ob, depsgraph, scale, material_indices):
+    """build a TSMesh from a mesh object, scaled by the object's scale since nodes have none
+    corners with the same vertex, normal, UVs and color become one DTS vertex, found with one np.unique call
+    material_indices is the shape material of each material slot, -1 for empty slots"""
+    report = shape.report
+    laps = report.laps()
+    positions, loop_vertices, loop_normals, loop_uvs, loop_colors, triangle_loops, triangle_materials = get_mesh_streams(ob, depsgraph)
+    laps.lap("gather")
+
+    # DTS vertices are unique combinations of the corner attributes
+    columns = [loop_vertices.astype(np.uint32)[:, None], (loop_normals + 0.0).view(np.uint32)]
+    columns += [(uvs + 0.0).view(np.uint32) for uvs in loop_uvs]
+    if loop_colors is not None:
+        columns.append(np.rint(np.clip(loop_colors, 0.0, 1.0) * 255.0).astype(np.uint32))
+    keys = np.hstack(columns) if len(loop_vertices) > 0 else np.zeros((0, 1), dtype=np.uint32)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    laps.lap("split vertices")
+
+    # nodes have no scale, positions are scaled and normals are transformed to match
+    scale = np.asarray(scale, dtype=np.float32)
+    vertices = positions[loop_vertices[first]] * scale
+    normals = loop_normals[first] / np.where(scale != 0.0, scale, 1.0)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0.0)
+
+    ts_mesh = TSMesh()
+    ts_mesh.set_vertex_data(vertices, normals,
+                            loop_uvs[0][first] if len(loop_uvs) > 0 else None,
+                            loop_uvs[1][first] if len(loop_uvs) > 1 else None,
+                            loop_colors[first] if loop_colors is not None else None)
+
+    # Blender corners are wound the other way, one triangle list primitive per material slot
+    triangles = inverse[triangle_loops][:, ::-1]
+    triangle_materials = np.clip(triangle_materials, 0, max(len(material_indices) - 1, 0))
+    order = np.argsort(triangle_materials, kind='stable')
+    slots, counts = np.unique(triangle_materials[order], return_counts=True)
+
+    primitives = []
+    start = 0
+    for slot, count in zip(slots.tolist(), counts.tolist()):
+        material_index = material_indices[slot] if slot < len(material_indices) else -1
+        flags = TSDrawPrimitiveType.Triangles | TSDrawPrimitiveType.Indexed
+        flags |= material_index if material_index >= 0 else TSDrawPrimitiveType.NoMaterial
+        primitives.append(TSDrawPrimitive(start, count * 3, flags))
+        start += count * 3
+    ts_mesh.set_primitives(triangles[order].reshape(-1), primitives)
+    laps.lap("primitives")
+
+    report.count("vertices", len(vertices))
+    report.count("faces", len(triangles))
+    return ts_mesh
+
+
+def get_material_indices(shape, ob, materials):
+    """the shape material of each material slot of an object, materials maps Blender material names to shape materials"""
+    material_indices = []
+    for slot in ob.material_slots:
+        if slot.material is None:
+            material_indices.append(-1)
+            continue
+        name = slot.material.name
+        if name not in materials:
+            materials[name] = shape.add_material(name)
+        material_indices.append(materials[name])
+    return material_indices
+
+
+def get_fcurve_values(action, data_path, num_values, frames, default):
+    """(frames, num_values) array of an action's F-curves evaluated at frames, or None when it has none of them
+    channels without an F-curve keep their default value"""
+    fcurves = [action.fcurves.find(data_path, index=index) for index in range(num_values)]
+    if all(fcurve is None for fcurve in fcurves):
+        return None
+
+    values = np.tile(np.asarray(default, dtype=np.float64), (len(frames), 1))
+    for index, fcurve in enumerate(fcurves):
+        if fcurve is not None:
+            values[:, index] = [fcurve.evaluate(frame) for frame in frames.tolist()]
+    return values
+
+
+def get_action_frames(action):
+    """sorted frames of all keyframes of an action, read with foreach_get"""
+    frames = []
+    for fcurve in action.fcurves:
+        co = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+        fcurve.keyframe_points.foreach_get("co", co)
+        frames.append(co[0::2])
+    return np.unique(np.concatenate(frames)) if frames else np.zeros(0, dtype=np.float32)
+
+
+def add_sequences(shape, node_objects):
+    """add a sequence for each NLA track name of the exported objects, the way the importer creates them
+    the object channels of each action are taken as its node's local transform and sampled at every keyframe of the track"""
+    report = shape.report
+    render = bpy.context.scene.render
+    fps = render.fps / render.fps_base
+
+    # track name -> {node: action}, in the order tracks are first seen, the first strip of a track is used
+    sequences = {}
+    for node_index, ob in enumerate(node_objects):
+        if ob.animation_data is None:
+            continue
+        for track in ob.animation_data.nla_tracks:
+            for strip in track.strips:
+                if strip.action is not None:
+                    sequences.setdefault(track.name, {}).setdefault(node_index, strip.action)
+
+    for name, node_actions in sequences.items():
+        frames = np.unique(np.concatenate([get_action_frames(action) for action in node_actions.values()]))
+        if len(frames) == 0:
+            continue
+
+        keyframes = SequenceKeyframes()
+        rotation_nodes, rotations, translation_nodes, translations, scale_nodes, scales = [], [], [], [], [], []
+        for node_index, action in node_actions.items():
+            ob = node_objects[node_index]
+            location = get_fcurve_values(action, "location", 3, frames, ob.location)
+            if location is not None:
+                translation_nodes.append(node_index)
+                translations.append(location)
+
+            rotation = get_fcurve_values(action, "rotation_quaternion", 4, frames, ob.rotation_quaternion)
+            if rotation is None:
+                euler = get_fcurve_values(action, "rotation_euler", 3, frames, ob.rotation_euler)
+                if euler is not None:
+                    order = ob.rotation_mode if ob.rotation_mode in {'XYZ', 'XZY', 'YXZ', 'YZX', 'ZXY', 'ZYX'} else 'XYZ'
+                    rotation = np.array([mathutils.Euler(values, order).to_quaternion() for values in euler.tolist()])
+            if rotation is not None:
+                rotation_nodes.append(node_index)
+                rotations.append(translate_quaternions_to_ts(rotation))
+
+            scale = get_fcurve_values(action, "scale", 3, frames, ob.scale)
+            if scale is not None:
+                scale_nodes.append(node_index)
+                scales.append(scale)
+
+        num_keyframes = len(frames)
+        keyframes.rotation_nodes = np.array(rotation_nodes, dtype=np.intp)
+        keyframes.rotations = np.array(rotations, dtype=np.int16).reshape(-1, num_keyframes, 4)
+        keyframes.translation_nodes = np.array(translation_nodes, dtype=np.intp)
+        keyframes.translations = np.array(translations, dtype=np.float32).reshape(-1, num_keyframes, 3)
+        keyframes.scale_nodes = np.array(scale_nodes, dtype=np.intp)
+        keyframes.scales = np.array(scales, dtype=np.float32).reshape(-1, num_keyframes, 3)
+
+        duration = float(frames[-1] - frames[0]) / fps
+        shape.add_sequence(name, keyframes, duration)
+        report.count("sequences")
+        report.count("keyframes", num_keyframes * (len(rotation_nodes) + len(translation_nodes) + len(scale_nodes)))
+
+
+def build_shape(objects, depsgraph, export_sequences=True, detail_size=2.0, report=None):
+    """build a TSShape from Blender objects, each object becomes a node and each mesh object also a shape object
+    everything goes into one detail level of one sub shape"""
+    shape = TSShape(report=report)
+    report = shape.report
+
+    with report.span("nodes"):
+        exported = set(objects)
+        node_indices = {}
+        node_worlds = []
+        for ob in objects:
+            parent = get_exported_parent(ob, exported)
+            parent_index = node_indices[parent] if parent is not None else -1
+            world = get_unscaled_matrix(ob.matrix_world)
+            local = world if parent is None else node_worlds[parent_index].inverted() @ world
+            location, rotation, _ = local.decompose()
+
+            node_indices[ob] = shape.add_node(ob.name, parent_index, translate_quaternions_to_ts(np.array(rotation)), location)
+            node_worlds.append(world)
+
+    detail_name = f"detail{detail_size:g}"
+    materials = {}
+    bounds_points = []
+    for ob in objects:
+        if ob.type != 'MESH':
+            continue
+        with report.span("meshes"):
+            ts_mesh = create_ts_mesh(shape, ob, depsgraph, ob.matrix_world.to_scale(), get_material_indices(shape, ob, materials))
+        shape.add_object(ob.name, node_indices[ob], [ts_mesh])
+
+        world = np.array(node_worlds[node_indices[ob]], dtype=np.float64)
+        bounds_points.append(ts_mesh.vertices @ world[:3, :3].T + world[:3, 3])
+        report.count("objects")
+
+    shape.add_sub_shape(0, len(shape.nodes), 0, len(shape.objects))
+    shape.add_detail(detail_name, detail_size)
+    shape.set_bounds(np.concatenate(bounds_points) if bounds_points else np.zeros((0, 3)))
+
+    if export_sequences:
+        with report.span("sequences"):
+            add_sequences(shape, objects)
+
+    return shape
+
+
+def save_dts(filepath,
+             context,
+             use_selection=False,
+             version=26,
+             export_sequences=True,
+             detail_size=2.0,
+             verify=True):
+    """export the scene, or the selected objects, to a shape file, returns the report with the timings of each phase
+    with verify, the written shape is read back and must write the same bytes again"""
+    print("exporting DTS: %r..." % (filepath))
+    time1 = time.perf_counter()
+    report = ImportReport()
+
+    objects = get_export_objects(context, use_selection)
+    shape = build_shape(objects, context.evaluated_depsgraph_get(), export_sequences, detail_size, report)
+    data = shape.write_buffer(int(version))
+
+    if verify:
+        with report.span("verify"):
+            check_round_trip(data)
+
+    with open(filepath, "wb") as f:
+        f.write(data)
+
+    print(" done in %.4f sec." % (time.perf_counter() - time1))
+    return report
+
+
+def save(operator,
+         context,
+         filepath="",
+         use_selection=False,
+         version='26',
+         export_sequences=True,
+         detail_size=2.0,
+         verify=True,
+         ):
+
+    try:
+        save_dts(filepath, context, use_selection, int(version), export_sequences, detail_size, verify)
+    except ValueError as e:
+        operator.report({'ERROR'}, str(e))
+        return {'CANCELLED'}
+
+    return {'FINISHED'}
@@ -1,26 +1,28 @@
 import bpy, mathutils, bmesh
+import contextlib
+import cProfile
+import fnmatch
+import os
 import time
+import numpy as np
 
+from io_scene_dtst3d.pipeline import BackgroundIterator
+from io_scene_dtst3d.profiling import ImportReport
+from io_scene_dtst3d.shapecache import get_default_cache
+from io_scene_dtst3d.transforms import *
 from io_scene_dtst3d.tsshape import *
 
 #from tsshape import *
 
+# vertex animation frames above this many bytes are welded and uploaded one frame at a time
+SHAPE_KEY_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# meshes prepared ahead of the one being built, when meshes are prepared on a worker thread
+MESH_PIPELINE_DEPTH = 4
+
 ######################################################
 # HELPERS
 ######################################################
-def triangle_strip_to_list(strip, clockwise):
-    """convert a strip of triangles into a list of triangles"""
-    triangle_list = []
-    for v in range(len(strip) - 2):
-        if clockwise:
-            triangle_list.extend([strip[v+1], strip[v], strip[v+2]])
-        else:
-            triangle_list.extend([strip[v], strip[v+1], strip[v+2]])
-        clockwise = not clockwise
-
-    return triangle_list
-
-
 def create_material(material_name):
     # Try to get existing material
     mtl = bpy.data.materials.get(material_name)
@@ -42,6 +44,25 @@ def translate_uv(uv):
 def translate_vert(vert):
     return (vert[0], vert[1], vert[2])
 
+
+def translate_quaternions(rotations):
+    """TQuaternion16 (x, y, z, w) arrays to Blender (w, x, y, z), the same way apply_node_transform_to_object does"""
+    values = rotations.astype(np.float32) / TQuaternion16.MAX_VALUE
+    return np.stack([values[..., 3], -values[..., 0], values[..., 1], values[..., 2]], axis=-1)
+
+
+def make_quaternions_continuous(quaternions):
+    """flip keys into the hemisphere of the key before, along the second to last axis, so keys don't spin the long way"""
+    if quaternions.shape[-2] < 2:
+        return
+    dots = np.sum(quaternions[..., 1:, :] * quaternions[..., :-1, :], axis=-1)
+    signs = np.cumprod(np.where(dots < 0.0, -1.0, 1.0), axis=-1)
+    quaternions[..., 1:, :] *= signs[..., None]
+
+
+def get_node_name(shape, node_index):
+    return shape.names[shape.nodes[node_index].name_index] if 0 <= node_index < len(shape.nodes) else f"Node{node_index}"
+
 ######################################################
 # IMPORT
 ######################################################
@@ -58,8 +79,8 @@ def apply_node_transform_to_object(shape_node, ob):
                                                     rotation_quaternion.z))
 
 
-def create_dummy_object_from_shape_object(shape, shape_object):
-    scn = bpy.context.scene
+def create_dummy_object_from_shape_object(shape, shape_object, collection=None):
+    collection = bpy.context.scene.collection if collection is None else collection
     
     shape_node = shape.nodes[shape_object.node_index]
     shape_object_name = shape.names[shape_object.name_index]
@@ -68,199 +89,844 @@ def create_dummy_object_from_shape_object(shape, shape_object):
     ob = bpy.data.objects.new(shape_object_name, None)
     apply_node_transform_to_object(shape_node, ob)
 
-    scn.collection.objects.link(ob)
+    collection.objects.link(ob)
 
     return ob
 
 
-def create_mesh_object_from_shape_object(shape, shape_object, shape_mesh_index, merge_verts=True):
-    scn = bpy.context.scene
-    
-    shape_node = shape.nodes[shape_object.node_index]
-    shape_object_name = shape.names[shape_object.name_index]
-    shape_mesh = shape.meshes[shape_object.start_mesh_index + shape_mesh_index]
+def has_degenerate_or_duplicate_faces(faces):
+    """check for triangles that Blender would reject or merge, these need the bmesh path"""
+    if len(faces) == 0:
+        return False
 
-    # create material remap
-    material_remap = {}
+    degenerate = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 0] == faces[:, 2])
+    if degenerate.any():
+        return True
 
-    # create blender mesh
-    me = bpy.data.meshes.new('DTSMesh' + str(shape_object.start_mesh_index + shape_mesh_index))
-    
+    unique_faces = np.unique(np.sort(faces, axis=1), axis=0)
+    return len(unique_faces) != len(faces)
+
+
+def build_mesh_in_bulk(me, positions, faces, loop_sources, face_materials, uv_streams, colors, report=None):
+    """fill a Blender mesh from flat arrays with a handful of foreach_set calls"""
+    report = ImportReport() if report is None else report
+    laps = report.laps()
+    num_faces = len(faces)
+    num_loops = num_faces * 3
+
+    me.vertices.add(len(positions))
+    me.vertices.foreach_set("co", np.ascontiguousarray(positions, dtype=np.float32).ravel())
+
+    me.loops.add(num_loops)
+    me.loops.foreach_set("vertex_index", np.ascontiguousarray(faces, dtype=np.int32).ravel())
+
+    me.polygons.add(num_faces)
+    me.polygons.foreach_set("loop_start", np.arange(0, num_loops, 3, dtype=np.int32))
+    if bpy.app.version < (4, 0, 0):
+        me.polygons.foreach_set("loop_total", np.full(num_faces, 3, dtype=np.int32))
+    me.polygons.foreach_set("material_index", np.ascontiguousarray(face_materials, dtype=np.int32))
+    me.polygons.foreach_set("use_smooth", np.ones(num_faces, dtype=bool))
+    laps.lap("face build")
+
+    # loop attributes, looked up from the original DTS vertex of each corner
+    loop_sources = loop_sources.ravel()
+    for uvs in uv_streams:
+        loop_uvs = uvs[loop_sources]
+        loop_uvs[:, 1] = 1.0 - loop_uvs[:, 1]
+        me.uv_layers.new().data.foreach_set("uv", loop_uvs.ravel())
+
+    if colors is not None:
+        vc_layer = me.color_attributes.new("Col", 'BYTE_COLOR', 'CORNER')
+        vc_layer.data.foreach_set("color_srgb", np.ascontiguousarray(colors[loop_sources]).ravel())
+    laps.lap("loop attributes")
+
+    me.update(calc_edges=True)
+    laps.lap("mesh update")
+
+
+def build_mesh_with_bmesh(me, positions, faces, loop_sources, face_materials, uv_streams, colors, report=None):
+    """fill a Blender mesh face by face, skipping faces that bmesh refuses"""
+    report = ImportReport() if report is None else report
+    laps = report.laps()
     bm = bmesh.new()
     bm.from_mesh(me)
 
-    uv_layer = None
-    uv2_layer = None
+    uv_layers = [bm.loops.layers.uv.new() for _ in uv_streams]
+    uv_values = [uvs.tolist() for uvs in uv_streams]
     vc_layer = None
-
-    if len(shape_mesh.tvertices) == len(shape_mesh.vertices):
-        uv_layer = bm.loops.layers.uv.new()
-    if len(shape_mesh.t2vertices) == len(shape_mesh.vertices):
-        uv2_layer = bm.loops.layers.uv.new()
-    if len(shape_mesh.colors) == len(shape_mesh.vertices):
+    vc_values = None
+    if colors is not None:
         vc_layer = bm.loops.layers.color.new()
-    
-    # create object
-    ob = bpy.data.objects.new(shape_object_name, me)
-    apply_node_transform_to_object(shape_node, ob)
+        vc_values = colors.tolist()
 
-    scn.collection.objects.link(ob)
+    vertices = [bm.verts.new(translate_vert(position)) for position in positions.tolist()]
 
-    # remap to merge verts with same normals for Blender because DTS is a game-ready format
-    # which requires unique vertices for each combination of TVerts/Normals
-    vertex_count = len(shape_mesh.vertices)
-    vert_remap = {}
-    vertices = []    
-    
-    if merge_verts:
-        for x in range(vertex_count):
-            position = shape_mesh.vertices[x]
-            normal = shape_mesh.normals[x]
-            key = (position, normal)
-            if not key in vert_remap:
-                vert_remap[key] = len(vert_remap)
-                vertices.append(bm.verts.new(translate_vert(position)))
-    else:
-        for x in range(vertex_count):
-            position = shape_mesh.vertices[x]
-            vertices.append(bm.verts.new(translate_vert(position)))
+    for indices, sources, material_index in zip(faces.tolist(), loop_sources.tolist(), face_materials.tolist()):
+        try:
+            bmverts = (vertices[indices[0]], vertices[indices[1]], vertices[indices[2]])
+            face = bm.faces.new(bmverts)
 
-    # assemble blender mesh
-    mesh_indices = shape_mesh.indices 
-    
-    for prim in shape_mesh.primitives:
-        # setup material (TODO: have a list of mats)
-        if not prim.material_index in material_remap:
-            ts_material = shape.materials[prim.material_index]
-            material_remap[prim.material_index] = len(material_remap)
-            ob.data.materials.append(create_material(ts_material.name))
-
-        if prim.type == TSDrawPrimitiveType.Triangles or prim.type == TSDrawPrimitiveType.Strip:
-            # get raw primitive indices
-            prim_indices = []
-            if prim.type == TSDrawPrimitiveType.Triangles:
-                prim_indices = mesh_indices[prim.start:prim.start+prim.num_elements]
-            else:
-                strip_indices = mesh_indices[prim.start:prim.start+prim.num_elements]
-                prim_indices = triangle_strip_to_list(strip_indices, False)
-
-            # remap prim indices
-            if merge_verts:
-                for x in range(len(prim_indices)):
-                    vert_index = prim_indices[x]
-                    position = shape_mesh.vertices[vert_index]
-                    normal = shape_mesh.normals[vert_index]
-                    key = (position, normal)
-                    prim_indices[x] = vert_remap[key]
-
-            # create faces
-            for x in range(0, len(prim_indices), 3):
-                indices = (prim_indices[x + 2], prim_indices[x + 1], prim_indices[x])
-                try:
-                    bmverts = (vertices[indices[0]], vertices[indices[1]], vertices[indices[2]])
-                    face = bm.faces.new(bmverts)
-
-                    if uv_layer is not None:
-                        for y in range(3):
-                            face.loops[y][uv_layer].uv = translate_uv(shape_mesh.tvertices[indices[y]])
-                    if uv2_layer is not None:
-                        for y in range(3):
-                            face.loops[y][uv2_layer].uv = translate_uv(shape_mesh.t2vertices[indices[y]])
-                    if vc_layer is not None:
-                        for y in range(3):
-                            face.loops[y][vc_layer] = shape_mesh.colors[indices[y]]
-
-                    face.material_index = material_remap[prim.material_index]
-                    face.smooth = True
-                except Exception as e:
-                    print(str(e))
-        else:
-            print(f"Unsupported prim type {prim.type}, ignoring.")
+            for layer, values in zip(uv_layers, uv_values):
+                for y in range(3):
+                    face.loops[y][layer].uv = translate_uv(values[sources[y]])
+            if vc_layer is not None:
+                for y in range(3):
+                    face.loops[y][vc_layer] = vc_values[sources[y]]
+
+            face.material_index = material_index
+            face.smooth = True
+        except Exception as e:
+            report.count("skipped faces")
+            print(str(e))
 
     # calculate normals
     bm.normal_update()
+    laps.lap("face build")
 
     # free resources
     bm.to_mesh(me)
     bm.free()
+    laps.lap("bm.to_mesh")
+
+
+def create_vertex_group_names(shape, shape_mesh, ob):
+    """create an empty vertex group for each bone of a skinned mesh, named after the bone's node"""
+    return [ob.vertex_groups.new(name=get_node_name(shape, node_index)) for node_index in shape_mesh.node_indices.tolist()]
+
+
+def create_vertex_groups(shape, shape_mesh, ob, num_vertices, vertex_remap=None):
+    """create a vertex group for each bone of a skinned mesh, named after the bone's node
+    influences are grouped by bone and weight, each group of vertices is added with one call"""
+    vertex_groups = create_vertex_group_names(shape, shape_mesh, ob)
+
+    weight_groups = shape_mesh.get_weight_groups(num_vertices, vertex_remap)
+    for bone, weight, vertices in weight_groups:
+        vertex_groups[bone].add(vertices, weight, 'REPLACE')
+
+    shape.report.count("influences", sum(len(vertices) for _, _, vertices in weight_groups))
+    shape.report.count("vertex group adds", len(weight_groups))
+
+
+def create_shape_keys(shape, shape_mesh, ob, first_vertices=None, memory_limit=SHAPE_KEY_MEMORY_LIMIT):
+    """add a shape key for each vertex animation frame after the first, the coordinates of each key are set with one call
+    first_vertices is the original vertex of each welded vertex, when the mesh was welded"""
+    ob.shape_key_add(name="Basis", from_mix=False)
+    for frame, positions in enumerate(shape_mesh.iter_frames_vertices(first_vertices, memory_limit), 1):
+        key = ob.shape_key_add(name=f"Frame{frame}", from_mix=False)
+        key.data.foreach_set("co", positions.ravel())
+        shape.report.count("shape keys")
+
+
+class PreparedMesh:
+    """what the Blender mesh of a shape mesh is built from, prepared without bpy so it can happen on another thread
+    shared meshes only have their digest, their geometry is taken from the mesh built for the same digest"""
+    def __init__(self, mesh_index, shape_mesh):
+        self.mesh_index = mesh_index
+        self.shape_mesh = shape_mesh
+        self.digest = None
+        self.shared = False
+        self.material_indices = [] # DTS material of each material slot, -1 for an empty slot
+        self.positions = None
+        self.faces = None
+        self.face_indices = None # faces as indices into the DTS vertex streams
+        self.face_materials = None
+        self.uv_streams = []
+        self.colors = None
+        self.first_vertices = None
+        self.vertex_remap = None
+        self.use_bmesh = False
+
+
+def prepare_mesh(shape, mesh_index, merge_verts=True, use_digest=False, shared_digests=None):
+    """decode a shape mesh and compute the arrays its Blender mesh is built from
+    with use_digest the geometry digest is computed, meshes whose digest is in shared_digests are not prepared any further"""
+    report = shape.report
+    shape_mesh = shape.meshes[mesh_index]
+    prepared = PreparedMesh(mesh_index, shape_mesh)
+    if not isinstance(shape_mesh, TSMesh):
+        return prepared
+
+    if use_digest:
+        with report.span("geometry digest"):
+            prepared.digest = shape_mesh.get_geometry_digest()
+        if shared_digests is not None and prepared.digest in shared_digests:
+            prepared.shared = True
+            return prepared
+
+    laps = report.laps()
+    num_materials = len(shape.materials)
+    material_remap = {}
+    for prim in shape_mesh.primitives:
+        # primitives without a material, or with one the shape doesn't have, get an empty material slot
+        ts_material_index = -1 if prim.has_no_material or prim.material_index >= num_materials else prim.material_index
+        if not ts_material_index in material_remap:
+            material_remap[ts_material_index] = len(material_remap)
+            prepared.material_indices.append(ts_material_index)
+
+        if prim.type != TSDrawPrimitiveType.Triangles and prim.type != TSDrawPrimitiveType.Strip:
+            report.count("skipped primitives")
+            print(f"Unsupported prim type {prim.type}, ignoring.")
+    laps.lap("materials")
+
+    # triangles as indices into the DTS vertex streams, already wound for Blender
+    # vertex animated meshes are built from their first frame, the other frames become shape keys
+    vertices = shape_mesh.get_frame_vertices(0)
+    normals = shape_mesh.get_frame_normals(0)
+    num_frames = shape_mesh.get_frame_count()
+    vertex_count = len(vertices)
+    face_indices, face_ts_materials = shape_mesh.get_triangles()
+
+    # shifted by one for the empty slot
+    material_lookup = np.zeros(max(material_remap, default=-1) + 2, dtype=np.int32)
+    for ts_material_index, material_slot in material_remap.items():
+        material_lookup[ts_material_index + 1] = material_slot
+    face_ts_materials = np.where(face_ts_materials < num_materials, face_ts_materials, -1)
+    face_materials = material_lookup[face_ts_materials + 1]
+
+    valid_faces = ((face_indices >= 0) & (face_indices < vertex_count)).all(axis=1)
+    if not valid_faces.all():
+        print(f"Skipping {len(valid_faces) - valid_faces.sum()} faces with out of range indices")
+        report.count("skipped faces", int(len(valid_faces) - valid_faces.sum()))
+        face_indices = face_indices[valid_faces]
+        face_materials = face_materials[valid_faces]
+    laps.lap("triangles")
 
-    return ob
+    # remap to merge verts with same normals for Blender because DTS is a game-ready format
+    # which requires unique vertices for each combination of TVerts/Normals
+    # vertices which part in a later frame stay apart
+    if merge_verts:
+        digests = shape_mesh.get_frame_digests() if num_frames > 1 else None
+        prepared.first_vertices, prepared.vertex_remap = weld_vertices(vertices, normals, digests)
+        print(f"   merged {vertex_count - len(prepared.first_vertices)} of {vertex_count} vertices")
+        report.count("merged vertices", vertex_count - len(prepared.first_vertices))
+        prepared.positions = vertices[prepared.first_vertices]
+        prepared.faces = prepared.vertex_remap[face_indices]
+    else:
+        prepared.positions = vertices
+        prepared.faces = face_indices
+    prepared.face_indices = face_indices
+    prepared.face_materials = face_materials
+    laps.lap("weld")
+
+    # per vertex streams which can become loop attributes, streams with several frames use the first
+    def get_first_frame(stream):
+        if vertex_count == 0 or len(stream) == 0 or len(stream) % vertex_count != 0:
+            return None
+        return stream[:vertex_count]
+    prepared.uv_streams = [uvs for uvs in map(get_first_frame, (shape_mesh.tvertices, shape_mesh.t2vertices)) if uvs is not None]
+    prepared.colors = get_first_frame(shape_mesh.colors)
+
+    prepared.use_bmesh = has_degenerate_or_duplicate_faces(prepared.faces)
+    laps.lap("face checks")
+    return prepared
+
+
+def create_mesh_object_from_shape_object(shape, shape_object, shape_mesh_index, merge_verts=True, collection=None, mesh_cache=None,
+                                         prepared=None):
+    """mesh_cache maps geometry digests to the Blender meshes built so far, objects with identical geometry share one mesh
+    prepared is the mesh from prepare_mesh, when it was prepared ahead of time"""
+    collection = bpy.context.scene.collection if collection is None else collection
+    report = shape.report
+    
+    shape_node = shape.nodes[shape_object.node_index]
+    shape_object_name = shape.names[shape_object.name_index]
+    mesh_index = shape_object.start_mesh_index + shape_mesh_index
+    if prepared is None:
+        prepared = prepare_mesh(shape, mesh_index, merge_verts, mesh_cache is not None, mesh_cache)
+    shape_mesh = prepared.shape_mesh
+
+    me = mesh_cache.get(prepared.digest) if mesh_cache is not None else None
+    if me is not None:
+        ob = bpy.data.objects.new(shape_object_name, me)
+        apply_node_transform_to_object(shape_node, ob)
+        collection.objects.link(ob)
+        report.count("objects")
+        report.count("shared meshes")
+
+        # vertex group names and weights are stored in the shared mesh since Blender 3.0, so there's nothing to add
+        return ob
+
+    if prepared.shared:
+        # prepared for a mesh which is not in this cache
+        prepared = prepare_mesh(shape, mesh_index, merge_verts, mesh_cache is not None)
 
+    # create blender mesh
+    me = bpy.data.meshes.new('DTSMesh' + str(mesh_index))
+    
+    # create object
+    ob = bpy.data.objects.new(shape_object_name, me)
+    apply_node_transform_to_object(shape_node, ob)
 
-def read_dts_file(file, filepath, merge_verts=True):
-    time1 = time.perf_counter()
+    collection.objects.link(ob)
+    report.count("objects")
 
-    # read shape
-    shape = TSShape()
-    shape.read_from_path(filepath)
+    # setup materials (TODO: have a list of mats)
+    for ts_material_index in prepared.material_indices:
+        ob.data.materials.append(create_material(shape.materials[ts_material_index].name) if ts_material_index >= 0 else None)
 
-    print("   parsed shape file in %.4f sec." % (time.perf_counter() - time1))
-    time1 = time.perf_counter()
+    positions = prepared.positions
+    faces = prepared.faces
+    report.count("vertices", len(positions))
+    report.count("faces", len(faces))
 
-    for sequence in shape.sequences:
-        if sequence.name_index >= 0:
-            sequence_name = shape.names[sequence.name_index]
-            print(f"Found sequence: {sequence_name}, {sequence.num_keyframes} keyframes")
-        else:
-            print(f"Found unnamed sequence with {sequence.num_keyframes} keyframes")
+    if prepared.use_bmesh:
+        print(f"{shape_object_name} has degenerate or duplicate faces, building with bmesh")
+        report.count("bmesh fallbacks")
+        build_mesh_with_bmesh(me, positions, faces, prepared.face_indices, prepared.face_materials, prepared.uv_streams,
+                              prepared.colors, report)
+    else:
+        build_mesh_in_bulk(me, positions, faces, prepared.face_indices, prepared.face_materials, prepared.uv_streams,
+                           prepared.colors, report)
+
+    if isinstance(shape_mesh, TSSkinnedMesh):
+        with report.span("vertex groups"):
+            create_vertex_groups(shape, shape_mesh, ob, len(positions), prepared.vertex_remap)
+
+    if shape_mesh.get_frame_count() > 1:
+        with report.span("shape keys"):
+            create_shape_keys(shape, shape_mesh, ob, prepared.first_vertices)
+
+    if mesh_cache is not None:
+        mesh_cache[prepared.digest] = me
+
+    return ob
+
+
+def create_armature(shape, name, collection=None):
+    """create an armature with a bone at the rest transform of each node
+    world transforms are composed for all nodes at once, and all bones are added in one edit mode session"""
+    collection = bpy.context.scene.collection if collection is None else collection
+    report = shape.report
+
+    parents = np.array([node.parent_index for node in shape.nodes], dtype=np.int64)
+    world_rotations, world_translations = get_world_transforms(parents,
+                                                               translate_quaternions(shape.default_rotations),
+                                                               shape.default_translations)
+    matrices = get_world_matrices(world_rotations, world_translations)
+    lengths = get_bone_lengths(parents, world_translations)
+
+    armature = bpy.data.armatures.new(name)
+    ob = bpy.data.objects.new(name, armature)
+    collection.objects.link(ob)
+
+    view_layer = bpy.context.view_layer
+    active_object = view_layer.objects.active
+    view_layer.objects.active = ob
+    bpy.ops.object.mode_set(mode='EDIT')
+
+    edit_bones = [armature.edit_bones.new(get_node_name(shape, node_index)) for node_index in range(len(parents))]
+    for edit_bone, matrix, length in zip(edit_bones, matrices.tolist(), lengths.tolist()):
+        # the matrix setter keeps the bone's length, so give it one first
+        edit_bone.tail = (0.0, length, 0.0)
+        edit_bone.matrix = mathutils.Matrix(matrix)
+    for edit_bone, parent_index in zip(edit_bones, parents.tolist()):
+        if 0 <= parent_index < len(edit_bones):
+            edit_bone.parent = edit_bones[parent_index]
+
+    bpy.ops.object.mode_set(mode='OBJECT')
+    view_layer.objects.active = active_object
+    report.count("bones", len(edit_bones))
 
-    # create Blender representation
+    return ob
+
+
+def bind_object_to_armature(shape, shape_object, shape_mesh, ob, armature_object):
+    """skinned meshes are deformed by the armature, other objects follow the bone of their node"""
+    ob.parent = armature_object
+    ob.location = (0.0, 0.0, 0.0)
+    ob.rotation_quaternion = (1.0, 0.0, 0.0, 0.0)
+
+    if isinstance(shape_mesh, TSSkinnedMesh):
+        # skinned vertices are in shape space, the vertex groups are named after the bones
+        modifier = ob.modifiers.new("Armature", 'ARMATURE')
+        modifier.object = armature_object
+        return
+
+    bone = armature_object.data.bones.get(get_node_name(shape, shape_object.node_index))
+    if bone is None:
+        return
+    ob.parent_type = 'BONE'
+    ob.parent_bone = bone.name
+    # bone children hang off the tail, move them back to the head
+    ob.matrix_parent_inverse = mathutils.Matrix.Translation((0.0, -bone.length, 0.0))
+
+
+def create_fcurves(action, data_path, frames, values, group):
+    """add an F-curve for each column of values, the keys of each curve are set in bulk"""
+    num_keys = len(frames)
+    linear = bpy.types.Keyframe.bl_rna.properties["interpolation"].enum_items["LINEAR"].value
+    interpolation = np.full(num_keys, linear, dtype=np.int32)
+
+    co = np.empty((num_keys, 2), dtype=np.float32)
+    co[:, 0] = frames
+    for index in range(values.shape[1]):
+        co[:, 1] = values[:, index]
+        fcurve = action.fcurves.new(data_path, index=index, action_group=group)
+        fcurve.keyframe_points.add(num_keys)
+        fcurve.keyframe_points.foreach_set("co", co.ravel())
+        fcurve.keyframe_points.foreach_set("interpolation", interpolation)
+        fcurve.update()
+
+
+def create_sequence_actions(shape, node_objects):
+    """create an action for each sequence and object on an animated node
+    every object gets an NLA track per sequence, only the first sequence's tracks are left unmuted"""
+    report = shape.report
+    render = bpy.context.scene.render
+    fps = render.fps / render.fps_base
+
+    for sequence_index, sequence in enumerate(shape.sequences):
+        if sequence.num_keyframes <= 0:
+            continue
+        sequence_name = shape.names[sequence.name_index] if sequence.name_index >= 0 else f"Sequence{sequence_index}"
+
+        keyframes = shape.get_sequence_keyframes(sequence)
+        frames = 1.0 + keyframes.get_times(sequence) * fps
+        rotations = translate_quaternions(keyframes.rotations)
+        make_quaternions_continuous(rotations)
+
+        # gather the tracks of each node which has an object
+        node_channels = {}
+        for data_path, nodes, values in (("location", keyframes.translation_nodes, keyframes.translations),
+                                         ("rotation_quaternion", keyframes.rotation_nodes, rotations),
+                                         ("scale", keyframes.scale_nodes, keyframes.scales)):
+            for row, node_index in enumerate(nodes.tolist()):
+                if node_index in node_objects:
+                    node_channels.setdefault(node_index, []).append((data_path, values[row]))
+
+        for node_index, channels in node_channels.items():
+            ob = node_objects[node_index]
+            action = bpy.data.actions.new(f"{sequence_name}_{ob.name}")
+            for data_path, values in channels:
+                create_fcurves(action, data_path, frames, values, "Object Transforms")
+                report.count("fcurves", values.shape[1])
+                report.count("keyframes", values.shape[1] * len(frames))
+
+            if ob.animation_data is None:
+                ob.animation_data_create()
+            track = ob.animation_data.nla_tracks.new()
+            track.name = sequence_name
+            track.strips.new(sequence_name, int(frames[0]), action)
+            track.mute = sequence_index > 0
+            report.count("actions")
+
+
+def create_armature_sequence_actions(shape, armature_object):
+    """create an action for each sequence on the armature, keyed on the pose bones
+    pose bone channels are relative to the rest pose, so keys are made relative to the node's default transform"""
+    report = shape.report
+    render = bpy.context.scene.render
+    fps = render.fps / render.fps_base
+    bones = armature_object.data.bones
+
+    num_nodes = len(shape.nodes)
+    rest_inverse = quaternion_conjugate(quaternion_normalize(translate_quaternions(shape.default_rotations)))
+    rest_translations = shape.default_translations
+
+    for sequence_index, sequence in enumerate(shape.sequences):
+        if sequence.num_keyframes <= 0 or num_nodes == 0:
+            continue
+        sequence_name = shape.names[sequence.name_index] if sequence.name_index >= 0 else f"Sequence{sequence_index}"
+
+        keyframes = shape.get_sequence_keyframes(sequence)
+        frames = 1.0 + keyframes.get_times(sequence) * fps
+
+        rotation_rest = rest_inverse[np.minimum(keyframes.rotation_nodes, num_nodes - 1)]
+        rotations = quaternion_multiply(rotation_rest[:, None, :], translate_quaternions(keyframes.rotations))
+        make_quaternions_continuous(rotations)
+
+        translation_nodes = np.minimum(keyframes.translation_nodes, num_nodes - 1)
+        translations = quaternion_rotate(rest_inverse[translation_nodes][:, None, :],
+                                         keyframes.translations - rest_translations[translation_nodes][:, None, :])
+
+        action = bpy.data.actions.new(sequence_name)
+        for data_path, nodes, values in (("location", keyframes.translation_nodes, translations),
+                                         ("rotation_quaternion", keyframes.rotation_nodes, rotations),
+                                         ("scale", keyframes.scale_nodes, keyframes.scales)):
+            for row, node_index in enumerate(nodes.tolist()):
+                bone = bones.get(get_node_name(shape, node_index)) if node_index < num_nodes else None
+                if bone is None:
+                    continue
+                bone_path = f'pose.bones["{bpy.utils.escape_identifier(bone.name)}"].{data_path}'
+                create_fcurves(action, bone_path, frames, values[row], bone.name)
+                report.count("fcurves", values.shape[2])
+                report.count("keyframes", values.shape[2] * len(frames))
+
+        if armature_object.animation_data is None:
+            armature_object.animation_data_create()
+        track = armature_object.animation_data.nla_tracks.new()
+        track.name = sequence_name
+        track.strips.new(sequence_name, int(frames[0]), action)
+        track.mute = sequence_index > 0
+        report.count("actions")
+
+
+def get_shape_object_meshes(shape, detail=None):
+    """(object index, mesh index) of each object to create, the mesh index is -1 for objects without a mesh
+    with a detail level, these are the objects of its sub shape and their meshes at that level,
+    otherwise every object and its first mesh"""
+    if detail is None:
+        return [(object_index, shape_object.start_mesh_index if shape_object.num_meshes > 0 else -1)
+                for object_index, shape_object in enumerate(shape.objects)]
+    return [(object_index, shape.get_detail_mesh_index(object_index, detail))
+            for object_index in shape.get_sub_shape_objects(detail.sub_shape_num)]
+
+
+def iter_prepared_meshes(shape, details, merge_verts=True):
+    """prepare the meshes of each detail level (None for the first meshes) in the order create_shape_objects uses them
+    meshes with the geometry of an earlier mesh of the same detail level only get their digest, see prepare_mesh"""
+    for detail in details:
+        digests = set()
+        for _, mesh_index in get_shape_object_meshes(shape, detail):
+            if mesh_index >= 0:
+                prepared = prepare_mesh(shape, mesh_index, merge_verts, True, digests)
+                if prepared.digest is not None:
+                    digests.add(prepared.digest)
+                yield prepared
+
+
+def create_shape_objects(shape, merge_verts=True, collection=None, armature_object=None, detail=None, prepared_meshes=None):
+    """create the objects of a shape, returns the created object of each node
+    the objects and meshes are those of get_shape_object_meshes
+    prepared_meshes is an iterator over these meshes from iter_prepared_meshes, otherwise meshes are prepared here
+    with an armature, objects are bound to it instead of being parented to each other"""
     hierarchy = {}
+    for _ in iter_create_shape_objects(shape, hierarchy, merge_verts, collection, armature_object, detail, prepared_meshes):
+        pass
+    return hierarchy
+
 
-    for shape_index, shape_object in enumerate(shape.objects):
+def iter_create_shape_objects(shape, hierarchy, merge_verts=True, collection=None, armature_object=None, detail=None,
+                              prepared_meshes=None):
+    """like create_shape_objects, one object at a time, yields after each object
+    the created object of each node is added to hierarchy"""
+    report = shape.report
+    mesh_cache = {}
+
+    for object_index, mesh_index in get_shape_object_meshes(shape, detail):
+        shape_object = shape.objects[object_index]
         shape_object_name = shape.names[shape_object.name_index]
+
         print(f"Importing shape object {shape_object_name} with {shape_object.num_meshes} meshes")
-        if shape_object.num_meshes > 0:
-            shape_mesh = shape.meshes[shape_object.start_mesh_index]
+        if mesh_index >= 0:
+            # only the meshes used here are accessed, so lazy shapes never decode the others
+            prepared = None
+            if prepared_meshes is not None:
+                with report.span("mesh wait"):
+                    prepared = next(prepared_meshes)
+                shape_mesh = prepared.shape_mesh
+            else:
+                shape_mesh = shape.meshes[mesh_index]
             shape_node = shape.nodes[shape_object.node_index]
 
             parent = None if shape_node.parent_index < 0 else hierarchy.get(shape_node.parent_index)
             created_object = None
             if isinstance(shape_mesh, TSMesh) or isinstance(shape_mesh, TSSkinnedMesh):
-                created_object = create_mesh_object_from_shape_object(shape, shape_object, 0, merge_verts)
+                created_object = create_mesh_object_from_shape_object(shape, shape_object, mesh_index - shape_object.start_mesh_index,
+                                                                      merge_verts, collection, mesh_cache, prepared)
             elif isinstance(shape_mesh, TSNullMesh):
-                created_object = create_dummy_object_from_shape_object(shape, shape_object)
+                created_object = create_dummy_object_from_shape_object(shape, shape_object, collection)
             else:
                 print(f"Not creating object for {shape_object_name}: unsupported TSMesh type")
 
             if created_object is not None:
                 hierarchy[shape_object.node_index] = created_object
-                if parent is not None:
+                if armature_object is not None:
+                    bind_object_to_armature(shape, shape_object, shape_mesh, created_object, armature_object)
+                elif parent is not None:
                     created_object.parent = parent
                     created_object.matrix_parent_inverse = parent.matrix_world.inverted()
         else:
             print(f"Not creating object for {shape_object_name}: no assigned mesh")
+        yield
+
+
+def get_detail_name(shape, detail):
+    return shape.names[detail.name_index] if 0 <= detail.name_index < len(shape.names) else "Detail"
+
+
+def get_details_to_import(shape, import_details='FIRST', detail_names=""):
+    """the detail levels to import, or None to import the first mesh of every object
+    HIGHEST_AND_COLLISION picks the first visible detail and the details with a negative size,
+    which Torque uses for collision and LOS meshes, CUSTOM picks details by comma separated name patterns"""
+    if import_details == 'FIRST' or len(shape.details) == 0:
+        return None
+
+    # billboard details have no meshes
+    details = [detail for detail in shape.details if detail.sub_shape_num >= 0 and detail.object_detail_num >= 0]
+    if import_details == 'ALL':
+        return details
+    if import_details == 'HIGHEST_AND_COLLISION':
+        visible = [detail for detail in details if detail.size >= 0.0]
+        return visible[:1] + [detail for detail in details if detail.size < 0.0]
+    if import_details == 'CUSTOM':
+        patterns = [pattern.strip().lower() for pattern in detail_names.split(",") if pattern.strip()]
+        return [detail for detail in details
+                if any(fnmatch.fnmatchcase(get_detail_name(shape, detail).lower(), pattern) for pattern in patterns)]
+    raise ValueError(f"Unknown detail selection {import_details}")
+
+
+def create_shape(shape, name, merge_verts=True, collection=None, import_sequences=True, import_armature=False,
+                 import_details='FIRST', detail_names="", use_threads=True):
+    """create the armature, objects and actions of a shape
+    when detail levels are selected, each one gets its own collection, see get_details_to_import
+    with use_threads, meshes are decoded and prepared on a worker thread while the objects of the meshes before them are built"""
+    for _ in iter_create_shape(shape, name, merge_verts, collection, import_sequences, import_armature,
+                               import_details, detail_names, use_threads):
+        pass
+
+
+def iter_create_shape(shape, name, merge_verts=True, collection=None, import_sequences=True, import_armature=False,
+                      import_details='FIRST', detail_names="", use_threads=True):
+    """like create_shape, one step at a time, yields (steps done, number of steps) after each step
+    the steps are the armature, each object and the sequence actions, closing the generator stops the mesh worker"""
+    report = shape.report
+    collection = bpy.context.scene.collection if collection is None else collection
+
+    details = get_details_to_import(shape, import_details, detail_names)
+    import_armature = import_armature and len(shape.nodes) > 0
+    num_steps = sum(len(get_shape_object_meshes(shape, detail)) for detail in ([None] if details is None else details))
+    num_steps += int(import_armature) + int(import_sequences)
+    step = 0
+
+    prepared_meshes = iter_prepared_meshes(shape, [None] if details is None else details, merge_verts)
+    if use_threads:
+        prepared_meshes = BackgroundIterator(prepared_meshes, MESH_PIPELINE_DEPTH, name="DTS mesh preparation")
+
+    with report.span("build"), contextlib.closing(prepared_meshes):
+        armature_object = None
+        if import_armature:
+            with report.span("armature"):
+                armature_object = create_armature(shape, name, collection)
+            step += 1
+            yield step, num_steps
+
+        hierarchies = []
+        for detail in ([None] if details is None else details):
+            detail_collection = collection
+            if detail is not None:
+                detail_collection = bpy.data.collections.new(f"{get_detail_name(shape, detail)} ({detail.size:g})")
+                collection.children.link(detail_collection)
+            hierarchies.append({})
+            for _ in iter_create_shape_objects(shape, hierarchies[-1], merge_verts, detail_collection, armature_object,
+                                               detail, prepared_meshes):
+                step += 1
+                yield step, num_steps
+        if details is not None:
+            report.count("details", len(details))
+
+    if import_sequences:
+        with report.span("sequence actions"):
+            if armature_object is not None:
+                create_armature_sequence_actions(shape, armature_object)
+            else:
+                for node_objects in hierarchies:
+                    create_sequence_actions(shape, node_objects)
+        step += 1
+        yield step, num_steps
 
-    print("   created objects in %.4f sec." % (time.perf_counter() - time1))
+
+def print_sequences(shape):
+    for sequence in shape.sequences:
+        if sequence.name_index >= 0:
+            sequence_name = shape.names[sequence.name_index]
+            print(f"Found sequence: {sequence_name}, {sequence.num_keyframes} keyframes")
+        else:
+            print(f"Found unnamed sequence with {sequence.num_keyframes} keyframes")
+
+
+def read_dts_file(file, filepath, merge_verts=True, report=None, import_sequences=True, import_armature=False,
+                  import_details='FIRST', detail_names="", use_threads=True):
+    """import a shape, returns the report with the timings and counters of each phase
+    the header is parsed first, the meshes are decoded while objects are built, see create_shape"""
+    report = ImportReport() if report is None else report
+
+    # read shape, the file stays mapped so only the meshes that get imported are decoded
+    with TSShape(lazy_meshes=True, report=report) as shape:
+        with report.span("parse"):
+            shape.read_from_path(filepath, cache=get_default_cache())
+
+        print("   parsed shape file in %.4f sec." % report.get_seconds("parse"))
+        print_sequences(shape)
+
+        # create Blender representation
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        create_shape(shape, name, merge_verts, import_sequences=import_sequences, import_armature=import_armature,
+                     import_details=import_details, detail_names=detail_names, use_threads=use_threads)
+
+    print("   created objects in %.4f sec." % report.get_seconds("build"))
+    return report
+
+
+def write_profile_output(filepath, report, profile=None):
+    """write the report as JSON, and the cProfile stats when given, next to the imported file"""
+    try:
+        report.write_json(filepath + ".import.json")
+        if profile is not None:
+            profile.dump_stats(filepath + ".import.prof")
+    except OSError as e:
+        print(f"Couldn't write profiling output next to {filepath}: {e}")
 
 ######################################################
 # IMPORT
 ######################################################
 def load_dts(filepath,
              context,
-             merge_verts=True):
+             merge_verts=True,
+             profile_output='NONE',
+             import_sequences=True,
+             import_armature=False,
+             import_details='FIRST',
+             detail_names=""):
 
     print("importing DTS: %r..." % (filepath))
 
     time1 = time.perf_counter()
     file = open(filepath, 'rb')
 
-    # start reading our bnd file
-    read_dts_file(file, filepath, merge_verts)
+    # profile the whole import with cProfile on request
+    profile = cProfile.Profile() if profile_output == 'CPROFILE' else None
+    if profile is not None:
+        profile.enable()
+
+    # start reading our bnd file, cProfile only sees the main thread so meshes are prepared there when profiling
+    try:
+        report = read_dts_file(file, filepath, merge_verts, import_sequences=import_sequences, import_armature=import_armature,
+                               import_details=import_details, detail_names=detail_names, use_threads=profile is None)
+    finally:
+        if profile is not None:
+            profile.disable()
 
     print(" done in %.4f sec." % (time.perf_counter() - time1))
     file.close()
 
+    if profile_output != 'NONE':
+        print(report.format())
+        write_profile_output(filepath, report, profile)
+
+    return report
+
+
+def iter_read_shape(shape, filepath):
+    """read a shape from a file and yield it, for reading on a worker thread with BackgroundIterator"""
+    with shape.report.span("parse"):
+        shape.read_from_path(filepath, cache=get_default_cache())
+    yield shape
+
+
+def get_data_pointers(collection_names) -> dict:
+    """the pointers of the datablocks in each bpy.data collection, to find what an import added"""
+    return {name: {datablock.as_pointer() for datablock in getattr(bpy.data, name)} for name in collection_names}
+
+
+class ImportJob:
+    """an import which runs a little at a time, for the modal import operator
+    the shape is parsed on a worker thread, then each call to step builds objects for about a time slice,
+    cancel removes whatever was created so far"""
+    # what an import creates, objects first so the data they use is unused when it's removed
+    DataCollections = ("objects", "meshes", "armatures", "actions", "materials", "collections")
+
+    def __init__(self, filepath, merge_verts=True, profile_output='NONE', import_sequences=True, import_armature=False,
+                 import_details='FIRST', detail_names=""):
+        self.filepath = filepath
+        self.name = os.path.splitext(os.path.basename(filepath))[0]
+        self.report = ImportReport()
+        self._options = {"merge_verts": merge_verts, "import_sequences": import_sequences, "import_armature": import_armature,
+                         "import_details": import_details, "detail_names": detail_names}
+        self._profile_output = profile_output
+        self._existing_data = get_data_pointers(ImportJob.DataCollections)
+        self._time1 = time.perf_counter()
+
+        print("importing DTS: %r..." % (filepath))
+        self._shape = TSShape(lazy_meshes=True, report=self.report)
+        self._reader = BackgroundIterator(iter_read_shape(self._shape, filepath), 1, name="DTS parse")
+        self._steps = None
+        self._step = 0
+        self._num_steps = 0
+        self._finished = False
+
+    @property
+    def progress(self) -> float:
+        """fraction of the build steps done, 0 while parsing"""
+        return self._step / self._num_steps if self._num_steps > 0 else float(self._finished)
+
+    @property
+    def status(self) -> str:
+        if self._steps is None:
+            return "Reading shape"
+        return f"Building {self._step} of {self._num_steps}"
+
+    def step(self, time_slice: float = 0.05) -> bool:
+        """do about time_slice seconds of work, returns True when the import is finished
+        errors of the import are raised here, call cancel to clean up after them"""
+        if self._finished:
+            return True
+
+        if self._steps is None:
+            if not self._reader.ready:
+                return False
+            next(self._reader)
+            self._reader.close()
+            print("   parsed shape file in %.4f sec." % self.report.get_seconds("parse"))
+            print_sequences(self._shape)
+            self._steps = iter_create_shape(self._shape, self.name, **self._options)
+
+        # at least one step per call, so short slices still make progress
+        end_time = time.perf_counter() + time_slice
+        while True:
+            try:
+                self._step, self._num_steps = next(self._steps)
+            except StopIteration:
+                self._finish()
+                return True
+            if time.perf_counter() >= end_time:
+                return False
+
+    def _finish(self):
+        self._finished = True
+        self.close()
+        print("   created objects in %.4f sec." % self.report.get_seconds("build"))
+        print(" done in %.4f sec." % (time.perf_counter() - self._time1))
+        if self._profile_output != 'NONE':
+            print(self.report.format())
+            write_profile_output(self.filepath, self.report)
+
+    def close(self):
+        """stop the workers and release the shape file"""
+        if self._steps is not None:
+            self._steps.close()
+        self._reader.close()
+        self._shape.close()
+
+    def cancel(self):
+        """stop the import and remove everything it created"""
+        self.close()
+        for name, existing in self._existing_data.items():
+            datablocks = getattr(bpy.data, name)
+            for datablock in [datablock for datablock in datablocks if datablock.as_pointer() not in existing]:
+                datablocks.remove(datablock)
+        print(" cancelled after %.4f sec." % (time.perf_counter() - self._time1))
+
 
 def load(operator,
          context,
          filepath="",
          merge_verts=True,
+         profile_output='NONE',
+         import_sequences=True,
+         import_armature=False,
+         import_details='FIRST',
+         detail_names="",
          ):
 
     load_dts(filepath,
              context,
              merge_verts,
+             profile_output,
+             import_sequences,
+             import_armature,
+             import_details,
+             detail_names,
              )
 
     return {'FINISHED'}
\ No newline at end of file
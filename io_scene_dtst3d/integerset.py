@@ -1,24 +1,82 @@
-import struct
-from typing import List, BinaryIO
+from typing import Iterator, List
+
+import numpy as np
+
+from io_scene_dtst3d.bufferreader import BufferReader, BufferWriter
+
+# Torque's sets hold this many 32-bit words
+MAX_WORDS = 64
 
 # The standard mathmatical set, where there are no duplicates.  However,
 # this set uses bits instead of numbers.
 class TSIntegerSet:
-    def __init__(self):
-        values: List[int]
+    def __init__(self, bits: int = 0):
+        # bit i is set when i is in the set, the file's 32-bit words in little endian order
+        self._bits: int = bits
 
-    def copy_from(self, other):
-        self.values = other.values.copy()
+    @classmethod
+    def from_indices(cls, indices):
+        """a set holding the given non-negative integers"""
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        if len(indices) == 0:
+            return cls()
+        if indices.min() < 0:
+            raise ValueError("Integer sets can't hold negative integers")
+        mask = np.zeros(int(indices.max()) + 1, dtype=np.uint8)
+        mask[indices] = 1
+        return cls(int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little'))
+
+    @property
+    def bits(self) -> int:
+        return self._bits
+
+    @property
+    def values(self) -> List[int]:
+        """the set as 32-bit words, at least the 64 words Torque uses"""
+        num_words = max(MAX_WORDS, (self._bits.bit_length() + 31) // 32)
+        return [(self._bits >> (x * 32)) & 0xFFFFFFFF for x in range(num_words)]
+
+    def contains(self, index: int) -> bool:
+        return index >= 0 and (self._bits >> index) & 1 == 1
 
-    def read(self, stream : BinaryIO):
-        reader = stream
+    def count(self) -> int:
+        """number of integers in the set"""
+        return self._bits.bit_count()
 
-        self.values = [0] * 64
+    def __contains__(self, index: int) -> bool:
+        return self.contains(index)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.get_indices().tolist())
+
+    def get_indices(self) -> np.ndarray:
+        """the integers in the set in ascending order"""
+        return np.flatnonzero(self._unpack_bits(self._bits.bit_length()))
+
+    def get_mask(self, size: int) -> np.ndarray:
+        """boolean array of length size which is true at the integers in the set, larger integers are left out"""
+        return self._unpack_bits(size).view(bool)
+
+    def _unpack_bits(self, size: int) -> np.ndarray:
+        num_bytes = max(self._bits.bit_length(), size, 0) + 7 >> 3
+        data = np.frombuffer(self._bits.to_bytes(num_bytes, 'little'), dtype=np.uint8)
+        return np.unpackbits(data, bitorder='little')[:size]
+
+    def copy_from(self, other):
+        self._bits = other._bits
 
-        # numInts, unused
-        struct.unpack('<L', reader.read(4))
+    def read(self, reader: BufferReader):
+        # numInts is unused, sz words follow
+        _, sz = reader.unpack('<LL')
+        self._bits = int.from_bytes(reader.read(sz * 4), 'little')
 
-        # sz
-        sz = struct.unpack('<L', reader.read(4))[0]
-        for x in range(sz):
-            self.values[x] = struct.unpack('<L', reader.read(4))[0]
\ No newline at end of file
+    def write(self, writer: BufferWriter):
+        # numInts is unused and written as 0, then the words up to the last one with a bit set
+        num_words = (self._bits.bit_length() + 31) // 32
+        if num_words > MAX_WORDS:
+            raise ValueError(f"Integer sets can't hold integers above {MAX_WORDS * 32 - 1}")
+        writer.pack('<LL', 0, num_words)
+        writer.write(self._bits.to_bytes(num_words * 4, 'little'))
@@ -0,0 +1,79 @@
+# Runs a producer on a worker thread while the main thread consumes what it
+# produces. The importer decodes and prepares meshes this way while the main
+# thread, which owns bpy, builds the Blender objects of the meshes before them.
+import queue
+import threading
+
+# how long a blocked producer waits before checking whether it was stopped
+_POLL_SECONDS = 0.05
+
+_DONE = object()
+
+
+class BackgroundIterator:
+    """iterate over an iterable which is advanced on a worker thread
+    at most max_pending items are produced ahead of the consumer, so memory stays bounded
+    exceptions of the producer are raised in the consumer, use it in a with statement
+    so the worker is stopped when the consumer stops early"""
+    def __init__(self, iterable, max_pending: int = 4, name: str = "BackgroundIterator"):
+        self._iterator = iter(iterable)
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._stop = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for item in self._iterator:
+                if not self._put((item, None)):
+                    return
+            self._put((_DONE, None))
+        except BaseException as e:
+            self._put((_DONE, e))
+
+    def _put(self, entry) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(entry, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    @property
+    def ready(self) -> bool:
+        """whether next returns without waiting for the worker, for consumers which poll"""
+        return self._finished or not self._queue.empty()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+
+        item, error = self._queue.get()
+        if item is _DONE:
+            self._finished = True
+            self._thread.join()
+            if error is not None:
+                raise error
+            raise StopIteration
+        return item
+
+    def close(self):
+        """stop the worker and wait for it, items which were not consumed are dropped"""
+        self._stop.set()
+        self._finished = True
+        self._thread.join()
+
+        close_iterator = getattr(self._iterator, "close", None)
+        if close_iterator is not None:
+            close_iterator()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,89 @@
+# Timing spans and counters of an import, to find out which phases of which
+# shapes are slow. TSShape records the parser phases in its report and the
+# importer adds the Blender side to the same report.
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LapTimer:
+    """times consecutive phases, each lap ends the previous phase and starts the next"""
+    def __init__(self, report):
+        self._report = report
+        self._time = time.perf_counter()
+
+    def lap(self, name: str):
+        now = time.perf_counter()
+        self._report.add_time(name, now - self._time)
+        self._time = now
+
+
+class ImportReport:
+    """seconds spent in named phases, and counters like vertices and faces
+    spans and counters can be added from several threads, spans of different threads may overlap"""
+    def __init__(self):
+        self._spans = {} # name -> [seconds, calls]
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # reports travel with shapes parsed in other processes, locks can't be pickled
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def spans(self) -> dict:
+        return {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in self._spans.items()}
+
+    @property
+    def counters(self) -> dict:
+        return dict(self._counters)
+
+    def get_seconds(self, name: str) -> float:
+        return self._spans[name][0] if name in self._spans else 0.0
+
+    def add_time(self, name: str, seconds: float):
+        with self._lock:
+            span = self._spans.get(name)
+            if span is None:
+                self._spans[name] = [seconds, 1]
+            else:
+                span[0] += seconds
+                span[1] += 1
+
+    @contextmanager
+    def span(self, name: str):
+        """time the body of a with statement, spans with the same name add up"""
+        time1 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - time1)
+
+    def laps(self) -> LapTimer:
+        return LapTimer(self)
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def to_dict(self) -> dict:
+        return {"spans": self.spans, "counters": self.counters}
+
+    def write_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def format(self) -> str:
+        lines = []
+        for name, (seconds, calls) in self._spans.items():
+            lines.append(f"   {name}: %.4f sec." % seconds + (f" ({calls} calls)" if calls > 1 else ""))
+        for name, value in self._counters.items():
+            lines.append(f"   {name}: {value}")
+        return "\n".join(lines)
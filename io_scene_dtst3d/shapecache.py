@@ -0,0 +1,241 @@
+# On-disk cache of parsed shapes. Entries are named after a hash of the shape
+# file contents and the parser source, so editing the parser invalidates every
+# entry. An entry is a JSON description of the shape followed by the raw bytes
+# of all its arrays, which are loaded with a single read and viewed in place.
+# The least recently used entries are evicted when the cache grows over its
+# size cap.
+#
+# TSShape.read_from_path only uses a cache it is given. The importer passes
+# the default cache, which is off unless one is set with set_default_cache,
+# or the DTST3D_CACHE_DIR (and optionally DTST3D_CACHE_SIZE in MB)
+# environment variables are set.
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+_PARSER_MODULES = ("bufferreader.py", "integerset.py", "shapecache.py", "tsalloc.py",
+                   "tsmateriallist.py", "tsmesh.py", "tsshape.py")
+
+
+def _compute_parser_version() -> str:
+    digest = hashlib.sha256()
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    for module_name in _PARSER_MODULES:
+        with open(os.path.join(module_dir, module_name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+PARSER_VERSION = _compute_parser_version()
+
+_MAGIC = b"DTSC"
+_HEADER = struct.Struct("<4sQ") # magic, size of the JSON description
+_ALIGNMENT = 16
+
+
+def _get_classes():
+    from io_scene_dtst3d import integerset, tsmateriallist, tsmesh, tsshape
+    classes = {}
+    for module in (integerset, tsmateriallist, tsmesh, tsshape):
+        for name, value in vars(module).items():
+            if isinstance(value, type) and value.__module__ == module.__name__:
+                classes[name] = value
+    return classes
+
+
+class _Encoder:
+    """turn a parsed shape into JSON-able data plus a list of arrays"""
+    def __init__(self):
+        self.arrays = []
+        self.size = 0
+        self._offsets = {} # views of the same memory, like parented mesh data, are stored once
+
+    def encode(self, value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, np.ndarray):
+            key = (value.__array_interface__["data"][0], value.dtype.str, value.shape, value.strides)
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._offsets[key] = self.size
+                value = np.ascontiguousarray(value)
+                self.arrays.append(value)
+                self.size += -(-value.nbytes // _ALIGNMENT) * _ALIGNMENT
+            return {"__array__": [value.dtype.str, value.shape, offset]}
+        if isinstance(value, tuple):
+            return {"__tuple__": [self.encode(x) for x in value]}
+        if isinstance(value, dict):
+            return {"__dict__": [[self.encode(k), self.encode(v)] for k, v in value.items()]}
+        if isinstance(value, list):
+            return [self.encode(x) for x in value]
+        return {"__class__": type(value).__name__,
+                "state": {k: self.encode(v) for k, v in vars(value).items() if not callable(v)}}
+
+
+class _Decoder:
+    def __init__(self, data, classes):
+        self.data = data
+        self.classes = classes
+
+    def decode(self, value):
+        if isinstance(value, list):
+            return [self.decode(x) for x in value]
+        if not isinstance(value, dict):
+            return value
+        if "__array__" in value:
+            dtype, shape, offset = value["__array__"]
+            return np.frombuffer(self.data, dtype, math.prod(shape), offset).reshape(shape)
+        if "__tuple__" in value:
+            return tuple(self.decode(x) for x in value["__tuple__"])
+        if "__dict__" in value:
+            return {self.decode(k): self.decode(v) for k, v in value["__dict__"]}
+
+        cls = self.classes[value["__class__"]]
+        obj = cls.__new__(cls)
+        obj.__dict__.update({k: self.decode(v) for k, v in value["state"].items()})
+        return obj
+
+
+class ShapeCache:
+    def __init__(self, directory: str, max_size: int = 1024 * 1024 * 1024):
+        """directory is created when needed, max_size is in bytes"""
+        self.directory = directory
+        self.max_size = max_size
+
+    def get_key(self, path: str) -> str:
+        """hash of the file contents and the parser version"""
+        digest = hashlib.sha256(PARSER_VERSION.encode())
+        with open(path, "rb") as f:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                    digest.update(mapping)
+            except ValueError:
+                pass # empty file
+        return digest.hexdigest()
+
+    def _get_entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".dtsc")
+
+    def load(self, path: str, shape, key: Optional[str] = None) -> bool:
+        """fill shape from the cache, returns False when there is no usable entry
+        meshes which weren't decoded when the entry was stored are None, see TSShape.read_from_path"""
+        entry_path = self._get_entry_path(key or self.get_key(path))
+        if not os.path.isfile(entry_path):
+            return False
+
+        try:
+            with open(entry_path, "rb") as f:
+                magic, meta_size = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _MAGIC:
+                    raise ValueError("not a shape cache entry")
+                meta = json.loads(f.read(meta_size).decode("utf-8"))
+                f.seek(-(-(_HEADER.size + meta_size) // _ALIGNMENT) * _ALIGNMENT)
+                data = np.empty(os.fstat(f.fileno()).st_size - f.tell(), dtype=np.uint8)
+                if f.readinto(data) != len(data):
+                    raise ValueError("truncated shape cache entry")
+            state = _Decoder(data, _get_classes()).decode(meta)
+        except Exception as e:
+            print(f"Discarding unreadable shape cache entry {entry_path}: {e}")
+            self._remove(entry_path)
+            return False
+
+        shape.__dict__.update(state)
+        os.utime(entry_path) # mark as recently used
+        return True
+
+    def store(self, path: str, shape, key: Optional[str] = None):
+        """write a parsed shape to the cache
+        lazy meshes are not decoded for this, the entry holds the read position in the shape file of those not decoded yet"""
+        entry_path = self._get_entry_path(key or self.get_key(path))
+
+        encoder = _Encoder()
+        # whether meshes are lazy is up to the shape which loads the entry
+        state = {k: v for k, v in vars(shape).items() if k not in ("_ts_alloc", "_mapping", "_report", "_cache_entry", "_lazy_meshes")}
+        meshes = shape._meshes
+        if hasattr(meshes, "get_lazy_states"):
+            state["_meshes"] = meshes.decoded_meshes
+            state["_lazy_mesh_states"] = meshes.get_lazy_states()
+        else:
+            state["_meshes"] = list(meshes)
+        meta = json.dumps(encoder.encode(state)).encode("utf-8")
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, len(meta)))
+                f.write(meta)
+                f.write(bytes(-f.tell() % _ALIGNMENT))
+                for array in encoder.arrays:
+                    f.write(array.tobytes())
+                    f.write(bytes(-array.nbytes % _ALIGNMENT))
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            self._remove(temp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """remove the least recently used entries until the cache fits max_size"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".dtsc"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._remove(entry_path)
+            total_size -= size
+
+    def clear(self):
+        self.max_size, max_size = 0, self.max_size
+        try:
+            self.evict()
+        finally:
+            self.max_size = max_size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass # already gone, e.g. evicted by another process
+
+
+_default_cache : Optional[ShapeCache] = None
+_default_cache_from_env = True
+
+
+def set_default_cache(cache: Optional[ShapeCache]):
+    """set the cache the importer passes to TSShape.read_from_path, None turns caching off"""
+    global _default_cache, _default_cache_from_env
+    _default_cache = cache
+    _default_cache_from_env = False
+
+
+def get_default_cache() -> Optional[ShapeCache]:
+    global _default_cache, _default_cache_from_env
+    if _default_cache_from_env:
+        _default_cache_from_env = False
+        directory = os.environ.get("DTST3D_CACHE_DIR")
+        if directory:
+            max_size_mb = int(os.environ.get("DTST3D_CACHE_SIZE", "1024"))
+            _default_cache = ShapeCache(directory, max_size_mb * 1024 * 1024)
+    return _default_cache
@@ -0,0 +1,22 @@
+# Finds the shape files named on the command line of the batch importer and
+# the validator. Plain Python, so both can use it with or without Blender.
+import glob
+import os
+
+
+def find_shape_files(inputs, recursive=False):
+    """expand files, directories and glob patterns into a sorted list of .dts paths"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            if recursive:
+                for root, _, files in os.walk(item):
+                    paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(".dts"))
+            else:
+                paths.extend(os.path.join(item, f) for f in os.listdir(item) if f.lower().endswith(".dts"))
+        elif any(c in item for c in "*?["):
+            paths.extend(glob.glob(item, recursive=True))
+        else:
+            paths.append(item)
+
+    return sorted(set(os.path.abspath(path) for path in paths))
@@ -0,0 +1,99 @@
+# Vectorized quaternion math and node hierarchy transforms. Quaternions are
+# (..., 4) arrays in (w, x, y, z) order, like Blender's.
+import numpy as np
+
+
+def quaternion_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack([aw * bw - ax * bx - ay * by - az * bz,
+                     aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw], axis=-1)
+
+
+def quaternion_conjugate(q: np.ndarray) -> np.ndarray:
+    return q * np.array([1.0, -1.0, -1.0, -1.0], dtype=q.dtype)
+
+
+def quaternion_normalize(q: np.ndarray) -> np.ndarray:
+    length = np.linalg.norm(q, axis=-1, keepdims=True)
+    return np.divide(q, length, out=np.tile(np.array([1.0, 0.0, 0.0, 0.0], dtype=q.dtype), q.shape[:-1] + (1,)),
+                     where=length > 0.0)
+
+
+def quaternion_rotate(q: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """rotate (..., 3) vectors by unit quaternions"""
+    w = q[..., :1]
+    u = q[..., 1:]
+    t = 2.0 * np.cross(u, v)
+    return v + w * t + np.cross(u, t)
+
+
+def quaternion_to_matrix(q: np.ndarray) -> np.ndarray:
+    """(..., 3, 3) rotation matrices of unit quaternions"""
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    return np.stack([np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+                     np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+                     np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1)], axis=-2)
+
+
+def get_node_depths(parents: np.ndarray) -> np.ndarray:
+    """number of ancestors of each node, nodes with an invalid parent count as roots
+    raises ValueError when the parents contain a cycle"""
+    count = len(parents)
+    parents = np.where((parents >= 0) & (parents < count), parents, -1)
+    depths = np.zeros(count, dtype=np.intp)
+    ancestors = parents.copy()
+    for _ in range(count + 1):
+        has_ancestor = ancestors >= 0
+        if not has_ancestor.any():
+            return depths
+        depths += has_ancestor
+        ancestors = np.where(has_ancestor, parents[ancestors], -1)
+    raise ValueError("Node hierarchy contains a cycle")
+
+
+def get_world_transforms(parents: np.ndarray, rotations: np.ndarray, translations: np.ndarray):
+    """compose local node transforms down the hierarchy, one vectorized step per hierarchy level
+    returns the world rotations and translations"""
+    count = len(parents)
+    parents = np.where((parents >= 0) & (parents < count), parents, -1)
+    depths = get_node_depths(parents)
+
+    world_rotations = np.array(rotations, dtype=np.float64)
+    world_translations = np.array(translations, dtype=np.float64)
+    for depth in range(1, int(depths.max(initial=0)) + 1):
+        nodes = np.flatnonzero(depths == depth)
+        node_parents = parents[nodes]
+        parent_rotations = world_rotations[node_parents]
+        world_translations[nodes] = world_translations[node_parents] + quaternion_rotate(parent_rotations, world_translations[nodes])
+        world_rotations[nodes] = quaternion_multiply(parent_rotations, world_rotations[nodes])
+
+    return world_rotations, world_translations
+
+
+def get_world_matrices(world_rotations: np.ndarray, world_translations: np.ndarray) -> np.ndarray:
+    """(N, 4, 4) matrices from world rotations and translations"""
+    matrices = np.zeros((len(world_rotations), 4, 4), dtype=np.float64)
+    matrices[:, :3, :3] = quaternion_to_matrix(quaternion_normalize(world_rotations))
+    matrices[:, :3, 3] = world_translations
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+def get_bone_lengths(parents: np.ndarray, world_translations: np.ndarray, minimum: float = 0.001) -> np.ndarray:
+    """length of a bone for each node, the distance to its nearest child
+    nodes without children get the median length of the others"""
+    count = len(parents)
+    children = np.flatnonzero((parents >= 0) & (parents < count))
+    distances = np.linalg.norm(world_translations[children] - world_translations[parents[children]], axis=1)
+
+    lengths = np.full(count, np.inf)
+    keep = distances >= minimum
+    np.minimum.at(lengths, parents[children][keep], distances[keep])
+
+    finite = np.isfinite(lengths)
+    default = float(np.median(lengths[finite])) if finite.any() else 0.1
+    lengths[~finite] = default
+    return lengths
@@ -1,9 +1,35 @@
+import copy
 import struct
+from typing import List
+
+import numpy as np
+
+_FLOAT = struct.Struct('<f')
+_INT32 = struct.Struct('<i')
+_INT16 = struct.Struct('<h')
+
+# bytes of the 8-bit region searched for the first NULs of read8_strings, doubled until all are found
+_STRING_SCAN_SIZE = 4096
+
+class ShapeFormatError(ValueError):
+    """a malformed shape file, region names the part of the file (e.g. "header" or "32-bit")
+    and offset is the file offset where the problem was found, -1 when it isn't known"""
+    def __init__(self, message: str, region: str = "", offset: int = -1):
+        super().__init__(message if offset < 0 else f"{message} ({region} offset {offset})")
+        self.message = message
+        self.region = region
+        self.offset = offset
+
+    def __reduce__(self):
+        return (type(self), (self.message, self.region, self.offset))
 
 class TSAlloc:
-    def __init__(self, data: bytes, size_mem_buffer: int, start_u16: int, start_u8: int):
+    def __init__(self, data: bytes, size_mem_buffer: int, start_u16: int, start_u8: int, copy_arrays: bool = False):
         self.data = data
 
+        # arrays are views over data, or copies when data is only borrowed (e.g. a file mapping)
+        self.copy_arrays = copy_arrays
+
         self.ptr32 = 0
         self.ptr16 = start_u16 * 4
         self.ptr8 = start_u8 * 4
@@ -12,6 +38,11 @@ class TSAlloc:
         self.count16 = start_u8 - start_u16
         self.count8 = size_mem_buffer - start_u8
 
+        # every read and skip must stay before the end of its region
+        self.end32 = start_u16 * 4
+        self.end16 = start_u8 * 4
+        self.end8 = size_mem_buffer * 4
+
         self.guard8 = 0
         self.guard16 = 0
         self.guard32 = 0
@@ -30,78 +61,166 @@ class TSAlloc:
     def file_offset8(self):
         return self.ptr8 + 16  # + size of mesh header
 
+    def _out_of_region(self, bits: int, ptr: int, count: int, size: int) -> ShapeFormatError:
+        if count < 0:
+            return ShapeFormatError(f"Negative count {count}", f"{bits}-bit", ptr + 16)
+        return ShapeFormatError(f"Reading {count * size} bytes runs past the end of the {bits}-bit region", f"{bits}-bit", ptr + 16)
+
+    def _advance32(self, count: int) -> int:
+        """move past count 32-bit values, returns the position they start at"""
+        ptr = self.ptr32
+        if count < 0 or ptr + count * 4 > self.end32:
+            raise self._out_of_region(32, ptr, count, 4)
+        self.ptr32 = ptr + count * 4
+        self.size += count * 4
+        return ptr
+
+    def _advance16(self, count: int) -> int:
+        ptr = self.ptr16
+        if count < 0 or ptr + count * 2 > self.end16:
+            raise self._out_of_region(16, ptr, count, 2)
+        self.ptr16 = ptr + count * 2
+        self.size += count * 2
+        return ptr
+
+    def _advance8(self, count: int) -> int:
+        ptr = self.ptr8
+        if count < 0 or ptr + count > self.end8:
+            raise self._out_of_region(8, ptr, count, 1)
+        self.ptr8 = ptr + count
+        self.size += count
+        return ptr
+
+    # the single value reads and skip32 are the most frequent calls, they check their region inline
+
     def read_float(self):
-        value = struct.unpack_from('<f', self.data, self.ptr32)[0]
-        self.ptr32 += 4
+        ptr = self.ptr32
+        if ptr + 4 > self.end32:
+            raise self._out_of_region(32, ptr, 1, 4)
+        self.ptr32 = ptr + 4
         self.size += 4
-        return value
+        return _FLOAT.unpack_from(self.data, ptr)[0]
 
     def read32(self):
-        value = struct.unpack_from('<i', self.data, self.ptr32)[0]
-        self.ptr32 += 4
+        ptr = self.ptr32
+        if ptr + 4 > self.end32:
+            raise self._out_of_region(32, ptr, 1, 4)
+        self.ptr32 = ptr + 4
         self.size += 4
-        return value
+        return _INT32.unpack_from(self.data, ptr)[0]
 
     def read16(self):
-        value = struct.unpack_from('<h', self.data, self.ptr16)[0]
-        self.ptr16 += 2
+        ptr = self.ptr16
+        if ptr + 2 > self.end16:
+            raise self._out_of_region(16, ptr, 1, 2)
+        self.ptr16 = ptr + 2
         self.size += 2
-        return value
+        return _INT16.unpack_from(self.data, ptr)[0]
 
     def read8(self):
-        value = self.data[self.ptr8]
-        self.ptr8 += 1
+        ptr = self.ptr8
+        if ptr + 1 > self.end8:
+            raise self._out_of_region(8, ptr, 1, 1)
+        self.ptr8 = ptr + 1
         self.size += 1
-        return value
+        return self.data[ptr]
 
     def read_float_list(self, count: int):
-        values = list(struct.unpack_from(f'<{count}f', self.data, self.ptr32))
-        self.ptr32 += count * 4
-        self.size += count * 4
-        return values
+        return list(struct.unpack_from(f'<{count}f', self.data, self._advance32(count)))
 
     def read32_list(self, count: int):
-        values = list(struct.unpack_from(f'<{count}i', self.data, self.ptr32))
-        self.ptr32 += count * 4
-        self.size += count * 4
-        return values
+        return list(struct.unpack_from(f'<{count}i', self.data, self._advance32(count)))
 
     def read16_list(self, count: int):
-        values = list(struct.unpack_from(f'<{count}h', self.data, self.ptr16))
-        self.ptr16 += count * 2
-        self.size += count * 2
-        return values
+        return list(struct.unpack_from(f'<{count}h', self.data, self._advance16(count)))
+
+    def read8_strings(self, count: int) -> List[bytes]:
+        """read count NUL terminated strings from the 8-bit region
+        the region is searched in growing chunks until count NULs are found, only the strings are copied"""
+        if count <= 0:
+            return []
+        start = self.ptr8
+        region = np.frombuffer(self.data, dtype=np.uint8, count=self.end8 - start, offset=start)
+        ends = []
+        scanned = 0
+        chunk_size = _STRING_SCAN_SIZE
+        while len(ends) < count and scanned < len(region):
+            chunk = region[scanned:scanned + chunk_size]
+            ends.extend((np.flatnonzero(chunk == 0)[:count - len(ends)] + scanned).tolist())
+            scanned += len(chunk)
+            chunk_size *= 2
+        if len(ends) < count:
+            raise ShapeFormatError(f"Expected {count} strings, the 8-bit region ends after {len(ends)}", "8-bit", self.file_offset8)
+
+        size = ends[-1] + 1
+        strings = bytes(self.data[start:start + size]).split(b'\0', count)[:count]
+        self._advance8(size)
+        return strings
 
     def read8_list(self, count: int):
-        values = list(self.data[self.ptr8:self.ptr8 + count])
-        self.ptr8 += count
-        self.size += count
-        return values
+        ptr = self._advance8(count)
+        return list(self.data[ptr:ptr + count])
+
+    def _array(self, dtype: np.dtype, count: int, offset: int) -> np.ndarray:
+        values = np.frombuffer(self.data, dtype=dtype, count=count, offset=offset)
+        return values.copy() if self.copy_arrays else values
+
+    def read_float_array(self, count: int) -> np.ndarray:
+        """read count floats, a view over the buffer, or a writable copy when copy_arrays is set
+        views are read-only when the buffer is, don't write to the result"""
+        return self._array(np.dtype('<f4'), count, self._advance32(count))
+
+    def read32_array(self, count: int, dtype='<i4') -> np.ndarray:
+        """read count 32-bit values, a view over the buffer, or a writable copy when copy_arrays is set
+        views are read-only when the buffer is, don't write to the result"""
+        return self._array(np.dtype(dtype), count, self._advance32(count))
+
+    def read16_array(self, count: int, dtype='<i2') -> np.ndarray:
+        """read count 16-bit values, a view over the buffer, or a writable copy when copy_arrays is set
+        views are read-only when the buffer is, don't write to the result"""
+        return self._array(np.dtype(dtype), count, self._advance16(count))
     
     def skip8(self, count: int = 1):
-        self.ptr8 += count
-        self.size += count
+        self._advance8(count)
 
     def skip16(self, count: int = 1):
-        self.ptr16 += count * 2
-        self.size += count * 2
+        self._advance16(count)
 
     def skip32(self, count: int = 1):
-        self.ptr32 += count * 4
+        ptr = self.ptr32
+        if count < 0 or ptr + count * 4 > self.end32:
+            raise self._out_of_region(32, ptr, count, 4)
+        self.ptr32 = ptr + count * 4
         self.size += count * 4
     
+    def tell(self):
+        """the current read position, including the guard counters"""
+        return (self.ptr32, self.ptr16, self.ptr8, self.guard32, self.guard16, self.guard8)
+
+    def seek(self, state):
+        """return to a read position from tell"""
+        self.ptr32, self.ptr16, self.ptr8, self.guard32, self.guard16, self.guard8 = state
+
+    def fork(self, state=None):
+        """a new allocator sharing this buffer, optionally positioned at a state from tell"""
+        ts_alloc = copy.copy(self)
+        ts_alloc.size = 0
+        if state is not None:
+            ts_alloc.seek(state)
+        return ts_alloc
+
     def check_guard(self):
         got32 = self.read32()
         if self.guard32 != got32:
-            raise ValueError(f"Bad 32-bit guard, wanted {self.guard32}, got {got32}")
+            raise ShapeFormatError(f"Bad 32-bit guard, wanted {self.guard32}, got {got32}", "32-bit", self.file_offset32 - 4)
 
         got16 = self.read16()
         if self.guard16 != got16:
-            raise ValueError(f"Bad 16-bit guard, wanted {self.guard16}, got {got16}")
+            raise ShapeFormatError(f"Bad 16-bit guard, wanted {self.guard16}, got {got16}", "16-bit", self.file_offset16 - 2)
 
         got8 = self.read8()
         if self.guard8 != got8:
-            raise ValueError(f"Bad 8-bit guard, wanted {self.guard8}, got {got8}")
+            raise ShapeFormatError(f"Bad 8-bit guard, wanted {self.guard8}, got {got8}", "8-bit", self.file_offset8 - 1)
 
         self.guard32 += 1
         self.guard16 = ((self.guard16 + 1) & 0xFFFF)
@@ -111,4 +230,63 @@ class TSAlloc:
 
     def align32(self):
         # no-op, but this is called so keep it
-        pass
\ No newline at end of file
+        pass
+
+class TSAllocWriter:
+    """builds the 32, 16 and 8-bit buffers of a shape, the counterpart of TSAlloc"""
+    def __init__(self):
+        self._buffer32 = bytearray()
+        self._buffer16 = bytearray()
+        self._buffer8 = bytearray()
+
+        self.guard32 = 0
+        self.guard16 = 0
+        self.guard8 = 0
+
+    def write_float(self, value: float):
+        self._buffer32 += struct.pack('<f', value)
+
+    def write32(self, value: int):
+        self._buffer32 += struct.pack('<I', value & 0xFFFFFFFF)
+
+    def write16(self, value: int):
+        self._buffer16 += struct.pack('<H', value & 0xFFFF)
+
+    def write8(self, value: int):
+        self._buffer8.append(value & 0xFF)
+
+    def write_float_array(self, values):
+        self._buffer32 += np.ascontiguousarray(values, dtype='<f4').tobytes()
+
+    def write32_array(self, values, dtype='<i4'):
+        self._buffer32 += np.ascontiguousarray(values, dtype=dtype).tobytes()
+
+    def write16_array(self, values, dtype='<i2'):
+        self._buffer16 += np.ascontiguousarray(values, dtype=dtype).tobytes()
+
+    def write8_array(self, values):
+        self._buffer8 += np.ascontiguousarray(values, dtype=np.uint8).tobytes()
+
+    def write_guard(self):
+        self.write32(self.guard32)
+        self.write16(self.guard16)
+        self.write8(self.guard8)
+
+        self.guard32 += 1
+        self.guard16 = ((self.guard16 + 1) & 0xFFFF)
+        self.guard8 = ((self.guard8 + 1) & 0xFF)
+
+    def align32(self):
+        # no-op, like TSAlloc.align32
+        pass
+
+    def get_buffer(self):
+        """returns (size_mem_buffer, start_u16, start_u8, data) as stored in the shape header
+        the 16 and 8-bit buffers are padded to a multiple of 4 bytes"""
+        buffer16 = self._buffer16 + bytes(-len(self._buffer16) % 4)
+        buffer8 = self._buffer8 + bytes(-len(self._buffer8) % 4)
+
+        start_u16 = len(self._buffer32) // 4
+        start_u8 = start_u16 + len(buffer16) // 4
+        size_mem_buffer = start_u8 + len(buffer8) // 4
+        return size_mem_buffer, start_u16, start_u8, bytes(self._buffer32 + buffer16 + buffer8)
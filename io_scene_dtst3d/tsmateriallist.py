@@ -1,6 +1,8 @@
 from typing import List, BinaryIO
 import struct
 
+from io_scene_dtst3d.bufferreader import BufferReader, BufferWriter
+
 class TSMaterialFlags:
    SWrap = 1 << 0
    TWrap = 1 << 1
@@ -17,6 +19,11 @@ class TSMaterial:
     def __init__(self, name):
         self.name: str = name
         self.flags: int = 0
+        self.reflection_map: int = -1
+        self.bump_map: int = -1
+        self.detail_map: int = -1
+        self.detail_scale: float = 1.0
+        self.reflection_amount: float = 1.0
 
     def read(self, stream:BinaryIO, version):
         self.flags = struct.unpack('<L', stream.read(4))[0]
@@ -29,47 +36,59 @@ class TSMaterialList:
     def materials(self) -> List[TSMaterial]:
         return self._materials
     
-    def read(self, stream:BinaryIO, version):
-        reader = stream
-
-        mat_list_version = struct.unpack('<B', reader.read(1))[0]
+    def read(self, reader: BufferReader, version):
+        mat_list_version, = reader.unpack('<B')
         if mat_list_version != 0x1:
             raise Exception(f"Cannot read materials list version {mat_list_version}")
         
         # read material names
-        mat_count = struct.unpack('<i', reader.read(4))[0]
+        mat_count, = reader.unpack('<i')
         for _ in range(mat_count):
-            mat_name_length = struct.unpack('<B', reader.read(1))[0]
+            mat_name_length, = reader.unpack('<B')
             mat_name_bytes = reader.read(mat_name_length)
             mat_name = mat_name_bytes.decode('utf-8')
             
             self._materials.append(TSMaterial(mat_name))
 
-        # read flags
-        for x in range(mat_count):
-            self._materials[x].flags = struct.unpack('<i', reader.read(4))[0]
+        # the rest are parallel arrays with one value per material
+        flags = reader.unpack(f'<{mat_count}i')
+        reflection_maps = reader.unpack(f'<{mat_count}i')
+        bump_maps = reader.unpack(f'<{mat_count}i')
+        detail_maps = reader.unpack(f'<{mat_count}i')
+
+        if version == 25:
+            # unused
+            reader.unpack(f'<{mat_count}i')
+   
+        detail_scales = reader.unpack(f'<{mat_count}f')
+        reflection_amounts = reader.unpack(f'<{mat_count}f')
 
-        # read reflection maps
-        for x in range(mat_count):
-            struct.unpack('<i', reader.read(4))[0]
+        for x, material in enumerate(self._materials):
+            material.flags = flags[x]
+            material.reflection_map = reflection_maps[x]
+            material.bump_map = bump_maps[x]
+            material.detail_map = detail_maps[x]
+            material.detail_scale = detail_scales[x]
+            material.reflection_amount = reflection_amounts[x]
 
-        # read bump maps
-        for x in range(mat_count):
-            struct.unpack('<i', reader.read(4))[0]
+    def write(self, writer: BufferWriter, version):
+        writer.pack('<Bi', 0x1, len(self._materials))
+        for material in self._materials:
+            name = material.name.encode('utf-8')
+            if len(name) > 0xFF:
+                raise ValueError(f"Material name {material.name} is longer than 255 bytes")
+            writer.pack('<B', len(name))
+            writer.write(name)
 
-        # read detail maps
-        for x in range(mat_count):
-            struct.unpack('<i', reader.read(4))[0]
+        mat_count = len(self._materials)
+        writer.pack(f'<{mat_count}i', *(material.flags for material in self._materials))
+        writer.pack(f'<{mat_count}i', *(material.reflection_map for material in self._materials))
+        writer.pack(f'<{mat_count}i', *(material.bump_map for material in self._materials))
+        writer.pack(f'<{mat_count}i', *(material.detail_map for material in self._materials))
 
         if version == 25:
             # unused
-            for x in range(mat_count):
-                struct.unpack('<i', reader.read(4))[0]
-   
-        # read detail scales
-        for x in range(mat_count):
-            struct.unpack('<f', reader.read(4))[0]
+            writer.pack(f'<{mat_count}i', *([-1] * mat_count))
 
-        # read reflection amounts
-        for x in range(mat_count):
-            struct.unpack('<f', reader.read(4))[0]
\ No newline at end of file
+        writer.pack(f'<{mat_count}f', *(material.detail_scale for material in self._materials))
+        writer.pack(f'<{mat_count}f', *(material.reflection_amount for material in self._materials))
@@ -1,6 +1,9 @@
+import hashlib
 import struct
 from typing import List, BinaryIO
 
+import numpy as np
+
 from io_scene_dtst3d.tsalloc import *
 
 class TSDrawPrimitiveType:
@@ -24,59 +27,425 @@ class TSDrawPrimitive:
         self.type = material_and_flags & TSDrawPrimitiveType.TypeMask
         self.material_index = material_and_flags & TSDrawPrimitiveType.MaterialMask
 
+    @property
+    def material_and_flags(self) -> int:
+        """the packed material index and flags as written, primitives are always indexed"""
+        flags = self.material_index | self.type | TSDrawPrimitiveType.Indexed
+        if self.has_no_material:
+            flags |= TSDrawPrimitiveType.NoMaterial
+        return flags & 0xFFFFFFFF
+
 class TSNullMesh:
     pass
 
+class TSBasicVertexFormat:
+    """layout of the interleaved vertex records Torque builds its vertex buffers from, stored by version 27+ shapes
+    the file itself still holds separate vertex streams, get_dtype describes one record for TSMesh.get_vertex_records"""
+    BaseSize = 48 # position, tangent w, normal, tangent and the first texture coordinates
+    BoneSize = 20 # 4 bone indices and 4 weights
+
+    def __init__(self):
+        self.tex_coord_offset: int = -1
+        self.bone_offset: int = -1
+        self.color_offset: int = -1
+        self.num_bones: int = 0 # groups of 4 bone influences
+        self.vertex_size: int = TSBasicVertexFormat.BaseSize
+
+    @classmethod
+    def for_meshes(cls, meshes):
+        """the smallest format holding the streams and skin influences of every mesh"""
+        vertex_format = cls()
+        offset = cls.BaseSize
+        if any(isinstance(mesh, TSMesh) and (len(mesh.t2vertices) > 0 or len(mesh.colors) > 0) for mesh in meshes):
+            vertex_format.tex_coord_offset = offset
+            vertex_format.color_offset = offset + 8
+            offset += 12
+
+        max_bones = max((mesh.max_bones for mesh in meshes if isinstance(mesh, TSSkinnedMesh)), default=0)
+        if max_bones > 0:
+            vertex_format.num_bones = (max_bones + 3) // 4
+            vertex_format.bone_offset = offset
+            offset += vertex_format.num_bones * cls.BoneSize
+
+        vertex_format.vertex_size = offset
+        return vertex_format
+
+    def assemble(self, ts_alloc):
+        self.tex_coord_offset = ts_alloc.read16()
+        self.bone_offset = ts_alloc.read16()
+        self.color_offset = ts_alloc.read16()
+        self.num_bones = ts_alloc.read16()
+        self.vertex_size = ts_alloc.read16()
+
+    def disassemble(self, ts_alloc: TSAllocWriter):
+        ts_alloc.write16_array([self.tex_coord_offset, self.bone_offset, self.color_offset, self.num_bones, self.vertex_size])
+
+    def get_dtype(self) -> np.dtype:
+        """NumPy structured dtype of one vertex record, laid out like Torque's TSBasicVertexFormat::getFormat
+        the second texture coordinates and color are only present together, bones are groups of 4 indices and weights"""
+        names = ["position", "tangent_w", "normal", "tangent", "uv"]
+        formats = [('<f4', (3,)), '<f4', ('<f4', (3,)), ('<f4', (3,)), ('<f4', (2,))]
+        offsets = [0, 12, 16, 28, 40]
+
+        if self.tex_coord_offset >= 0 or self.color_offset >= 0:
+            tex_coord_offset = self.tex_coord_offset if self.tex_coord_offset >= 0 else self.BaseSize
+            names += ["uv2", "color"]
+            formats += [('<f4', (2,)), ('u1', (4,))]
+            offsets += [tex_coord_offset, self.color_offset if self.color_offset >= 0 else tex_coord_offset + 8]
+
+        if self.num_bones > 0:
+            bone_dtype = np.dtype([("indices", 'u1', (4,)), ("weights", '<f4', (4,))])
+            names.append("bones")
+            formats.append((bone_dtype, (self.num_bones,)))
+            offsets.append(self.bone_offset)
+
+        end = max(offset + np.dtype(fmt).itemsize for offset, fmt in zip(offsets, formats))
+        return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": max(end, self.vertex_size)})
+
+def _as_tuples(array: np.ndarray) -> list:
+    return list(map(tuple, array.tolist()))
+
+def _shared_view(array: np.ndarray) -> np.ndarray:
+    """read-only view of a parent mesh array, so a child can't change its parent's data"""
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+def weld_vertices(positions: np.ndarray, normals: np.ndarray, digests: np.ndarray = None):
+    """find vertices with exactly matching position and normal, and digest when given (see TSMesh.get_frame_digests)
+    returns the first original vertex of each welded vertex, and the remap from original to welded indices"""
+    count = len(positions)
+    if count == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    packed = np.empty((count, 6), dtype=np.float32)
+    packed[:, :3] = positions
+    packed[:, 3:] = normals
+    packed += 0.0 # turns -0.0 into 0.0 so both compare equal bitwise
+
+    keys = packed.view(np.uint32)
+    if digests is not None:
+        keys = np.hstack((keys, digests.astype(np.uint64).view(np.uint32).reshape(count, 2)))
+
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    # number welded vertices in order of first use, like a dict would
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    return first[order], rank[inverse]
+
+def decode_primitives(indices: np.ndarray, primitives: List[TSDrawPrimitive], drop_degenerate=True):
+    """decode triangle list and strip primitives into one (T, 3) array of indices
+    triangles are wound counter-clockwise for Blender, degenerate strip triangles are dropped
+    returns the triangles and the material index of each triangle, -1 for primitives without a material
+    unsupported primitives are ignored"""
+    prim_data = np.array([(prim.start, prim.num_elements, prim.type, -1 if prim.has_no_material else prim.material_index)
+                          for prim in primitives],
+                         dtype=np.int64).reshape(-1, 4)
+    starts, counts, types, materials = prim_data.T
+
+    is_strip = types == TSDrawPrimitiveType.Strip
+    is_list = types == TSDrawPrimitiveType.Triangles
+    num_triangles = np.where(is_strip, np.maximum(counts - 2, 0), np.where(is_list, counts // 3, 0))
+
+    # triangle -> primitive and the triangle number within that primitive
+    prim_of_triangle = np.repeat(np.arange(len(prim_data)), num_triangles)
+    first_triangle = np.cumsum(num_triangles) - num_triangles
+    local = np.arange(len(prim_of_triangle)) - first_triangle[prim_of_triangle]
+
+    strip_triangle = is_strip[prim_of_triangle]
+    base = starts[prim_of_triangle] + np.where(strip_triangle, local, local * 3)
+
+    # primitives reaching past the index buffer are cut short
+    in_range = (base >= 0) & (base + 2 < len(indices))
+    base = base[in_range]
+    local = local[in_range]
+    strip_triangle = strip_triangle[in_range]
+    prim_of_triangle = prim_of_triangle[in_range]
+
+    a = indices[base].astype(np.int32)
+    b = indices[base + 1].astype(np.int32)
+    c = indices[base + 2].astype(np.int32)
+
+    # strips alternate winding, odd triangles swap their first two corners
+    odd = strip_triangle & ((local & 1) == 1)
+    a, b = np.where(odd, b, a), np.where(odd, a, b)
+
+    triangles = np.stack((c, b, a), axis=1)
+    triangle_materials = materials[prim_of_triangle]
+
+    if drop_degenerate:
+        degenerate = strip_triangle & ((a == b) | (b == c) | (a == c))
+        if degenerate.any():
+            triangles = triangles[~degenerate]
+            triangle_materials = triangle_materials[~degenerate]
+
+    return triangles, triangle_materials
+
 class TSMesh:
     def __init__(self):
-            self._vertices: List[tuple[float, float, float]] = []
-            self._tvertices: List[tuple[float, float]] = []
-            self._t2vertices: List[tuple[float, float]] = []
-            self._colors: List[tuple[float, float, float, float]] = []
-            self._normals: List[tuple[float, float, float]] = []
+            self._vertices: np.ndarray = np.empty((0, 3), dtype=np.float32)
+            self._tvertices: np.ndarray = np.empty((0, 2), dtype=np.float32)
+            self._t2vertices: np.ndarray = np.empty((0, 2), dtype=np.float32)
+            self._colors: np.ndarray = np.empty((0, 4), dtype=np.float32)
+            self._normals: np.ndarray = np.empty((0, 3), dtype=np.float32)
             self._primitives: List[TSDrawPrimitive] = []
-            self._indices: List[int] = []
+            self._indices: np.ndarray = np.empty(0, dtype=np.int32)
             self._parent_mesh: int = -1
+            self._num_frames: int = 1
+            self._verts_per_frame: int = 0
+
+            # byte offset, vertex count and record size of the mesh in the shape's vertex buffer,
+            # stored by version 27+ shapes, an offset of -1 means no layout was read or set
+            self._vertex_layout: tuple = (-1, 0, 0)
 
     @property
-    def vertices(self) -> List[tuple[float, float, float]]:
+    def vertices(self) -> np.ndarray:
+        """(N, 3) float32 positions, a view over the shape buffer or a copy of it, see TSAlloc.copy_arrays"""
         return self._vertices
     
     @property
-    def normals(self) -> List[tuple[float, float, float]]:
+    def normals(self) -> np.ndarray:
+        """(N, 3) float32 normals, a view over the shape buffer or a copy of it, see TSAlloc.copy_arrays"""
         return self._normals
     
     @property
-    def tvertices(self) -> List[tuple[float, float]]:
+    def tvertices(self) -> np.ndarray:
+        """(N, 2) float32 texture coordinates, a view over the shape buffer or a copy of it, see TSAlloc.copy_arrays"""
         return self._tvertices
     
     @property
-    def t2vertices(self) -> List[tuple[float, float]]:
+    def t2vertices(self) -> np.ndarray:
+        """(N, 2) float32 second texture coordinates, a view over the shape buffer or a copy of it, see TSAlloc.copy_arrays"""
         return self._t2vertices
     
     @property
-    def colors(self) -> List[tuple[float, float, float, float]]:
+    def colors(self) -> np.ndarray:
+        """(N, 4) float32 RGBA colors in the 0-1 range"""
         return self._colors
+
+    # tuple accessors for code that wants plain Python values
+    @property
+    def vertex_tuples(self) -> List[tuple[float, float, float]]:
+        return _as_tuples(self._vertices)
+
+    @property
+    def normal_tuples(self) -> List[tuple[float, float, float]]:
+        return _as_tuples(self._normals)
+
+    @property
+    def tvertex_tuples(self) -> List[tuple[float, float]]:
+        return _as_tuples(self._tvertices)
+
+    @property
+    def t2vertex_tuples(self) -> List[tuple[float, float]]:
+        return _as_tuples(self._t2vertices)
+
+    @property
+    def color_tuples(self) -> List[tuple[float, float, float, float]]:
+        return _as_tuples(self._colors)
     
     @property
     def primitives(self) -> List[TSDrawPrimitive]:
         return self._primitives
     
     @property
-    def indices(self) -> List[int]:
+    def indices(self) -> np.ndarray:
+        """index buffer used by the primitives, a view over the shape buffer or a copy of it, see TSAlloc.copy_arrays"""
         return self._indices
 
     @property
     def parent_mesh(self) -> int:
         return self._parent_mesh
+
+    @property
+    def num_frames(self) -> int:
+        return self._num_frames
+
+    @property
+    def verts_per_frame(self) -> int:
+        return self._verts_per_frame
+
+    @property
+    def vertex_layout(self) -> tuple:
+        """(byte offset, vertex count, record size) in the shape's vertex buffer, see TSShape.vertex_format"""
+        return self._vertex_layout
+
+    def get_frame_count(self) -> int:
+        """number of complete vertex animation frames, 1 for meshes without vertex animation"""
+        if self._num_frames <= 1 or self._verts_per_frame <= 0:
+            return 1
+        return max(1, min(self._num_frames, len(self._vertices) // self._verts_per_frame))
+
+    def _get_frame_size(self) -> int:
+        return self._verts_per_frame if self.get_frame_count() > 1 else len(self._vertices)
+
+    def get_frame_vertices(self, frame: int) -> np.ndarray:
+        """(N, 3) positions of one vertex animation frame, a view of vertices
+        frame 0 is the only frame of meshes without vertex animation, and what the primitives index"""
+        size = self._get_frame_size()
+        return self._vertices[frame * size:(frame + 1) * size]
+
+    def get_frame_normals(self, frame: int) -> np.ndarray:
+        size = self._get_frame_size()
+        return self._normals[frame * size:(frame + 1) * size]
+
+    def get_frames_vertices(self, start: int, stop: int) -> np.ndarray:
+        """(frames, N, 3) positions of a range of vertex animation frames, a view of vertices"""
+        size = self._get_frame_size()
+        return self._vertices[start * size:stop * size].reshape(stop - start, size, 3)
+
+    def iter_frames_vertices(self, first_vertices: np.ndarray = None, memory_limit: int = None):
+        """yield the (N, 3) float32 positions of each frame after the first
+        first_vertices is the original vertex of each welded vertex, when the mesh was welded (see weld_vertices)
+        all frames are gathered with one indexing operation when they fit in memory_limit bytes, otherwise one at a time"""
+        num_frames = self.get_frame_count()
+        num_vertices = self._get_frame_size() if first_vertices is None else len(first_vertices)
+
+        if memory_limit is None or (num_frames - 1) * num_vertices * 12 <= memory_limit:
+            frames = self.get_frames_vertices(1, num_frames)
+            if first_vertices is not None:
+                frames = frames[:, first_vertices]
+            yield from np.ascontiguousarray(frames, dtype=np.float32)
+            return
+
+        for frame in range(1, num_frames):
+            positions = self.get_frame_vertices(frame)
+            if first_vertices is not None:
+                positions = positions[first_vertices]
+            yield np.ascontiguousarray(positions, dtype=np.float32)
+
+    def get_frame_digests(self) -> np.ndarray:
+        """uint64 hash of each vertex's positions in the frames after the first
+        vertices which move the same way in every frame have the same digest, frames are hashed one at a time"""
+        digests = np.zeros(self._get_frame_size(), dtype=np.uint64)
+        prime = np.uint64(0x100000001B3)
+        for frame in range(1, self.get_frame_count()):
+            bits = (self.get_frame_vertices(frame) + 0.0).view(np.uint32).astype(np.uint64)
+            for axis in range(3):
+                digests = (digests ^ bits[:, axis]) * prime
+        return digests
     
-    def copy_vertex_data_from(self, other):
-        """Copies mesh vertex data from a parent mesh"""
-        self._vertices = other._vertices.copy()
-        self._tvertices = other._tvertices.copy()
-        self._t2vertices = other._t2vertices.copy()
-        self._colors = other._colors.copy()
-        self._normals = other._normals.copy()
+    def get_triangles(self, drop_degenerate=True):
+        """decode all primitives into one triangle array, see decode_primitives"""
+        return decode_primitives(self._indices, self._primitives, drop_degenerate)
+
+    def get_vertex_records(self, vertex_format: TSBasicVertexFormat) -> np.ndarray:
+        """the vertices as interleaved records of vertex_format, filled with one assignment per stream
+        fields like records["position"] are strided views of the records, streams the mesh lacks stay zero
+        tangents are left zero, Torque computes them when it loads a shape"""
+        records = np.zeros(len(self._vertices), dtype=vertex_format.get_dtype())
+        records["position"] = self._vertices
+        if len(self._normals) == len(records):
+            records["normal"] = self._normals
+        if len(self._tvertices) == len(records):
+            records["uv"] = self._tvertices
+        if "uv2" in records.dtype.names:
+            if len(self._t2vertices) == len(records):
+                records["uv2"] = self._t2vertices
+            if len(self._colors) == len(records):
+                records["color"] = np.rint(np.clip(self._colors, 0.0, 1.0) * 255.0)
+        return records
+
+    def share_vertex_data_from(self, other):
+        """Shares mesh vertex data of a parent mesh, as read-only views rather than copies"""
+        self._vertices = _shared_view(other._vertices)
+        self._tvertices = _shared_view(other._tvertices)
+        self._t2vertices = _shared_view(other._t2vertices)
+        self._colors = _shared_view(other._colors)
+        self._normals = _shared_view(other._normals)
+
+    def set_vertex_data(self, vertices: np.ndarray, normals: np.ndarray, tvertices: np.ndarray = None,
+                        t2vertices: np.ndarray = None, colors: np.ndarray = None, num_frames: int = 1):
+        """set the vertex streams of a mesh, streams which aren't given are left empty
+        vertices and normals hold num_frames vertex animation frames of equal size one after another
+        colors are (N, 4) RGBA values in the 0-1 range"""
+        num_verts = len(vertices)
+        self._vertices = np.asarray(vertices, dtype=np.float32).reshape(num_verts, 3)
+        self._normals = np.asarray(normals, dtype=np.float32).reshape(num_verts, 3)
+        self._tvertices = np.empty((0, 2), dtype=np.float32) if tvertices is None else np.asarray(tvertices, dtype=np.float32).reshape(-1, 2)
+        self._t2vertices = np.empty((0, 2), dtype=np.float32) if t2vertices is None else np.asarray(t2vertices, dtype=np.float32).reshape(-1, 2)
+        self._colors = np.empty((0, 4), dtype=np.float32) if colors is None else np.asarray(colors, dtype=np.float32).reshape(-1, 4)
+        self._parent_mesh = -1
+        self._num_frames = num_frames
+        self._verts_per_frame = num_verts // max(1, num_frames)
+
+    def set_primitives(self, indices: np.ndarray, primitives: List[TSDrawPrimitive]):
+        self._indices = np.asarray(indices, dtype=np.int32).reshape(-1)
+        self._primitives = list(primitives)
+
+    def _get_geometry_arrays(self) -> List[np.ndarray]:
+        prim_data = np.array([(prim.start, prim.num_elements, prim.type, prim.material_index, prim.has_no_material)
+                              for prim in self._primitives], dtype=np.int64)
+        return [self._vertices, self._normals, self._tvertices, self._t2vertices, self._colors, self._indices, prim_data]
+
+    def get_geometry_digest(self) -> bytes:
+        """digest of the vertex data, indices and primitives, meshes with equal digests have identical geometry"""
+        digest = hashlib.sha256()
+        for array in self._get_geometry_arrays():
+            digest.update(struct.pack('<Q', array.size))
+            digest.update(np.ascontiguousarray(array))
+        return digest.digest()
+
+    @classmethod
+    def skip(cls, ts_alloc, version):
+        """walk over a mesh without decoding it, returns the parent mesh index"""
+        ts_alloc.check_guard()
+
+        ts_alloc.skip32(2) # num frames, num mat names
+        parent_mesh = ts_alloc.read32()
+        ts_alloc.skip32(10) # bounds, center, radius
+
+        if version >= 27:
+            ts_alloc.skip32(3) # vertex offsets
+
+        num_verts = ts_alloc.read32()
+        if parent_mesh < 0:
+            ts_alloc.skip32(num_verts*3)
+
+        num_tverts = ts_alloc.read32()
+        if parent_mesh < 0:
+            ts_alloc.skip32(num_tverts*2)
+
+        if version > 25:
+            num_t2verts = ts_alloc.read32()
+            if parent_mesh < 0:
+                ts_alloc.skip32(num_t2verts*2)
+
+            num_vcolors = ts_alloc.read32()
+            if parent_mesh < 0:
+                ts_alloc.skip32(num_vcolors)
+
+        if parent_mesh < 0:
+            ts_alloc.skip32(num_verts*3) # normals
+
+        if version > 21 and parent_mesh < 0:
+            ts_alloc.skip8(num_verts) # encoded normals
+
+        if version > 25:
+            sz_prim_in = ts_alloc.read32()
+            ts_alloc.skip32(sz_prim_in * 3)
+            sz_ind_in = ts_alloc.read32()
+            ts_alloc.skip32(sz_ind_in)
+        else:
+            sz_prim_in = ts_alloc.read32()
+            ts_alloc.skip16(sz_prim_in * 2)
+            ts_alloc.skip32(sz_prim_in)
+            sz_ind_in = ts_alloc.read32()
+            ts_alloc.skip16(sz_ind_in)
+
+        num_merge_indices = ts_alloc.read32()
+        ts_alloc.skip16(num_merge_indices)
+
+        ts_alloc.align32()
+
+        ts_alloc.skip32(2) # verts per frame, flags
+
+        ts_alloc.check_guard()
+        return parent_mesh
 
     def assemble(self, ts_alloc, version):
         ts_alloc.check_guard()
@@ -86,150 +455,393 @@ class TSMesh:
         parent_mesh = ts_alloc.read32()
 
         self._parent_mesh = parent_mesh
+        self._num_frames = num_frames
 
         bounds = [ts_alloc.read_float() for _ in range(6)]
         center = [ts_alloc.read_float() for _ in range(3)]
         radius = ts_alloc.read_float()
 
-        vert_offset = 0
-        offset_num_verts = 0
-        offset_vert_size = 0
-
         if version >= 27:
-            vert_offset = ts_alloc.read32()
-            offset_num_verts = ts_alloc.read32()
-            offset_vert_size = ts_alloc.read32()
+            # where the vertices go in the shape's vertex buffer
+            self._vertex_layout = tuple(ts_alloc.read32_list(3))
 
         # verts and texture coords
         num_verts = ts_alloc.read32()
 
         if parent_mesh < 0:
-            verts_buffer = ts_alloc.read_float_list(num_verts*3)
-            for x in range(0, num_verts*3, 3):
-                vertex = (verts_buffer[x], verts_buffer[x+1], verts_buffer[x+2])
-                self._vertices.append(vertex)
+            self._vertices = ts_alloc.read_float_array(num_verts*3).reshape(num_verts, 3)
 
         num_tverts = ts_alloc.read32()
         if parent_mesh < 0:
-            tverts_buffer = ts_alloc.read_float_list(num_tverts*2)
-            for x in range(0, num_tverts*2, 2):
-                tvertex = (tverts_buffer[x], tverts_buffer[x+1])
-                self._tvertices.append(tvertex)
+            self._tvertices = ts_alloc.read_float_array(num_tverts*2).reshape(num_tverts, 2)
 
         # 2nd texture channel and colors
         if version > 25:
             num_t2verts = ts_alloc.read32()
             if parent_mesh < 0:
-                t2verts_buffer = ts_alloc.read_float_list(num_t2verts*2)
-                for x in range(0, num_t2verts*2, 2):
-                    tvertex = (t2verts_buffer[x], t2verts_buffer[x+1])
-                    self._t2vertices.append(tvertex)
+                self._t2vertices = ts_alloc.read_float_array(num_t2verts*2).reshape(num_t2verts, 2)
 
             num_vcolors = ts_alloc.read32()
             if parent_mesh < 0:
-                vcolors = ts_alloc.read32_list(num_vcolors)
-                for packed_color in vcolors:
-                    red   =  packed_color & 0xFF
-                    green = (packed_color >> 8)  & 0xFF
-                    blue  = (packed_color >> 16) & 0xFF
-                    alpha = (packed_color >> 24) & 0xFF
-
-                    self._colors.append((red / 255.0, green / 255.0, blue / 255.0, alpha / 255.0))
+                # packed as RGBA bytes, least significant byte first
+                vcolors = ts_alloc.read32_array(num_vcolors, '<u4')
+                self._colors = vcolors.view(np.uint8).reshape(num_vcolors, 4).astype(np.float32) / 255.0
 
         # normals
         if parent_mesh < 0:
-            normals_buffer = ts_alloc.read_float_list(num_verts*3)
-            for x in range(0, num_verts*3, 3):
-                normal = (normals_buffer[x], normals_buffer[x+1], normals_buffer[x+2])
-                self._normals.append(normal)
+            self._normals = ts_alloc.read_float_array(num_verts*3).reshape(num_verts, 3)
 
         if version > 21 and parent_mesh < 0:
             ts_alloc.skip8(num_verts) # encoded normals, skip
 
-        # primitives and indices
-        sz_prim_in = 0
-        sz_ind_in = 0
-
-        starts = []
-        elements = []
-        material_indices = []
-        
+        # primitives and indices, each primitive's values are read in one call for all primitives
         if version > 25:
-            # mesh primitives (start, numElements) and indices are stored as 32 bit values
+            # mesh primitives (start, numElements, material) and indices are stored as 32 bit values
             sz_prim_in = ts_alloc.read32()
-            for _ in range(sz_prim_in):
-                starts.append(ts_alloc.read32())
-                elements.append(ts_alloc.read32())
-                material_indices.append(ts_alloc.read32())
+            prim_data = ts_alloc.read32_array(sz_prim_in * 3).reshape(sz_prim_in, 3).tolist()
 
             sz_ind_in = ts_alloc.read32()
-            self._indices.extend(ts_alloc.read32_list(sz_ind_in))                
+            self._indices = ts_alloc.read32_array(sz_ind_in)
         else:
-            # mesh primitives (start, numElements) indices are stored as 16 bit values
+            # mesh primitives (start, numElements) and indices are stored as 16 bit values, the materials follow as 32 bit values
             sz_prim_in = ts_alloc.read32()
-            for _ in range(sz_prim_in):
-                starts.append(ts_alloc.read16())
-                elements.append(ts_alloc.read16())
-            for _ in range(sz_prim_in):
-                material_indices.append(ts_alloc.read32())
+            prim_elements = ts_alloc.read16_array(sz_prim_in * 2).reshape(sz_prim_in, 2).tolist()
+            material_indices = ts_alloc.read32_array(sz_prim_in).tolist()
+            prim_data = [(start, num_elements, material_index)
+                         for (start, num_elements), material_index in zip(prim_elements, material_indices)]
 
             sz_ind_in = ts_alloc.read32()
-            self._indices.extend(ts_alloc.read16_list(sz_ind_in))
+            self._indices = ts_alloc.read16_array(sz_ind_in, '<u2')
 
         # setup primitives from data
-        for x in range(sz_prim_in):
-            start = starts[x]
-            num_elements = elements[x]
-            material_index = material_indices[x]
-
-            prim = TSDrawPrimitive(start, num_elements, material_index)
-            self._primitives.append(prim)
-            
+        self._primitives.extend(TSDrawPrimitive(start, num_elements, material_index)
+                                for start, num_elements, material_index in prim_data)
+
         # merge indices (deprecated)
         num_merge_indices = ts_alloc.read32()
         ts_alloc.skip16(num_merge_indices)
 
         ts_alloc.align32()
 
-        verts_per_frame = ts_alloc.read32()
+        # vertices (and normals) hold num_frames frames of verts_per_frame vertices each
+        self._verts_per_frame = ts_alloc.read32()
         flags = ts_alloc.read32()
 
         ts_alloc.check_guard()
 
+    def disassemble(self, ts_alloc: TSAllocWriter, version, vertex_layout: tuple = None):
+        """write the mesh, the counterpart of assemble for versions 24 to 27
+        bounds are computed from the vertices, encoded normals are written as zeros since Torque only uses them on request
+        version 27+ meshes store vertex_layout, or the layout which was read"""
+        if version < 24 or version > 27:
+            raise ValueError(f"Can't write meshes of version {version}")
+
+        num_verts = len(self._vertices)
+        if len(self._normals) != num_verts:
+            raise ValueError(f"Mesh has {num_verts} vertices but {len(self._normals)} normals")
+        shared = self._parent_mesh >= 0
+
+        ts_alloc.write_guard()
+
+        ts_alloc.write32(self._num_frames)
+        ts_alloc.write32(1) # material frames
+        ts_alloc.write32(self._parent_mesh)
+
+        if num_verts > 0:
+            bounds_min = self._vertices.min(axis=0)
+            bounds_max = self._vertices.max(axis=0)
+            center = (bounds_min + bounds_max) * np.float32(0.5)
+            radius = float(np.sqrt(((self._vertices - center) ** 2).sum(axis=1).max()))
+        else:
+            bounds_min = bounds_max = center = np.zeros(3, dtype=np.float32)
+            radius = 0.0
+        ts_alloc.write_float_array(bounds_min)
+        ts_alloc.write_float_array(bounds_max)
+        ts_alloc.write_float_array(center)
+        ts_alloc.write_float(radius)
+
+        if version >= 27:
+            ts_alloc.write32_array(self._vertex_layout if vertex_layout is None else vertex_layout)
+
+        # verts and texture coords, meshes with a parent share the parent's
+        ts_alloc.write32(num_verts)
+        if not shared:
+            ts_alloc.write_float_array(self._vertices)
+
+        ts_alloc.write32(len(self._tvertices))
+        if not shared:
+            ts_alloc.write_float_array(self._tvertices)
+
+        # 2nd texture channel and colors
+        if version > 25:
+            ts_alloc.write32(len(self._t2vertices))
+            if not shared:
+                ts_alloc.write_float_array(self._t2vertices)
+
+            ts_alloc.write32(len(self._colors))
+            if not shared:
+                # packed as RGBA bytes, least significant byte first
+                vcolors = np.rint(np.clip(self._colors, 0.0, 1.0) * 255.0).astype(np.uint8)
+                ts_alloc.write32_array(np.ascontiguousarray(vcolors).view('<u4').reshape(-1), '<u4')
+
+        # normals
+        if not shared:
+            ts_alloc.write_float_array(self._normals)
+            ts_alloc.write8_array(np.zeros(num_verts, dtype=np.uint8)) # encoded normals
+
+        # primitives and indices
+        prim_data = np.array([(prim.start, prim.num_elements, prim.material_and_flags) for prim in self._primitives],
+                             dtype=np.int64).reshape(-1, 3)
+        ts_alloc.write32(len(prim_data))
+        if version > 25:
+            ts_alloc.write32_array(prim_data & 0xFFFFFFFF, '<u4')
+            ts_alloc.write32(len(self._indices))
+            ts_alloc.write32_array(self._indices)
+        else:
+            # starts and element counts are signed 16-bit values, indices unsigned
+            if len(prim_data) > 0 and (prim_data[:, :2].min() < 0 or prim_data[:, :2].max() > 0x7FFF):
+                raise ValueError(f"Primitives of version {version} meshes must start and end below index {0x7FFF}, "
+                                 f"use version 26 for larger meshes")
+            if len(self._indices) > 0 and (self._indices.min() < 0 or self._indices.max() > 0xFFFF):
+                raise ValueError(f"Version {version} meshes can't index more than {0x10000} vertices, "
+                                 f"use version 26 for larger meshes")
+            ts_alloc.write16_array(prim_data[:, :2])
+            ts_alloc.write32_array(prim_data[:, 2], '<u4')
+            ts_alloc.write32(len(self._indices))
+            ts_alloc.write16_array(self._indices, '<u2')
+
+        ts_alloc.write32(0) # merge indices (deprecated)
+
+        ts_alloc.align32()
+
+        ts_alloc.write32(self._verts_per_frame)
+        ts_alloc.write32(0) # flags
+
+        ts_alloc.write_guard()
+
 class TSSkinnedMesh(TSMesh):
     def __init__(self):
         super().__init__()
+        self._initial_vertices: np.ndarray = np.empty((0, 3), dtype=np.float32)
+        self._initial_normals: np.ndarray = np.empty((0, 3), dtype=np.float32)
+        self._initial_transforms: np.ndarray = np.empty((0, 4, 4), dtype=np.float32)
+        self._vertex_indices: np.ndarray = np.empty(0, dtype=np.int32)
+        self._bone_indices: np.ndarray = np.empty(0, dtype=np.int32)
+        self._weights: np.ndarray = np.empty(0, dtype=np.float32)
+        self._node_indices: np.ndarray = np.empty(0, dtype=np.int32)
+        self._max_bones: int = -1 # stored by version 27+ shapes, -1 when it wasn't read
+
+    @property
+    def max_bones(self) -> int:
+        """most bone influences of any vertex"""
+        if self._max_bones >= 0:
+            return self._max_bones
+        if len(self._vertex_indices) == 0:
+            return 0
+        return int(np.bincount(np.maximum(self._vertex_indices, 0)).max())
+
+    @property
+    def initial_transforms(self) -> np.ndarray:
+        """(B, 4, 4) float32 bind transform of each bone, as stored by Torque"""
+        return self._initial_transforms
+
+    @property
+    def vertex_indices(self) -> np.ndarray:
+        """vertex of each influence, parallel to bone_indices and weights"""
+        return self._vertex_indices
+
+    @property
+    def bone_indices(self) -> np.ndarray:
+        """bone of each influence, an index into node_indices"""
+        return self._bone_indices
+
+    @property
+    def weights(self) -> np.ndarray:
+        """weight of each influence"""
+        return self._weights
+
+    @property
+    def node_indices(self) -> np.ndarray:
+        """shape node of each bone"""
+        return self._node_indices
+
+    def share_vertex_data_from(self, other):
+        """Shares mesh vertex data, and skin data when the parent has it, of a parent mesh"""
+        super().share_vertex_data_from(other)
+        if isinstance(other, TSSkinnedMesh):
+            self._initial_vertices = _shared_view(other._initial_vertices)
+            self._initial_normals = _shared_view(other._initial_normals)
+            self._initial_transforms = _shared_view(other._initial_transforms)
+            self._vertex_indices = _shared_view(other._vertex_indices)
+            self._bone_indices = _shared_view(other._bone_indices)
+            self._weights = _shared_view(other._weights)
+            self._node_indices = _shared_view(other._node_indices)
+
+    def set_skin_data(self, node_indices: np.ndarray, vertex_indices: np.ndarray, bone_indices: np.ndarray,
+                      weights: np.ndarray, initial_transforms: np.ndarray = None):
+        """set the influences and bones of the mesh, the initial vertices are its vertices
+        initial_transforms default to the identity for every bone"""
+        num_bones = len(node_indices)
+        self._node_indices = np.asarray(node_indices, dtype=np.int32).reshape(-1)
+        self._vertex_indices = np.asarray(vertex_indices, dtype=np.int32).reshape(-1)
+        self._bone_indices = np.asarray(bone_indices, dtype=np.int32).reshape(-1)
+        self._weights = np.asarray(weights, dtype=np.float32).reshape(-1)
+        if initial_transforms is None:
+            initial_transforms = np.tile(np.eye(4, dtype=np.float32), (num_bones, 1, 1))
+        self._initial_transforms = np.asarray(initial_transforms, dtype=np.float32).reshape(num_bones, 4, 4)
+        self._initial_vertices = self._vertices
+        self._initial_normals = self._normals
+
+    def get_vertex_records(self, vertex_format: TSBasicVertexFormat) -> np.ndarray:
+        """like TSMesh.get_vertex_records, with the strongest influences of each vertex in the bone groups"""
+        records = super().get_vertex_records(vertex_format)
+        if "bones" not in records.dtype.names or len(self._vertex_indices) == 0:
+            return records
+
+        # rank the influences of each vertex by weight, rank r goes to group r // 4 and slot r % 4
+        order = np.lexsort((-self._weights, self._vertex_indices))
+        vertices = self._vertex_indices[order]
+        group_starts = np.flatnonzero(np.r_[True, vertices[1:] != vertices[:-1]])
+        ranks = np.arange(len(vertices)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(vertices)]))
+
+        keep = (ranks < vertex_format.num_bones * 4) & (vertices >= 0) & (vertices < len(records))
+        vertices, ranks, order = vertices[keep], ranks[keep], order[keep]
+        bones = records["bones"]
+        bones["indices"][vertices, ranks // 4, ranks % 4] = self._bone_indices[order]
+        bones["weights"][vertices, ranks // 4, ranks % 4] = self._weights[order]
+        return records
+
+    def get_weight_groups(self, num_vertices: int, vertex_remap: np.ndarray = None) -> list:
+        """group the influences by bone and weight, returns (bone, weight, vertices) of each group
+        vertex_remap maps the mesh's vertices to num_vertices welded vertices, when the mesh was welded
+        influences with an invalid bone or vertex are dropped, a welded vertex keeps the first influence of each bone"""
+        num_source_vertices = len(vertex_remap) if vertex_remap is not None else num_vertices
+        valid = ((self._bone_indices >= 0) & (self._bone_indices < len(self._node_indices)) &
+                 (self._vertex_indices >= 0) & (self._vertex_indices < num_source_vertices))
+        vertices = self._vertex_indices[valid]
+        bones = self._bone_indices[valid].astype(np.int64)
+        weights = self._weights[valid]
+        if vertex_remap is not None:
+            vertices = vertex_remap[vertices]
+        if len(vertices) == 0:
+            return []
+
+        # welded vertices may carry the same influence more than once, keep the first
+        _, first = np.unique(bones * num_vertices + vertices, return_index=True)
+        vertices, bones, weights = vertices[first], bones[first], weights[first]
+
+        # runs of equal bone and weight
+        order = np.lexsort((weights, bones))
+        vertices, bones, weights = vertices[order], bones[order], weights[order]
+        run_starts = np.flatnonzero(np.concatenate([[True], (bones[1:] != bones[:-1]) | (weights[1:] != weights[:-1])]))
+        run_ends = np.append(run_starts[1:], len(bones))
+
+        vertex_lists = vertices.tolist()
+        return [(bone, weight, vertex_lists[start:end]) for start, end, bone, weight
+                in zip(run_starts.tolist(), run_ends.tolist(), bones[run_starts].tolist(), weights[run_starts].tolist())]
+
+    def _get_geometry_arrays(self) -> List[np.ndarray]:
+        # the vertex groups are built from the influences and the bone nodes
+        return super()._get_geometry_arrays() + [self._vertex_indices, self._bone_indices, self._weights, self._node_indices]
+
+    @classmethod
+    def skip(cls, ts_alloc, version):
+        parent_mesh = super().skip(ts_alloc, version)
+
+        # like the vertex data, skin data is shared with the parent mesh when there is one
+        if version >= 27:
+            ts_alloc.skip32() # max bones
+        else:
+            sz = ts_alloc.read32()
+            if parent_mesh < 0:
+                ts_alloc.skip32(sz * 3) # initial verts
+                ts_alloc.skip32(sz * 3) # normals
+                if version > 21:
+                    ts_alloc.skip8(sz) # encoded normals
+
+        sz = ts_alloc.read32()
+        if parent_mesh < 0:
+            ts_alloc.skip32(16 * sz) # initial transforms
+
+        sz = ts_alloc.read32()
+        if parent_mesh < 0:
+            ts_alloc.skip32(sz * 3) # vertex index, bone index and weight lists
+
+        sz = ts_alloc.read32()
+        if parent_mesh < 0:
+            ts_alloc.skip32(sz) # node index list
+
+        ts_alloc.check_guard()
+        return parent_mesh
 
     def assemble(self, ts_alloc, version):
         super().assemble(ts_alloc, version)
 
-        maxBones = -1 if version < 27 else ts_alloc.read32()
+        # like the vertex data, skin data is shared with the parent mesh when there is one
+        shared = self._parent_mesh >= 0
+        if version >= 27:
+            self._max_bones = ts_alloc.read32()
 
         if version < 27:
             # get initial verts
             sz = ts_alloc.read32()
-            if self._parent_mesh < 0:
-                ts_alloc.skip32(sz * 3) # initial verts
-
-            if version > 21:
-                if self._parent_mesh < 0:
-                    ts_alloc.skip32(sz * 3) # normals
+            if not shared:
+                self._initial_vertices = ts_alloc.read_float_array(sz * 3).reshape(sz, 3)
+                self._initial_normals = ts_alloc.read_float_array(sz * 3).reshape(sz, 3)
+                if version > 21:
                     ts_alloc.skip8(sz) # encoded normals
-            else:
-                if self._parent_mesh < 0:
-                    ts_alloc.skip32(sz * 3) # normals
+
+                # skinned meshes may only store their vertices as initial verts
+                if len(self._vertices) == 0 and sz > 0:
+                    self._vertices = self._initial_vertices
+                    self._normals = self._initial_normals
 
         sz = ts_alloc.read32()
-        ts_alloc.skip32(16 * sz) # initial transforms
+        if not shared:
+            self._initial_transforms = ts_alloc.read_float_array(16 * sz).reshape(sz, 4, 4)
 
         sz = ts_alloc.read32()
-        ts_alloc.skip32(sz) # vertex index list
-        ts_alloc.skip32(sz) # bone index list
-        ts_alloc.skip32(sz) # weight list
+        if not shared:
+            self._vertex_indices = ts_alloc.read32_array(sz)
+            self._bone_indices = ts_alloc.read32_array(sz)
+            self._weights = ts_alloc.read_float_array(sz)
 
         sz = ts_alloc.read32()
-        ts_alloc.skip32(sz) # node index list
+        if not shared:
+            self._node_indices = ts_alloc.read32_array(sz)
 
         ts_alloc.check_guard()
 
-    
\ No newline at end of file
+    def disassemble(self, ts_alloc: TSAllocWriter, version, vertex_layout: tuple = None):
+        super().disassemble(ts_alloc, version, vertex_layout)
+
+        # like the vertex data, skin data is shared with the parent mesh when there is one
+        shared = self._parent_mesh >= 0
+        if version >= 27:
+            # the vertices are the initial vertices
+            ts_alloc.write32(self.max_bones)
+        else:
+            initial_vertices = self._initial_vertices if len(self._initial_vertices) > 0 else self._vertices
+            initial_normals = self._initial_normals if len(self._initial_normals) == len(initial_vertices) else self._normals
+
+            ts_alloc.write32(len(initial_vertices))
+            if not shared:
+                ts_alloc.write_float_array(initial_vertices)
+                ts_alloc.write_float_array(initial_normals)
+                ts_alloc.write8_array(np.zeros(len(initial_vertices), dtype=np.uint8)) # encoded normals
+
+        ts_alloc.write32(len(self._initial_transforms))
+        if not shared:
+            ts_alloc.write_float_array(self._initial_transforms)
+
+        ts_alloc.write32(len(self._vertex_indices))
+        if not shared:
+            ts_alloc.write32_array(self._vertex_indices)
+            ts_alloc.write32_array(self._bone_indices)
+            ts_alloc.write_float_array(self._weights)
+
+        ts_alloc.write32(len(self._node_indices))
+        if not shared:
+            ts_alloc.write32_array(self._node_indices)
+
+        ts_alloc.write_guard()
@@ -1,12 +1,25 @@
+import bisect
+import mmap
 import struct
-from typing import List, BinaryIO
+import sys
+import threading
+from typing import Dict, List, BinaryIO
 
+import numpy as np
+
+from io_scene_dtst3d.bufferreader import BufferReader, BufferWriter
+from io_scene_dtst3d.profiling import ImportReport
 from io_scene_dtst3d.tsmesh import *
 from io_scene_dtst3d.tsalloc import *
 from io_scene_dtst3d.tsmateriallist import *
 from io_scene_dtst3d.integerset import *
 
 #from tsmesh import *
+
+# versions read_buffer can read
+MIN_READ_VERSION = 19
+MAX_READ_VERSION = 27
+
 class MeshType:
     StandardMeshType = 0
     SkinMeshType = 1
@@ -16,6 +29,14 @@ class MeshType:
 
     TypeMask = 7  # result of 0 | 1 | 2 | 3 | 4
 
+    Names = {
+        StandardMeshType: "standard",
+        SkinMeshType: "skinned",
+        DecalMeshType: "decal",
+        SortedMeshType: "sorted",
+        NullMeshType: "null",
+    }
+
 class SequenceFlags:
     UniformScale = 1 << 0
     AlignedScale = 1 << 1
@@ -75,6 +96,9 @@ class ShapeNode:
         ts_alloc.read32()
         ts_alloc.read32()
 
+    def disassemble(self, ts_alloc: TSAllocWriter):
+        ts_alloc.write32_array([self.name_index, self.parent_index, -1, -1, -1])
+
 class ShapeObject:
     def __init__(self):
         self.name_index : int = -1
@@ -92,6 +116,9 @@ class ShapeObject:
         ts_alloc.read32()
         ts_alloc.read32()
 
+    def disassemble(self, ts_alloc: TSAllocWriter):
+        ts_alloc.write32_array([self.name_index, self.num_meshes, self.start_mesh_index, self.node_index, -1, -1])
+
 class ShapeDetail:
     def __init__(self):
         self.name_index : int = -1
@@ -127,6 +154,17 @@ class ShapeDetail:
             self.billboard_polar_angle = ts_alloc.read_float()
             self.billboard_include_poles = ts_alloc.read32()
 
+    def disassemble(self, ts_alloc: TSAllocWriter, version):
+        ts_alloc.write32_array([self.name_index, self.sub_shape_num, self.object_detail_num])
+        ts_alloc.write_float_array([self.size, self.average_error, self.max_error])
+        ts_alloc.write32(self.poly_count)
+
+        if version >= 26:
+            ts_alloc.write32_array([self.billboard_dimension, self.billboard_detail_level,
+                                    self.billboard_equator_steps, self.billboard_polar_steps])
+            ts_alloc.write_float(self.billboard_polar_angle)
+            ts_alloc.write32(self.billboard_include_poles)
+
 class ShapeSequence:
     def __init__(self):
         self.name_index : int = -1
@@ -152,79 +190,311 @@ class ShapeSequence:
         self.mat_frame_matters : TSIntegerSet = TSIntegerSet() # set of objects
 
 
-    def read(self, stream : BinaryIO, version):
-        reader = stream
-
-        self.name_index = struct.unpack('<i', reader.read(4))[0]
+    def read(self, reader: BufferReader, version):
         if version > 21:
-            self.flags = struct.unpack('<L', reader.read(4))[0]
+            # base decal state is DEPRECATED
+            (self.name_index, self.flags, self.num_keyframes, self.duration,
+             self.priority, self.first_ground_frame, self.num_ground_frames,
+             self.base_rotation, self.base_translation, self.base_scale, self.base_object_state, _,
+             self.first_trigger, self.num_triggers, self.tool_begin) = reader.unpack('<iLLf iiL 5i iLf')
         else:
-            self.flags = 0
-
-        self.num_keyframes = struct.unpack('<L', reader.read(4))[0]
-        self.duration = struct.unpack('<f', reader.read(4))[0]
+            (self.name_index, self.num_keyframes, self.duration, blend, cyclic, make_path,
+             self.priority, self.first_ground_frame, self.num_ground_frames,
+             self.base_rotation, self.base_object_state, _,
+             self.first_trigger, self.num_triggers, self.tool_begin) = reader.unpack('<iLf3B iiL 3i iLf')
+            self.base_translation = self.base_rotation
 
-        if version < 22:
             # old flags
-            if reader.read(1)[0] != 0:
+            self.flags = 0
+            if blend != 0:
                 self.flags |= SequenceFlags.Blend
-            if reader.read(1)[0] != 0:
+            if cyclic != 0:
                 self.flags |= SequenceFlags.Cyclic
-            if reader.read(1)[0] != 0:
+            if make_path != 0:
                 self.flags |= SequenceFlags.MakePath
 
-        self.priority = struct.unpack('<i', reader.read(4))[0]
-        self.first_ground_frame = struct.unpack('<i', reader.read(4))[0]
-        self.num_ground_frames = struct.unpack('<L', reader.read(4))[0]
-
-        if version > 21:
-            self.base_rotation = struct.unpack('<i', reader.read(4))[0]
-            self.base_translation = struct.unpack('<i', reader.read(4))[0]
-            self.base_scale = struct.unpack('<i', reader.read(4))[0]
-            self.base_object_state = struct.unpack('<i', reader.read(4))[0]
-            base_decal_state = struct.unpack('<i', reader.read(4))[0] # DEPRECATED
-        else:
-            self.base_rotation = struct.unpack('<i', reader.read(4))[0]
-            self.base_translation = self.base_rotation
-            self.base_object_state = struct.unpack('<i', reader.read(4))[0]
-            base_decal_state = struct.unpack('<i', reader.read(4))[0] # DEPRECATED
-
-        self.first_trigger = struct.unpack('<i', reader.read(4))[0]
-        self.num_triggers = struct.unpack('<L', reader.read(4))[0]
-        self.tool_begin = struct.unpack('<f', reader.read(4))[0]
-
         # membership sets
-        self.rotation_matters.read(stream)
+        self.rotation_matters.read(reader)
         if version < 22:
             self.translation_matters.copy_from(self.rotation_matters)
         else:
-            self.translation_matters.read(stream)
-            self.scale_matters.read(stream)
+            self.translation_matters.read(reader)
+            self.scale_matters.read(reader)
 
         dummy_set = TSIntegerSet()
-        dummy_set.read(stream) # DEPRECATED: decals
-        dummy_set.read(stream) # DEPRECATED: Ifl materials
+        dummy_set.read(reader) # DEPRECATED: decals
+        dummy_set.read(reader) # DEPRECATED: Ifl materials
+
+        self.vis_matters.read(reader)
+        self.frame_matters.read(reader)
+        self.mat_frame_matters.read(reader)
+
+    def write(self, writer: BufferWriter, version):
+        if version > 21:
+            writer.pack('<iLLf iiL 5i iLf', self.name_index, self.flags, self.num_keyframes, self.duration,
+                        self.priority, self.first_ground_frame, self.num_ground_frames,
+                        self.base_rotation, self.base_translation, self.base_scale, self.base_object_state, 0,
+                        self.first_trigger, self.num_triggers, self.tool_begin)
+        else:
+            writer.pack('<iLf3B iiL 3i iLf', self.name_index, self.num_keyframes, self.duration,
+                        int(self.flags & SequenceFlags.Blend != 0), int(self.flags & SequenceFlags.Cyclic != 0),
+                        int(self.flags & SequenceFlags.MakePath != 0),
+                        self.priority, self.first_ground_frame, self.num_ground_frames,
+                        self.base_rotation, self.base_object_state, 0,
+                        self.first_trigger, self.num_triggers, self.tool_begin)
+
+        # membership sets
+        self.rotation_matters.write(writer)
+        if version >= 22:
+            self.translation_matters.write(writer)
+            self.scale_matters.write(writer)
+
+        TSIntegerSet().write(writer) # DEPRECATED: decals
+        TSIntegerSet().write(writer) # DEPRECATED: Ifl materials
 
-        self.vis_matters.read(stream)
-        self.frame_matters.read(stream)
-        self.mat_frame_matters.read(stream)
+        self.vis_matters.write(writer)
+        self.frame_matters.write(writer)
+        self.mat_frame_matters.write(writer)
         
         
 
-class TSShape:
+class SequenceKeyframes:
+    """the keyframes of one sequence, tracks are (nodes, keyframes, values) arrays
+    with one row per node in the matching node index array"""
     def __init__(self):
+        self.rotation_nodes : np.ndarray = np.zeros(0, dtype=np.intp)
+        self.rotations : np.ndarray = np.zeros((0, 0, 4), dtype=np.int16) # TQuaternion16 values
+        self.translation_nodes : np.ndarray = np.zeros(0, dtype=np.intp)
+        self.translations : np.ndarray = np.zeros((0, 0, 3), dtype=np.float32)
+        self.scale_nodes : np.ndarray = np.zeros(0, dtype=np.intp)
+        self.scales : np.ndarray = np.zeros((0, 0, 3), dtype=np.float32)
+        self.ground_translations : np.ndarray = np.zeros((0, 3), dtype=np.float32)
+        self.ground_rotations : np.ndarray = np.zeros((0, 4), dtype=np.int16)
+
+    def get_times(self, sequence: ShapeSequence) -> np.ndarray:
+        """time of each keyframe in seconds, cyclic sequences wrap around to the first keyframe"""
+        num_keyframes = sequence.num_keyframes
+        intervals = num_keyframes if sequence.flags & SequenceFlags.Cyclic else num_keyframes - 1
+        return np.arange(num_keyframes, dtype=np.float64) * (sequence.duration / max(intervals, 1))
+
+
+def _decode_names(raw_names: List[bytes]) -> List[str]:
+    """decode all names at once as UTF-8, names which aren't fall back to Latin-1 one by one"""
+    if len(raw_names) == 0:
+        return []
+    try:
+        names = b'\0'.join(raw_names).decode('utf-8').split('\0')
+    except UnicodeDecodeError:
+        names = []
+        for raw_name in raw_names:
+            try:
+                names.append(raw_name.decode('utf-8'))
+            except UnicodeDecodeError:
+                names.append(raw_name.decode('latin-1'))
+    return [sys.intern(name) for name in names]
+
+def _get_name_lookup(names: List[str]) -> Dict[str, int]:
+    """name -> index of its first occurrence"""
+    lookup = {}
+    for x, name in enumerate(names):
+        lookup.setdefault(name, x)
+    return lookup
+
+class IntervalIndex:
+    """finds which of a set of (first, count) intervals holds an integer, with bisect
+    empty intervals never match, when intervals overlap they are scanned in order and the first match is returned"""
+    def __init__(self, firsts: List[int] = (), counts: List[int] = ()):
+        firsts = np.asarray(firsts, dtype=np.int64).reshape(-1)
+        counts = np.asarray(counts, dtype=np.int64).reshape(-1)
+        kept = np.flatnonzero(counts > 0)
+        order = kept[np.argsort(firsts[kept], kind='stable')]
+
+        self._starts = firsts[order]
+        self._ends = self._starts + counts[order]
+        self._intervals = order
+        self._start_list: List[int] = self._starts.tolist()
+        self._end_list: List[int] = self._ends.tolist()
+        self._interval_list: List[int] = self._intervals.tolist()
+
+        # bisect finds the last interval starting at or before a value, which only holds it when none overlap
+        overlapping = len(self._starts) > 1 and bool(np.any(self._starts[1:] < np.maximum.accumulate(self._ends)[:-1]))
+        self._scan_list: list = sorted(zip(self._interval_list, self._start_list, self._end_list)) if overlapping else None
+
+    def find(self, value: int) -> int:
+        """index of the interval holding value, or -1"""
+        if self._scan_list is not None:
+            for x, start, end in self._scan_list:
+                if start <= value < end:
+                    return x
+            return -1
+
+        x = bisect.bisect_right(self._start_list, value) - 1
+        if x >= 0 and value < self._end_list[x]:
+            return self._interval_list[x]
+        return -1
+
+    def find_many(self, values) -> np.ndarray:
+        """index of the interval holding each value, or -1, for an array of values at once"""
+        values = np.asarray(values, dtype=np.int64)
+        if len(self._starts) == 0:
+            return np.full(values.shape, -1, dtype=np.int64)
+        if self._scan_list is not None:
+            # later intervals first, so the first interval holding a value is the one left
+            found = np.full(values.shape, -1, dtype=np.int64)
+            for x, start, end in reversed(self._scan_list):
+                found[(values >= start) & (values < end)] = x
+            return found
+        x = np.maximum(np.searchsorted(self._starts, values, side='right') - 1, 0)
+        found = (values >= self._starts[x]) & (values < self._ends[x])
+        return np.where(found, self._intervals[x], -1)
+
+
+class LazyMeshList:
+    """List of shape meshes where each mesh is only decoded when it is first accessed
+    meshes can be accessed from several threads, each mesh is decoded once"""
+    def __init__(self, decode):
+        self._decode = decode
+        self._meshes : list = []
+        self._types : List[int] = []
+        self._states : list = []
+        self._lock = threading.RLock() # reentrant, decoding a mesh decodes its parent
+
+    def append(self, mesh, mesh_type: int):
+        self._meshes.append(mesh)
+        self._types.append(mesh_type)
+        self._states.append(None)
+
+    def append_lazy(self, mesh_type: int, state):
+        self._meshes.append(None)
+        self._types.append(mesh_type)
+        self._states.append(state)
+
+    def mesh_type(self, index: int) -> int:
+        return self._types[index]
+
+    def is_decoded(self, index: int) -> bool:
+        return self._meshes[index] is not None
+
+    @property
+    def num_decoded(self) -> int:
+        return sum(1 for mesh in self._meshes if mesh is not None)
+
+    @property
+    def decoded_meshes(self) -> list:
+        """the meshes decoded so far, None for the others"""
+        with self._lock:
+            return list(self._meshes)
+
+    def get_lazy_states(self) -> list:
+        """(mesh type, read position) of each mesh which wasn't decoded yet, None for the others"""
+        with self._lock:
+            return [None if mesh is not None else (mesh_type, state)
+                    for mesh, mesh_type, state in zip(self._meshes, self._types, self._states)]
+
+    def __len__(self):
+        return len(self._meshes)
+
+    def __iter__(self):
+        for x in range(len(self._meshes)):
+            yield self[x]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[x] for x in range(*index.indices(len(self._meshes)))]
+
+        mesh = self._meshes[index]
+        if mesh is None:
+            with self._lock:
+                mesh = self._meshes[index]
+                if mesh is None:
+                    mesh = self._decode(self._types[index], self._states[index])
+                    self._meshes[index] = mesh
+                    self._states[index] = None
+        return mesh
+
+
+def _get_mesh_class(mesh_type: int):
+    if mesh_type == MeshType.StandardMeshType:
+        return TSMesh
+    elif mesh_type == MeshType.NullMeshType:
+        return TSNullMesh
+    elif mesh_type == MeshType.SkinMeshType:
+        return TSSkinnedMesh
+    else:
+        raise NotImplementedError(f"Can't parse mesh of type {mesh_type}")
+
+
+def _get_mesh_type(mesh) -> int:
+    if isinstance(mesh, TSSkinnedMesh):
+        return MeshType.SkinMeshType
+    elif isinstance(mesh, TSMesh):
+        return MeshType.StandardMeshType
+    return MeshType.NullMeshType
+
+
+class TSShape:
+    def __init__(self, lazy_meshes=False, report: ImportReport = None):
+        """with lazy_meshes, mesh offsets are recorded while reading and
+        each mesh is only decoded when it is first accessed through meshes
+        phase timings and counters are recorded in report, or a new report"""
+        self._lazy_meshes = lazy_meshes
+        self._report = ImportReport() if report is None else report
+        self._ts_alloc : TSAlloc = None
+        self._mapping : mmap.mmap = None
+        self._cache_entry : tuple = None # (cache, path, key, meshes decoded) of a lazy shape to store when it's closed
+        self._version : int = 0
         self._sequences: List[ShapeSequence] = []
         self._details: List[ShapeDetail] = []
-        self._meshes: List[TSMesh] = []
+        self._meshes: List[TSMesh] = LazyMeshList(self._decode_mesh) if lazy_meshes else []
         self._nodes: List[ShapeNode] = []
         self._objects: List[ShapeObject] = []
         self._names: List[str] = []
+        self._name_lookup: Dict[str, int] = {}
+        self._node_lookup: Dict[int, int] = {}
+        self._object_lookup: Dict[int, int] = {}
+        self._sequence_lookup: Dict[int, int] = {}
         self._material_list: TSMaterialList = TSMaterialList()
         self._sub_shape_first_node : List[int] = []
         self._sub_shape_num_nodes : List[int] = []
         self._sub_shape_first_object : List[int] = []
         self._sub_shape_num_objects : List[int] = []
 
+        # built from the sub shape arrays and details once they're read, see _build_sub_shape_index
+        self._node_sub_shapes = IntervalIndex()
+        self._object_sub_shapes = IntervalIndex()
+        self._sub_shape_details : List[List[ShapeDetail]] = []
+        self._shared_details : List[ShapeDetail] = []
+
+        # rest transforms of the nodes, also kept on each ShapeNode
+        self._default_rotations = np.zeros((0, 4), dtype=np.int16)
+        self._default_translations = np.zeros((0, 3), dtype=np.float32)
+
+        # keyframes of all sequences, rotations are TQuaternion16 values
+        self._node_translations = np.zeros((0, 3), dtype=np.float32)
+        self._node_rotations = np.zeros((0, 4), dtype=np.int16)
+        self._node_uniform_scales = np.zeros(0, dtype=np.float32)
+        self._node_aligned_scales = np.zeros((0, 3), dtype=np.float32)
+        self._node_arbitrary_scale_factors = np.zeros((0, 3), dtype=np.float32)
+        self._node_arbitrary_scale_rotations = np.zeros((0, 4), dtype=np.int16)
+        self._ground_translations = np.zeros((0, 3), dtype=np.float32)
+        self._ground_rotations = np.zeros((0, 4), dtype=np.int16)
+
+        # bounds from the header, and raw 32-bit words of the object states (visibility, frame, material frame)
+        # and triggers (state, position), kept so a shape is written back the way it was read
+        self._radius : float = 0.0
+        self._tube_radius : float = 0.0
+        self._center = np.zeros(3, dtype=np.float32)
+        self._bounds = np.zeros((2, 3), dtype=np.float32)
+        self._object_states = np.zeros((0, 3), dtype=np.int32)
+        self._triggers = np.zeros((0, 2), dtype=np.int32)
+
+        # layout of Torque's interleaved vertex records, stored by version 27+ shapes
+        self._vertex_format : TSBasicVertexFormat = None
+
+    @property
+    def report(self) -> ImportReport:
+        return self._report
+
     @property
     def sequences(self) -> List[ShapeSequence]:
         return self._sequences
@@ -253,69 +523,566 @@ class TSShape:
     def names(self) -> List[str]:
         return self._names
 
-    def get_sub_shape_for_node(self, node_index) -> int:
-        for x in range(len(self._sub_shape_first_node)):
-            start = self._sub_shape_first_node[x]
-            end = start + self._sub_shape_num_nodes[x]
-            if (node_index >= start) and (node_index < end):
-                return x
-        return -1
-    
-    def get_sub_shape_for_object(self, object_index) -> int:
-        for x in range(len(self._sub_shape_first_object)):
-            start = self._sub_shape_first_object[x]
-            end = start + self._sub_shape_num_objects[x]
-            if (object_index >= start) and (object_index < end):
-                return x
-        return -1
-    
-    def get_sub_shape_details(self, sub_shape_index) -> List[ShapeDetail]:
-        sub_shape_details = []
-        for detail in self._details:
-            if detail.sub_shape_num == sub_shape_index or detail.sub_shape_num < 0:
-                sub_shape_details.append(detail)
-        return sub_shape_details
-    
-    def read(self, stream: BinaryIO):
-        reader = stream
+    def get_name_index(self, name: str) -> int:
+        """index of a name in names, or -1"""
+        return self._name_lookup.get(name, -1)
+
+    def get_node_index(self, name: str) -> int:
+        """index of the first node with a name, or -1"""
+        return self._get_named_index(self._node_lookup, name)
+
+    def get_object_index(self, name: str) -> int:
+        """index of the first object with a name, or -1"""
+        return self._get_named_index(self._object_lookup, name)
+
+    def get_sequence_index(self, name: str) -> int:
+        """index of the first sequence with a name, or -1"""
+        return self._get_named_index(self._sequence_lookup, name)
+
+    def _get_named_index(self, lookup: Dict[int, int], name: str) -> int:
+        name_index = self._name_lookup.get(name)
+        return -1 if name_index is None else lookup.get(name_index, -1)
+
+    def _build_name_index(self):
+        """index nodes, objects and sequences by name index, the first of each name wins"""
+        for lookup, items in ((self._node_lookup, self._nodes),
+                              (self._object_lookup, self._objects),
+                              (self._sequence_lookup, self._sequences)):
+            lookup.clear()
+            for x, item in enumerate(items):
+                lookup.setdefault(item.name_index, x)
+
+    # building shapes for the exporter, meshes are added as plain lists so the shape must not be lazy
+    def add_name(self, name: str) -> int:
+        """index of a name, the name is added when the shape doesn't have it yet"""
+        name_index = self._name_lookup.get(name)
+        if name_index is None:
+            name_index = len(self._names)
+            self._names.append(name)
+            self._name_lookup[name] = name_index
+        return name_index
+
+    def add_node(self, name: str, parent_index: int = -1, rotation=(0, 0, 0, TQuaternion16.MAX_VALUE),
+                 translation=(0.0, 0.0, 0.0)) -> int:
+        """add a node with its rest transform relative to its parent, rotation is a TQuaternion16 (x, y, z, w)"""
+        node = ShapeNode()
+        node.name_index = self.add_name(name)
+        node.parent_index = parent_index
+        node.rotation = TQuaternion16(*(int(x) for x in rotation))
+        node.translation = tuple(float(x) for x in np.float32(translation))
+
+        node_index = len(self._nodes)
+        self._nodes.append(node)
+        self._node_lookup.setdefault(node.name_index, node_index)
+        self._default_rotations = np.concatenate([self._default_rotations, np.array([rotation], dtype=np.int16)])
+        self._default_translations = np.concatenate([self._default_translations, np.array([translation], dtype=np.float32)])
+        return node_index
+
+    def add_object(self, name: str, node_index: int, meshes: list) -> int:
+        """add an object on a node with one mesh per detail level, TSNullMesh for levels where it isn't drawn"""
+        shape_object = ShapeObject()
+        shape_object.name_index = self.add_name(name)
+        shape_object.node_index = node_index
+        shape_object.start_mesh_index = len(self._meshes)
+        shape_object.num_meshes = len(meshes)
+        self._meshes.extend(meshes)
+
+        object_index = len(self._objects)
+        self._objects.append(shape_object)
+        self._object_lookup.setdefault(shape_object.name_index, object_index)
+        return object_index
+
+    def add_sub_shape(self, first_node: int, num_nodes: int, first_object: int, num_objects: int) -> int:
+        self._sub_shape_first_node.append(first_node)
+        self._sub_shape_num_nodes.append(num_nodes)
+        self._sub_shape_first_object.append(first_object)
+        self._sub_shape_num_objects.append(num_objects)
+        self._build_sub_shape_index()
+        return len(self._sub_shape_first_node) - 1
+
+    def add_detail(self, name: str, size: float, sub_shape_num: int = 0, object_detail_num: int = 0, poly_count: int = 0) -> int:
+        """add a detail level drawing the meshes at object_detail_num of a sub shape's objects, a negative size is for collision"""
+        detail = ShapeDetail()
+        detail.name_index = self.add_name(name)
+        detail.sub_shape_num = sub_shape_num
+        detail.object_detail_num = object_detail_num
+        detail.size = size
+        detail.poly_count = poly_count
+        self._details.append(detail)
+        self._build_sub_shape_index()
+        return len(self._details) - 1
+
+    def add_material(self, name: str, flags: int = TSMaterialFlags.SWrap | TSMaterialFlags.TWrap) -> int:
+        material = TSMaterial(name)
+        material.flags = flags
+        self._material_list.materials.append(material)
+        return len(self._material_list.materials) - 1
+
+    def add_sequence(self, name: str, keyframes: SequenceKeyframes, duration: float, flags: int = 0,
+                     priority: int = 0) -> ShapeSequence:
+        """add a sequence and append its keyframes to the shape's keyframe arrays, the counterpart of get_sequence_keyframes
+        scales are stored as aligned scales, every track has the same number of keyframes"""
+        tracks = [keyframes.rotations, keyframes.translations, keyframes.scales]
+        num_keyframes = max(track.shape[1] for track in tracks)
+        if any(len(track) > 0 and track.shape[1] != num_keyframes for track in tracks):
+            raise ValueError("The tracks of a sequence must have the same number of keyframes")
+
+        def sorted_track(nodes, values, width):
+            # membership sets list their nodes in ascending order, so the rows are stored that way
+            nodes = np.asarray(nodes, dtype=np.int64).reshape(-1)
+            if len(np.unique(nodes)) != len(nodes):
+                raise ValueError("A sequence track can't have more than one row per node")
+            order = np.argsort(nodes, kind='stable')
+            return TSIntegerSet.from_indices(nodes), np.asarray(values)[order].reshape(-1, width)
+
+        sequence = ShapeSequence()
+        sequence.name_index = self.add_name(name)
+        sequence.flags = flags
+        sequence.priority = priority
+        sequence.duration = duration
+        sequence.num_keyframes = num_keyframes
+
+        sequence.rotation_matters, rotations = sorted_track(keyframes.rotation_nodes, keyframes.rotations, 4)
+        sequence.base_rotation = len(self._node_rotations)
+        self._node_rotations = np.concatenate([self._node_rotations, rotations.astype(np.int16)])
+
+        sequence.translation_matters, translations = sorted_track(keyframes.translation_nodes, keyframes.translations, 3)
+        sequence.base_translation = len(self._node_translations)
+        self._node_translations = np.concatenate([self._node_translations, translations.astype(np.float32)])
+
+        sequence.scale_matters, scales = sorted_track(keyframes.scale_nodes, keyframes.scales, 3)
+        sequence.base_scale = len(self._node_aligned_scales)
+        if len(scales) > 0:
+            sequence.flags |= SequenceFlags.AlignedScale
+            self._node_aligned_scales = np.concatenate([self._node_aligned_scales, scales.astype(np.float32)])
+
+        sequence.first_ground_frame = len(self._ground_translations)
+        sequence.num_ground_frames = len(keyframes.ground_translations)
+        self._ground_translations = np.concatenate([self._ground_translations, keyframes.ground_translations.astype(np.float32)])
+        self._ground_rotations = np.concatenate([self._ground_rotations, keyframes.ground_rotations.astype(np.int16)])
+
+        sequence.base_object_state = len(self._object_states)
+        sequence.first_trigger = len(self._triggers)
+
+        self._sequence_lookup.setdefault(sequence.name_index, len(self._sequences))
+        self._sequences.append(sequence)
+        return sequence
+
+    def set_bounds(self, points: np.ndarray):
+        """set the bounding box, sphere and tube radius of the shape to enclose (N, 3) points in shape space"""
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+        if len(points) == 0:
+            self._bounds = np.zeros((2, 3), dtype=np.float32)
+            self._center = np.zeros(3, dtype=np.float32)
+            self._radius = self._tube_radius = 0.0
+            return
+
+        self._bounds = np.stack([points.min(axis=0), points.max(axis=0)])
+        self._center = (self._bounds[0] + self._bounds[1]) * np.float32(0.5)
+        offsets = points - self._center
+        self._radius = float(np.sqrt((offsets ** 2).sum(axis=1).max()))
+        self._tube_radius = float(np.sqrt((offsets[:, :2] ** 2).sum(axis=1).max()))
+
+    @property
+    def default_rotations(self) -> np.ndarray:
+        return self._default_rotations
 
-        full_version = struct.unpack('<i', reader.read(4))[0] # version and exporter version packed as two 16-bit values
-        version = full_version & 0xFF
+    @property
+    def default_translations(self) -> np.ndarray:
+        return self._default_translations
 
-        if version < 19:
-            raise Exception("This DTS file is too old")
-        if version >= 27:
-            raise Exception(f"This DTS file is too new (version {version}), please file an issue report with the problem file attached.")
+    @property
+    def node_translations(self) -> np.ndarray:
+        return self._node_translations
+
+    @property
+    def node_rotations(self) -> np.ndarray:
+        return self._node_rotations
+
+    @property
+    def node_uniform_scales(self) -> np.ndarray:
+        return self._node_uniform_scales
+
+    @property
+    def node_aligned_scales(self) -> np.ndarray:
+        return self._node_aligned_scales
+
+    @property
+    def node_arbitrary_scale_factors(self) -> np.ndarray:
+        return self._node_arbitrary_scale_factors
 
-        size_mem_buffer = struct.unpack('<i', reader.read(4))[0]
-        start_u16 = struct.unpack('<i', reader.read(4))[0]
-        start_u8 = struct.unpack('<i', reader.read(4))[0]
+    @property
+    def node_arbitrary_scale_rotations(self) -> np.ndarray:
+        return self._node_arbitrary_scale_rotations
+
+    @property
+    def ground_translations(self) -> np.ndarray:
+        return self._ground_translations
+
+    @property
+    def ground_rotations(self) -> np.ndarray:
+        return self._ground_rotations
+
+    @property
+    def radius(self) -> float:
+        return self._radius
+
+    @property
+    def tube_radius(self) -> float:
+        return self._tube_radius
+
+    @property
+    def center(self) -> np.ndarray:
+        return self._center
+
+    @property
+    def bounds(self) -> np.ndarray:
+        """(2, 3) minimum and maximum corner of the shape's bounding box"""
+        return self._bounds
+
+    @property
+    def object_states(self) -> np.ndarray:
+        return self._object_states
+
+    @property
+    def triggers(self) -> np.ndarray:
+        return self._triggers
 
-        buf = reader.read(size_mem_buffer * 4)
-        ts_alloc = TSAlloc(buf, size_mem_buffer, start_u16, start_u8)
+    @property
+    def vertex_format(self) -> TSBasicVertexFormat:
+        """the vertex format of a version 27+ shape, None for older versions"""
+        return self._vertex_format
+
+    def get_sequence_keyframes(self, sequence: ShapeSequence) -> SequenceKeyframes:
+        """slice the keyframes of one sequence out of the shape's keyframe arrays"""
+        keyframes = SequenceKeyframes()
+        num_keyframes = sequence.num_keyframes
+
+        def get_track(values, base, nodes, width):
+            end = base + len(nodes) * num_keyframes
+            if len(nodes) == 0 or base < 0 or end > len(values):
+                return np.zeros((0, num_keyframes, width), dtype=values.dtype)
+            return values[base:end].reshape(len(nodes), num_keyframes, width)
+
+        keyframes.rotation_nodes = sequence.rotation_matters.get_indices()
+        keyframes.rotations = get_track(self._node_rotations, sequence.base_rotation, keyframes.rotation_nodes, 4)
+        if len(keyframes.rotations) == 0:
+            keyframes.rotation_nodes = keyframes.rotation_nodes[:0]
+
+        keyframes.translation_nodes = sequence.translation_matters.get_indices()
+        keyframes.translations = get_track(self._node_translations, sequence.base_translation, keyframes.translation_nodes, 3)
+        if len(keyframes.translations) == 0:
+            keyframes.translation_nodes = keyframes.translation_nodes[:0]
+
+        # a sequence uses one kind of scale, uniform scales are spread over all three axes
+        keyframes.scale_nodes = sequence.scale_matters.get_indices()
+        if sequence.flags & SequenceFlags.ArbitraryScale:
+            keyframes.scales = get_track(self._node_arbitrary_scale_factors, sequence.base_scale, keyframes.scale_nodes, 3)
+        elif sequence.flags & SequenceFlags.AlignedScale:
+            keyframes.scales = get_track(self._node_aligned_scales, sequence.base_scale, keyframes.scale_nodes, 3)
+        elif sequence.flags & SequenceFlags.UniformScale:
+            uniform = get_track(self._node_uniform_scales[:, None], sequence.base_scale, keyframes.scale_nodes, 1)
+            keyframes.scales = np.repeat(uniform, 3, axis=2)
+        else:
+            keyframes.scales = np.zeros((0, num_keyframes, 3), dtype=np.float32)
+        if len(keyframes.scales) == 0:
+            keyframes.scale_nodes = keyframes.scale_nodes[:0]
+
+        first, count = sequence.first_ground_frame, sequence.num_ground_frames
+        if first >= 0 and count > 0 and first + count <= len(self._ground_translations):
+            keyframes.ground_translations = self._ground_translations[first:first + count]
+            keyframes.ground_rotations = self._ground_rotations[first:first + count]
+
+        return keyframes
+
+    def _decode_mesh(self, mesh_type: int, state):
+        if self._ts_alloc is None:
+            raise ValueError("Can't decode a mesh after the shape was closed")
+
+        with self._report.span(f"meshes.{MeshType.Names[mesh_type]}"):
+            mesh = _get_mesh_class(mesh_type)()
+            if isinstance(mesh, TSMesh):
+                mesh.assemble(self._ts_alloc.fork(state), self._version)
+                self._count_mesh(mesh)
+
+        # the parent is decoded outside of this span, so it isn't timed twice
+        if isinstance(mesh, TSMesh) and mesh.parent_mesh >= 0:
+            mesh.share_vertex_data_from(self._meshes[mesh.parent_mesh])
+        return mesh
+
+    def _count_mesh(self, mesh):
+        self._report.count("mesh vertices", len(mesh.vertices) if mesh.parent_mesh < 0 else 0)
+        self._report.count("mesh indices", len(mesh.indices))
+        self._report.count("mesh primitives", len(mesh.primitives))
+
+    def _read_mesh(self, ts_alloc, mesh_type: int, version: int):
+        mesh_class = _get_mesh_class(mesh_type)
+        self._report.count("meshes")
+        if self._lazy_meshes:
+            if mesh_class is TSNullMesh:
+                self._meshes.append(TSNullMesh(), mesh_type)
+            else:
+                # remember where the mesh starts and walk over it
+                self._meshes.append_lazy(mesh_type, ts_alloc.tell())
+                mesh_class.skip(ts_alloc, version)
+        else:
+            with self._report.span(f"meshes.{MeshType.Names[mesh_type]}"):
+                mesh = mesh_class()
+                if isinstance(mesh, TSMesh):
+                    mesh.assemble(ts_alloc, version)
+                    self._count_mesh(mesh)
+            self._meshes.append(mesh)
 
-        self.assemble(ts_alloc, version)
+    def get_sub_shape_for_node(self, node_index) -> int:
+        return self._node_sub_shapes.find(node_index)
+    
+    def get_sub_shape_for_object(self, object_index) -> int:
+        return self._object_sub_shapes.find(object_index)
 
-        # sequences
-        num_sequences = struct.unpack('<i', reader.read(4))[0]
-        for _ in range(num_sequences):
-            sequence = ShapeSequence()
-            sequence.read(stream, version)
-            self._sequences.append(sequence)
+    def get_sub_shapes_for_nodes(self, node_indices) -> np.ndarray:
+        """sub shape of each node in an array, -1 for nodes outside every sub shape"""
+        return self._node_sub_shapes.find_many(node_indices)
 
-        # materials
-        self._material_list.read(stream, version)
+    def get_sub_shapes_for_objects(self, object_indices) -> np.ndarray:
+        """sub shape of each object in an array, -1 for objects outside every sub shape"""
+        return self._object_sub_shapes.find_many(object_indices)
+    
+    def get_sub_shape_details(self, sub_shape_index) -> List[ShapeDetail]:
+        if 0 <= sub_shape_index < len(self._sub_shape_details):
+            return list(self._sub_shape_details[sub_shape_index])
+        return list(self._shared_details)
+
+    def _build_sub_shape_index(self):
+        """index the sub shape node and object intervals, and the details of each sub shape"""
+        self._node_sub_shapes = IntervalIndex(self._sub_shape_first_node, self._sub_shape_num_nodes)
+        self._object_sub_shapes = IntervalIndex(self._sub_shape_first_object, self._sub_shape_num_objects)
+
+        # details with a negative sub shape, like billboards, belong to every sub shape
+        self._shared_details = [detail for detail in self._details if detail.sub_shape_num < 0]
+        self._sub_shape_details = [[] for _ in self._sub_shape_first_node]
+        for detail in self._details:
+            if detail.sub_shape_num < 0:
+                for sub_shape_details in self._sub_shape_details:
+                    sub_shape_details.append(detail)
+            elif detail.sub_shape_num < len(self._sub_shape_details):
+                self._sub_shape_details[detail.sub_shape_num].append(detail)
 
-        # postprocess: copy mesh data for parented meshes
-        for mesh in self._meshes:
-            if isinstance(mesh, TSMesh) and mesh.parent_mesh >= 0:
-                mesh.copy_vertex_data_from(self._meshes[mesh.parent_mesh])
+    @property
+    def num_sub_shapes(self) -> int:
+        return len(self._sub_shape_first_node)
+
+    def get_sub_shape_nodes(self, sub_shape_index) -> range:
+        """indices of the nodes in a sub shape"""
+        if sub_shape_index < 0 or sub_shape_index >= len(self._sub_shape_first_node):
+            return range(0)
+        start = self._sub_shape_first_node[sub_shape_index]
+        return range(start, start + self._sub_shape_num_nodes[sub_shape_index])
+
+    def get_sub_shape_objects(self, sub_shape_index) -> range:
+        """indices of the objects in a sub shape"""
+        if sub_shape_index < 0 or sub_shape_index >= len(self._sub_shape_first_object):
+            return range(0)
+        start = self._sub_shape_first_object[sub_shape_index]
+        return range(start, start + self._sub_shape_num_objects[sub_shape_index])
+
+    def get_detail_mesh_index(self, object_index, detail: ShapeDetail) -> int:
+        """index of an object's mesh at a detail level, -1 when the object has no mesh there"""
+        shape_object = self._objects[object_index]
+        if detail.object_detail_num < 0 or detail.object_detail_num >= shape_object.num_meshes:
+            return -1
+        return shape_object.start_mesh_index + detail.object_detail_num
 
-    def read_from_path(self, path: str):
+    def read(self, stream: BinaryIO):
+        self.read_buffer(stream.read())
+
+    def read_buffer(self, buffer, copy_arrays: bool = False):
+        """read a shape from a bytes-like object holding the whole file, the TSAlloc region is used in place
+        set copy_arrays when the buffer does not outlive the shape, e.g. a file mapping which gets closed"""
+        data = memoryview(buffer)
+        reader = BufferReader(data)
+        try:
+            if len(data) < 16:
+                raise ShapeFormatError(f"The file is too short for a shape header ({len(data)} bytes)", "header", 0)
+
+            full_version, = reader.unpack('<i') # version and exporter version packed as two 16-bit values
+            version = full_version & 0xFF
+
+            if version < MIN_READ_VERSION:
+                raise ShapeFormatError("This DTS file is too old", "header", 0)
+            if version > MAX_READ_VERSION:
+                raise ShapeFormatError(f"This DTS file is too new (version {version}), please file an issue report with the problem file attached.", "header", 0)
+
+            size_mem_buffer, start_u16, start_u8 = reader.unpack('<iii')
+            if not 0 <= start_u16 <= start_u8 <= size_mem_buffer:
+                raise ShapeFormatError(f"Bad buffer layout, size {size_mem_buffer}, 16-bit start {start_u16}, 8-bit start {start_u8}", "header", 4)
+            if reader.tell() + size_mem_buffer * 4 > len(data):
+                raise ShapeFormatError(f"The buffer of {size_mem_buffer * 4} bytes runs past the end of the file ({len(data)} bytes)", "header", 4)
+
+            # TSAlloc reads straight from the buffer, arrays are only copied with copy_arrays
+            buf = data[reader.tell():reader.tell() + size_mem_buffer * 4]
+            reader.seek(reader.tell() + size_mem_buffer * 4)
+            ts_alloc = TSAlloc(buf, size_mem_buffer, start_u16, start_u8, copy_arrays)
+
+            self._report.count("bytes", len(data))
+            self.assemble(ts_alloc, version)
+            self._report.count("guard checks", ts_alloc.guard32)
+
+            # sequences and the material list are read with struct, which fails at the end of the file
+            region = "sequences"
+            try:
+                with self._report.span("sequences"):
+                    num_sequences, = reader.unpack('<i')
+                    for _ in range(num_sequences):
+                        sequence = ShapeSequence()
+                        sequence.read(reader, version)
+                        self._sequences.append(sequence)
+
+                region = "material list"
+                with self._report.span("material list"):
+                    self._material_list.read(reader, version)
+            except struct.error as e:
+                raise ShapeFormatError(f"Unexpected end of file in the {region}", region, reader.tell()) from e
+
+            self._build_name_index()
+        finally:
+            reader.release()
+            data.release()
+
+        # postprocess: share mesh data with parented meshes, lazy meshes do this when decoded
+        if not self._lazy_meshes:
+            for mesh in self._meshes:
+                if isinstance(mesh, TSMesh) and mesh.parent_mesh >= 0:
+                    mesh.share_vertex_data_from(self._meshes[mesh.parent_mesh])
+
+            # everything is decoded, the arrays keep what they need of the buffer alive
+            self._ts_alloc = None
+
+    def read_from_path(self, path: str, use_mmap: bool = True, cache=None):
+        """read a shape file, by default the file is memory mapped rather than read into memory
+        shapes with lazy meshes keep the mapping open until close is called
+        with a ShapeCache as cache, the parsed shape is loaded from and stored in it, see shapecache
+        lazy shapes are stored when they're closed, with the meshes decoded by then"""
+        if cache is None:
+            self._read_path(path, use_mmap)
+            return
+
+        with self._report.span("cache load"):
+            key = cache.get_key(path)
+            loaded = cache.load(path, self, key)
+            if loaded:
+                # the details of each sub shape must be the loaded details, not copies of them
+                self._build_sub_shape_index()
+                num_decoded = self._restore_cached_meshes(path)
+
+        if loaded:
+            if num_decoded < len(self._meshes):
+                if self._lazy_meshes:
+                    self._cache_entry = (cache, path, key, num_decoded)
+                else:
+                    # the entry was stored by a lazy shape, it now holds every mesh
+                    self._store_in_cache(cache, path, key)
+            return
+
+        self._read_path(path, use_mmap)
+        if self._lazy_meshes:
+            # storing now would decode every mesh
+            self._cache_entry = (cache, path, key, -1)
+        else:
+            self._store_in_cache(cache, path, key)
+
+    def _store_in_cache(self, cache, path: str, key: str, num_decoded: int = -1):
+        """store the shape unless no more meshes were decoded than the entry it was loaded from has"""
+        if isinstance(self._meshes, LazyMeshList) and self._meshes.num_decoded <= num_decoded:
+            return
+        try:
+            with self._report.span("cache store"):
+                cache.store(path, self, key)
+        except OSError as e:
+            print(f"Failed to store {path} in the shape cache: {e}")
+
+    def _restore_cached_meshes(self, path: str) -> int:
+        """rebuild the mesh list of a shape loaded from the cache, returns the number of meshes the entry has decoded
+        the other meshes are decoded from the shape file, when they're accessed with lazy_meshes"""
+        meshes = self._meshes
+        lazy_states = self.__dict__.pop("_lazy_mesh_states", None) or [None] * len(meshes)
+
+        self._meshes = LazyMeshList(self._decode_mesh)
+        for mesh, lazy_state in zip(meshes, lazy_states):
+            if mesh is None:
+                self._meshes.append_lazy(*lazy_state)
+            else:
+                self._meshes.append(mesh, _get_mesh_type(mesh))
+
+        num_decoded = self._meshes.num_decoded
+        if num_decoded < len(meshes):
+            self._map_mesh_buffer(path)
+        if not self._lazy_meshes:
+            self._meshes = list(self._meshes)
+            self.close()
+        return num_decoded
+
+    def _map_mesh_buffer(self, path: str):
+        """map the TSAlloc region of a shape file to decode meshes from, the cache key made sure it's the file which was read"""
+        with open(path, "rb") as f:
+            self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size_mem_buffer, start_u16, start_u8 = struct.unpack_from('<iii', self._mapping, 4)
+        data = memoryview(self._mapping)
+        buf = data[16:16 + size_mem_buffer * 4]
+        data.release()
+        self._ts_alloc = TSAlloc(buf, size_mem_buffer, start_u16, start_u8, copy_arrays=True)
+
+    def _read_path(self, path: str, use_mmap: bool):
         with open(path, "rb") as f:
-            self.read(f)
+            mapping = None
+            if use_mmap:
+                try:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (ValueError, OSError):
+                    mapping = None # e.g. empty files, read these normally
+
+            if mapping is None:
+                self.read(f)
+                return
+
+        self._mapping = mapping
+        try:
+            self.read_buffer(mapping, copy_arrays=True)
+        except BaseException:
+            self.close()
+            raise
+
+        if not self._lazy_meshes:
+            self.close()
+
+    def close(self):
+        """release the file mapping of a shape read with read_from_path
+        meshes which were not decoded yet can't be decoded after this
+        lazy shapes read through the shape cache are stored in it first"""
+        if self._cache_entry is not None:
+            cache_entry, self._cache_entry = self._cache_entry, None
+            self._store_in_cache(*cache_entry)
+
+        if self._mapping is None:
+            return
+
+        if self._ts_alloc is not None:
+            self._ts_alloc.data.release()
+            self._ts_alloc = None
+
+        self._mapping.close()
+        self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def assemble(self, ts_alloc, version: int):
+        self._ts_alloc = ts_alloc
+        self._version = version
+        laps = self._report.laps()
+
         num_nodes = ts_alloc.read32()
         num_objects = ts_alloc.read32()
         num_decals = ts_alloc.read32()
@@ -347,13 +1114,13 @@ class TSShape:
 
         ts_alloc.check_guard()
 
-        radius = ts_alloc.read_float()
-        tube_radius = ts_alloc.read_float()
-        center = [ts_alloc.read_float() for _ in range(3)]
-        bounds_min = [ts_alloc.read_float() for _ in range(3)]
-        bounds_max = [ts_alloc.read_float() for _ in range(3)]
+        self._radius = ts_alloc.read_float()
+        self._tube_radius = ts_alloc.read_float()
+        self._center = ts_alloc.read_float_array(3)
+        self._bounds = ts_alloc.read_float_array(6).reshape(2, 3)
 
         ts_alloc.check_guard()
+        laps.lap("header")
 
         # Node data
         for _ in range(num_nodes):
@@ -362,6 +1129,7 @@ class TSShape:
             self._nodes.append(node)
             
         ts_alloc.check_guard()
+        laps.lap("nodes")
 
         # Object data
         for _ in range(num_objects):
@@ -376,6 +1144,8 @@ class TSShape:
 
         ts_alloc.check_guard()
 
+        laps.lap("objects")
+
         # Deprecated decals
         for _ in range(num_decals):
             for _ in range(5):
@@ -407,70 +1177,55 @@ class TSShape:
             ts_alloc.read32()  # deprecated subShapeNumDecals
         ts_alloc.check_guard()
 
+        laps.lap("sub shapes")
+
         # Default rotations and translations
-        for x in range(num_nodes):
-            quat = TQuaternion16(ts_alloc.read16(), ts_alloc.read16(), ts_alloc.read16(), ts_alloc.read16())
-            self._nodes[x].rotation = quat
+        self._default_rotations = default_rotations = ts_alloc.read16_array(num_nodes * 4).reshape(num_nodes, 4)
+        for x, (qx, qy, qz, qw) in enumerate(default_rotations.tolist()):
+            self._nodes[x].rotation = TQuaternion16(qx, qy, qz, qw)
                 
         ts_alloc.align32()
 
-        for x in range(num_nodes):
-            self._nodes[x].translation = (ts_alloc.read_float(), ts_alloc.read_float(), ts_alloc.read_float())
-
-        # Node sequence data
-        for _ in range(num_node_trans):
-            for _ in range(3):
-                ts_alloc.read32()
+        self._default_translations = default_translations = ts_alloc.read_float_array(num_nodes * 3).reshape(num_nodes, 3)
+        for x, translation in enumerate(default_translations.tolist()):
+            self._nodes[x].translation = tuple(translation)
+        laps.lap("node transforms")
 
-        for _ in range(num_node_rots):
-            for _ in range(4):
-                ts_alloc.read16()
+        # Node sequence data, each kind of key in one array
+        self._node_translations = ts_alloc.read_float_array(num_node_trans * 3).reshape(num_node_trans, 3)
+        self._node_rotations = ts_alloc.read16_array(num_node_rots * 4).reshape(num_node_rots, 4)
 
         ts_alloc.align32()
         ts_alloc.check_guard()
 
         if version > 21:
-            for _ in range(num_node_uniform_scales):
-                ts_alloc.read32()
-
-            for _ in range(num_node_aligned_scales):
-                for _ in range(3):
-                    ts_alloc.read32()
-
-            for _ in range(num_node_arbitrary_scales):
-                for _ in range(3):
-                    ts_alloc.read32()
-            for _ in range(num_node_arbitrary_scales):
-                for _ in range(4):
-                    ts_alloc.read16()
+            self._node_uniform_scales = ts_alloc.read_float_array(num_node_uniform_scales)
+            self._node_aligned_scales = ts_alloc.read_float_array(num_node_aligned_scales * 3).reshape(num_node_aligned_scales, 3)
+            self._node_arbitrary_scale_factors = ts_alloc.read_float_array(num_node_arbitrary_scales * 3).reshape(num_node_arbitrary_scales, 3)
+            self._node_arbitrary_scale_rotations = ts_alloc.read16_array(num_node_arbitrary_scales * 4).reshape(num_node_arbitrary_scales, 4)
 
             ts_alloc.align32()
             ts_alloc.check_guard()
 
         if version > 23:
-            for _ in range(num_ground_frames):
-                for _ in range(3):
-                    ts_alloc.read32()
-            for _ in range(num_ground_frames):
-                for _ in range(4):
-                    ts_alloc.read16()
+            self._ground_translations = ts_alloc.read_float_array(num_ground_frames * 3).reshape(num_ground_frames, 3)
+            self._ground_rotations = ts_alloc.read16_array(num_ground_frames * 4).reshape(num_ground_frames, 4)
             ts_alloc.align32()
             ts_alloc.check_guard()
 
-        for _ in range(num_object_states):
-            for _ in range(3):
-                ts_alloc.read32()
+        laps.lap("node animation")
+
+        self._object_states = ts_alloc.read32_array(num_object_states * 3).reshape(num_object_states, 3)
         ts_alloc.check_guard()
 
-        for _ in range(num_decal_states):
-            ts_alloc.read32()
+        ts_alloc.skip32(num_decal_states) # deprecated
         ts_alloc.check_guard()
 
-        for _ in range(num_triggers):
-            ts_alloc.read32()
-            ts_alloc.read32()
+        self._triggers = ts_alloc.read32_array(num_triggers * 2).reshape(num_triggers, 2)
         ts_alloc.check_guard()
 
+        laps.lap("states and triggers")
+
         for _ in range(num_details):
             detail = ShapeDetail()
             detail.assemble(ts_alloc, version)
@@ -479,7 +1234,13 @@ class TSShape:
         ts_alloc.check_guard()
 
         if version >= 27:
-            raise NotImplementedError("Vertex format")
+            self._vertex_format = TSBasicVertexFormat()
+            self._vertex_format.assemble(ts_alloc)
+            ts_alloc.align32()
+            ts_alloc.check_guard()
+
+        self._build_sub_shape_index()
+        laps.lap("details")
 
         # Meshes
         for _ in range(num_meshes):
@@ -488,34 +1249,18 @@ class TSShape:
             mesh_type = mesh_type_raw & MeshType.TypeMask
             mesh_flags = mesh_type_raw & ~MeshType.TypeMask
 
-            if mesh_type == MeshType.StandardMeshType:
-                mesh = TSMesh()
-                mesh.assemble(ts_alloc, version)
-                self._meshes.append(mesh)
-            elif mesh_type == MeshType.NullMeshType:
-                mesh = TSNullMesh()
-                self._meshes.append(mesh)
-            elif mesh_type == MeshType.SkinMeshType:
-                mesh = TSSkinnedMesh()
-                mesh.assemble(ts_alloc, version)
-                self._meshes.append(mesh)
-            else:
-                raise NotImplementedError(f"Can't parse mesh of type {mesh_type}")
+            self._read_mesh(ts_alloc, mesh_type, version)
 
         ts_alloc.check_guard()
+        laps.lap("meshes")
 
         # Names
-        for _ in range(num_names):
-            chars = []
-            while True:
-                b = ts_alloc.read8()
-                if b == 0:
-                    break
-                chars.append(chr(b))
-            self._names.append(''.join(chars))
+        self._names = _decode_names(ts_alloc.read8_strings(num_names))
+        self._name_lookup = _get_name_lookup(self._names)
 
         ts_alloc.align32()
         ts_alloc.check_guard()
+        laps.lap("names")
 
         if version < 23:
             # read skinned meshes from old versions
@@ -525,8 +1270,189 @@ class TSShape:
             ts_alloc.check_guard()
 
             for _ in range(num_skins):
-                mesh = TSSkinnedMesh()
-                mesh.assemble(ts_alloc, version)
-                self._meshes.append(mesh)
+                self._read_mesh(ts_alloc, MeshType.SkinMeshType, version)
 
             ts_alloc.check_guard()
+            laps.lap("meshes")
+
+    def disassemble(self, ts_alloc: TSAllocWriter, version: int):
+        """write the shape into the 32, 16 and 8-bit buffers, the counterpart of assemble for versions 24 to 27
+        deprecated decals are left out, the smallest visible detail is found from the details like Torque does"""
+        laps = self._report.laps()
+
+        # the smallest detail with a non-negative size, collision details have negative sizes
+        visible = [(detail.size, x) for x, detail in enumerate(self._details) if detail.size >= 0.0]
+        smallest_visible_size, smallest_visible_dl = min(visible) if visible else (0.0, -1)
+
+        ts_alloc.write32(len(self._nodes))
+        ts_alloc.write32(len(self._objects))
+        ts_alloc.write32(0) # decals
+        ts_alloc.write32(len(self._sub_shape_first_node))
+        ts_alloc.write32(0) # ifl materials
+        ts_alloc.write32(len(self._node_rotations))
+        ts_alloc.write32(len(self._node_translations))
+        ts_alloc.write32(len(self._node_uniform_scales))
+        ts_alloc.write32(len(self._node_aligned_scales))
+        ts_alloc.write32(len(self._node_arbitrary_scale_factors))
+        ts_alloc.write32(len(self._ground_translations))
+        ts_alloc.write32(len(self._object_states))
+        ts_alloc.write32(0) # decal states
+        ts_alloc.write32(len(self._triggers))
+        ts_alloc.write32(len(self._details))
+        ts_alloc.write32(len(self._meshes))
+        ts_alloc.write32(len(self._names))
+        ts_alloc.write_float(smallest_visible_size)
+        ts_alloc.write32(smallest_visible_dl)
+        ts_alloc.write_guard()
+
+        ts_alloc.write_float(self._radius)
+        ts_alloc.write_float(self._tube_radius)
+        ts_alloc.write_float_array(self._center)
+        ts_alloc.write_float_array(self._bounds)
+        ts_alloc.write_guard()
+        laps.lap("write header")
+
+        for node in self._nodes:
+            node.disassemble(ts_alloc)
+        ts_alloc.write_guard()
+
+        for shape_object in self._objects:
+            shape_object.disassemble(ts_alloc)
+        ts_alloc.write_guard()
+        ts_alloc.write_guard() # decals
+        ts_alloc.write_guard() # ifl decals
+        laps.lap("write objects")
+
+        num_sub_shapes = len(self._sub_shape_first_node)
+        ts_alloc.write32_array(self._sub_shape_first_node)
+        ts_alloc.write32_array(self._sub_shape_first_object)
+        ts_alloc.write32_array(np.zeros(num_sub_shapes)) # deprecated subShapeFirstDecal
+        ts_alloc.write_guard()
+        ts_alloc.write32_array(self._sub_shape_num_nodes)
+        ts_alloc.write32_array(self._sub_shape_num_objects)
+        ts_alloc.write32_array(np.zeros(num_sub_shapes)) # deprecated subShapeNumDecals
+        ts_alloc.write_guard()
+
+        # default transforms come from the nodes, so changes to them are written
+        rotations = [(node.rotation.x, node.rotation.y, node.rotation.z, node.rotation.w) for node in self._nodes]
+        ts_alloc.write16_array(np.array(rotations, dtype=np.int16).reshape(-1, 4))
+        ts_alloc.align32()
+        ts_alloc.write_float_array(np.array([node.translation for node in self._nodes], dtype=np.float32).reshape(-1, 3))
+        laps.lap("write node transforms")
+
+        ts_alloc.write_float_array(self._node_translations)
+        ts_alloc.write16_array(self._node_rotations)
+        ts_alloc.align32()
+        ts_alloc.write_guard()
+
+        ts_alloc.write_float_array(self._node_uniform_scales)
+        ts_alloc.write_float_array(self._node_aligned_scales)
+        ts_alloc.write_float_array(self._node_arbitrary_scale_factors)
+        ts_alloc.write16_array(self._node_arbitrary_scale_rotations)
+        ts_alloc.align32()
+        ts_alloc.write_guard()
+
+        ts_alloc.write_float_array(self._ground_translations)
+        ts_alloc.write16_array(self._ground_rotations)
+        ts_alloc.align32()
+        ts_alloc.write_guard()
+        laps.lap("write node animation")
+
+        ts_alloc.write32_array(self._object_states)
+        ts_alloc.write_guard()
+        ts_alloc.write_guard() # decal states
+        ts_alloc.write32_array(self._triggers)
+        ts_alloc.write_guard()
+
+        for detail in self._details:
+            detail.disassemble(ts_alloc, version)
+        ts_alloc.write_guard()
+
+        vertex_layouts = [None] * len(self._meshes)
+        if version >= 27:
+            vertex_format = self._vertex_format
+            if vertex_format is None:
+                vertex_format = TSBasicVertexFormat.for_meshes(self._meshes)
+            vertex_format.disassemble(ts_alloc)
+            ts_alloc.align32()
+            ts_alloc.write_guard()
+            vertex_layouts = self._get_vertex_layouts(vertex_format)
+        laps.lap("write details")
+
+        for mesh, vertex_layout in zip(self._meshes, vertex_layouts):
+            mesh_type = _get_mesh_type(mesh)
+            ts_alloc.write32(mesh_type)
+            if mesh_type != MeshType.NullMeshType:
+                mesh.disassemble(ts_alloc, version, vertex_layout)
+        ts_alloc.write_guard()
+        laps.lap("write meshes")
+
+        names = [name.encode('utf-8') for name in self._names]
+        if any(b'\0' in name for name in names):
+            raise ValueError("Names can't contain NUL characters")
+        ts_alloc.write8_array(np.frombuffer(b"".join(name + b'\0' for name in names), dtype=np.uint8))
+        ts_alloc.align32()
+        ts_alloc.write_guard()
+        laps.lap("write names")
+
+    def _get_vertex_layouts(self, vertex_format: TSBasicVertexFormat) -> list:
+        """the vertex buffer layout of each mesh for writing, None for null meshes
+        meshes without a layout are placed after the others, or use their parent's"""
+        meshes = list(self._meshes)
+        layouts = [mesh.vertex_layout if isinstance(mesh, TSMesh) else None for mesh in meshes]
+        end = max((offset + count * size for offset, count, size in filter(None, layouts) if offset >= 0), default=0)
+
+        for x, mesh in enumerate(meshes):
+            if layouts[x] is not None and layouts[x][0] < 0 and mesh.parent_mesh < 0:
+                layouts[x] = (end, len(mesh.vertices), vertex_format.vertex_size)
+                end += len(mesh.vertices) * vertex_format.vertex_size
+
+        for x, mesh in enumerate(meshes):
+            if layouts[x] is not None and layouts[x][0] < 0:
+                parent_layout = layouts[mesh.parent_mesh] if 0 <= mesh.parent_mesh < len(layouts) else None
+                layouts[x] = parent_layout if parent_layout is not None else (0, 0, vertex_format.vertex_size)
+        return layouts
+
+    def write_buffer(self, version: int = 26) -> bytes:
+        """the bytes of a shape file of version 24 to 27"""
+        if version < 24 or version > 27:
+            raise ValueError(f"Can't write version {version} shapes, only versions 24 to 27")
+
+        with self._report.span("write"):
+            ts_alloc = TSAllocWriter()
+            self.disassemble(ts_alloc, version)
+            size_mem_buffer, start_u16, start_u8, buffer = ts_alloc.get_buffer()
+
+            # sequences and the material list follow the TSAlloc buffers
+            writer = BufferWriter()
+            with self._report.span("write sequences"):
+                writer.pack('<i', len(self._sequences))
+                for sequence in self._sequences:
+                    sequence.write(writer, version)
+
+            with self._report.span("write material list"):
+                self._material_list.write(writer, version)
+
+            header = struct.pack('<4i', version, size_mem_buffer, start_u16, start_u8)
+            return b"".join((header, buffer, writer.getvalue()))
+
+    def write_to_path(self, path: str, version: int = 26):
+        data = self.write_buffer(version)
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def check_round_trip(data: bytes) -> TSShape:
+    """read a written shape back and write it again, raises ValueError unless the second write is the same bytes
+    returns the shape which was read back"""
+    version = struct.unpack_from('<i', data)[0] & 0xFF
+    shape = TSShape()
+    shape.read_buffer(data)
+    rewritten = shape.write_buffer(version)
+    if rewritten != data:
+        size = min(len(data), len(rewritten))
+        differences = np.flatnonzero(np.frombuffer(data, np.uint8, size) != np.frombuffer(rewritten, np.uint8, size))
+        offset = int(differences[0]) if len(differences) > 0 else size
+        raise ValueError(f"Shape changed when read back, first difference at byte {offset} "
+                         f"({len(data)} bytes written, {len(rewritten)} bytes rewritten)")
+    return shape
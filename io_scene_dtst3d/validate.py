@@ -0,0 +1,229 @@
+# Checks that shape files are well-formed without importing them, e.g. to gate
+# an asset library in CI. The structure is walked with guard checks and every
+# read is bounds-checked against its TSAlloc region, while mesh payloads are
+# skipped over instead of decoded. Then the indices between nodes, objects,
+# meshes, details and sequences are checked. Files are checked in a pool of
+# worker processes and a JSON summary is written.
+#
+#   python io_scene_dtst3d/validate.py [options] INPUT [INPUT ...]
+#
+# INPUT may be a .dts file, a directory or a glob pattern. The exit status is
+# 1 when any file has errors.
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+if __package__ in (None, ""):
+    # run as a script, make the add-on package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from io_scene_dtst3d.shapefiles import find_shape_files
+from io_scene_dtst3d.tsalloc import ShapeFormatError
+from io_scene_dtst3d.tsshape import TSShape, SequenceFlags, MIN_READ_VERSION, MAX_READ_VERSION
+
+
+class ValidationIssue:
+    """one problem found in a shape
+    kind is "format" for a malformed structure, "reference" for an index pointing outside of what it indexes,
+    "unsupported" for valid files this add-on can't read and "io" when the file couldn't be read
+    offset is the file offset of the problem, -1 for references and when it isn't known"""
+    def __init__(self, kind: str, message: str, region: str = "", offset: int = -1):
+        self.kind = kind
+        self.message = message
+        self.region = region
+        self.offset = offset
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "message": self.message, "region": self.region, "offset": self.offset}
+
+
+class ValidationResult:
+    def __init__(self, path: str):
+        self.path = path
+        self.version = -1
+        self.bytes = 0
+        self.seconds = 0.0
+        self.issues: List[ValidationIssue] = []
+
+    @property
+    def valid(self) -> bool:
+        return len(self.issues) == 0
+
+    def to_dict(self) -> dict:
+        return {"path": self.path, "valid": self.valid, "version": self.version, "bytes": self.bytes,
+                "seconds": round(self.seconds, 6), "issues": [issue.to_dict() for issue in self.issues]}
+
+
+def check_references(shape: TSShape) -> List[ValidationIssue]:
+    """check that the indices of a shape which was read stay inside of what they index"""
+    issues = []
+    def check(condition, message):
+        if not condition:
+            issues.append(ValidationIssue("reference", message))
+
+    num_names = len(shape.names)
+    num_nodes = len(shape.nodes)
+    num_objects = len(shape.objects)
+    num_meshes = len(shape.meshes)
+
+    for x, node in enumerate(shape.nodes):
+        check(0 <= node.name_index < num_names, f"Node {x} has name {node.name_index} of {num_names}")
+        check(-1 <= node.parent_index < num_nodes and node.parent_index != x, f"Node {x} has parent {node.parent_index} of {num_nodes}")
+
+    for x, obj in enumerate(shape.objects):
+        check(0 <= obj.name_index < num_names, f"Object {x} has name {obj.name_index} of {num_names}")
+        check(-1 <= obj.node_index < num_nodes, f"Object {x} has node {obj.node_index} of {num_nodes}")
+        check(obj.num_meshes >= 0 and (obj.num_meshes == 0 or 0 <= obj.start_mesh_index <= num_meshes - obj.num_meshes),
+              f"Object {x} has meshes {obj.start_mesh_index} to {obj.start_mesh_index + obj.num_meshes} of {num_meshes}")
+
+    for x in range(shape.num_sub_shapes):
+        nodes = shape.get_sub_shape_nodes(x)
+        check(0 <= nodes.start <= nodes.stop <= num_nodes, f"Sub shape {x} has nodes {nodes.start} to {nodes.stop} of {num_nodes}")
+        objects = shape.get_sub_shape_objects(x)
+        check(0 <= objects.start <= objects.stop <= num_objects, f"Sub shape {x} has objects {objects.start} to {objects.stop} of {num_objects}")
+
+    for x, detail in enumerate(shape.details):
+        check(0 <= detail.name_index < num_names, f"Detail {x} has name {detail.name_index} of {num_names}")
+        check(detail.sub_shape_num < shape.num_sub_shapes, f"Detail {x} has sub shape {detail.sub_shape_num} of {shape.num_sub_shapes}")
+
+    for x, sequence in enumerate(shape.sequences):
+        check(0 <= sequence.name_index < num_names, f"Sequence {x} has name {sequence.name_index} of {num_names}")
+
+        # each track holds num_keyframes keys for every node in its set
+        tracks = [("rotation", sequence.base_rotation, sequence.rotation_matters, len(shape.node_rotations)),
+                  ("translation", sequence.base_translation, sequence.translation_matters, len(shape.node_translations))]
+        if sequence.flags & SequenceFlags.ArbitraryScale:
+            tracks.append(("scale", sequence.base_scale, sequence.scale_matters, len(shape.node_arbitrary_scale_factors)))
+        elif sequence.flags & SequenceFlags.AlignedScale:
+            tracks.append(("scale", sequence.base_scale, sequence.scale_matters, len(shape.node_aligned_scales)))
+        elif sequence.flags & SequenceFlags.UniformScale:
+            tracks.append(("scale", sequence.base_scale, sequence.scale_matters, len(shape.node_uniform_scales)))
+
+        for track, base, matters, num_keys in tracks:
+            nodes = matters.get_indices()
+            if len(nodes) == 0:
+                continue
+            end = base + len(nodes) * sequence.num_keyframes
+            check(0 <= base and end <= num_keys, f"Sequence {x} has {track} keys {base} to {end} of {num_keys}")
+            check(nodes[-1] < num_nodes, f"Sequence {x} animates the {track} of node {nodes[-1]} of {num_nodes}")
+
+        if sequence.num_ground_frames > 0:
+            end = sequence.first_ground_frame + sequence.num_ground_frames
+            check(0 <= sequence.first_ground_frame and end <= len(shape.ground_translations),
+                  f"Sequence {x} has ground frames {sequence.first_ground_frame} to {end} of {len(shape.ground_translations)}")
+        if sequence.num_triggers > 0:
+            end = sequence.first_trigger + sequence.num_triggers
+            check(0 <= sequence.first_trigger and end <= len(shape.triggers),
+                  f"Sequence {x} has triggers {sequence.first_trigger} to {end} of {len(shape.triggers)}")
+
+    return issues
+
+
+def validate_buffer(buffer, path: str = "") -> ValidationResult:
+    """check a shape held in a bytes-like object, meshes are walked over but not decoded"""
+    time1 = time.perf_counter()
+    result = ValidationResult(path)
+    result.bytes = len(buffer)
+    if len(buffer) >= 4:
+        result.version = buffer[0]
+
+    shape = TSShape(lazy_meshes=True)
+    try:
+        shape.read_buffer(buffer)
+        result.issues.extend(check_references(shape))
+    except ShapeFormatError as e:
+        supported = MIN_READ_VERSION <= result.version <= MAX_READ_VERSION or result.bytes < 16
+        result.issues.append(ValidationIssue("format" if supported else "unsupported", e.message, e.region, e.offset))
+    except NotImplementedError as e:
+        result.issues.append(ValidationIssue("unsupported", str(e)))
+    except Exception as e:
+        result.issues.append(ValidationIssue("format", f"{type(e).__name__}: {e}"))
+    finally:
+        shape.close()
+
+    result.seconds = time.perf_counter() - time1
+    return result
+
+
+def validate_path(path: str) -> ValidationResult:
+    """check a shape file, worker entry point"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        result = ValidationResult(path)
+        result.issues.append(ValidationIssue("io", str(e)))
+        return result
+    return validate_buffer(data, path)
+
+
+def validate_paths(paths, jobs: int):
+    """check shape files in worker processes, results are yielded in input order"""
+    if jobs <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield validate_path(path)
+        return
+
+    # like the batch importer, workers start a fresh interpreter
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        # files are small and quick to check, send them in chunks
+        chunksize = max(1, min(64, len(paths) // (jobs * 4)))
+        yield from executor.map(validate_path, paths, chunksize=chunksize)
+
+
+def get_summary(results: List[ValidationResult], seconds: float, include_valid: bool = True) -> dict:
+    """JSON-ready summary of the results, with the number of issues of each kind"""
+    issue_counts = {}
+    for result in results:
+        for issue in result.issues:
+            issue_counts[issue.kind] = issue_counts.get(issue.kind, 0) + 1
+
+    num_valid = sum(1 for result in results if result.valid)
+    return {
+        "files": len(results),
+        "valid": num_valid,
+        "invalid": len(results) - num_valid,
+        "issues": issue_counts,
+        "seconds": round(seconds, 6),
+        "results": [result.to_dict() for result in results if include_valid or not result.valid],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that DTS files are well-formed without importing them")
+    parser.add_argument("inputs", nargs="+", help=".dts files, directories or glob patterns")
+    parser.add_argument("-o", "--output", help="write the JSON summary to this file instead of printing it")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("-r", "--recursive", action="store_true", help="search directories recursively")
+    parser.add_argument("--failures-only", action="store_true", help="leave files without issues out of the results")
+    args = parser.parse_args(argv)
+
+    paths = find_shape_files(args.inputs, args.recursive)
+    if len(paths) == 0:
+        parser.error("no .dts files found")
+
+    time1 = time.perf_counter()
+    results = list(validate_paths(paths, args.jobs))
+    summary = get_summary(results, time.perf_counter() - time1, not args.failures_only)
+
+    text = json.dumps(summary, indent=1)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Checked {summary['files']} shapes, {summary['invalid']} with issues, in %.4f sec." % summary["seconds"])
+    else:
+        print(text)
+
+    return 1 if summary["invalid"] > 0 else 0
+
+
+if __name__ == "__main__":
+    # call main through the package module so worker functions pickle by their package name
+    from io_scene_dtst3d.validate import main as validate_main
+    sys.exit(validate_main())
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# the corpus generator lives with the benchmarks, it isn't part of the add-on
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from generate_corpus import generate_corpus
+
+
+@pytest.fixture(scope="session")
+def small_corpus(tmp_path_factory):
+    """a scaled down corpus of every version with strip and list primitives, static and skinned
+    returns the directory and the shape arguments by file name"""
+    directory = tmp_path_factory.mktemp("corpus")
+    manifest = generate_corpus(str(directory), scale=0.25, verts_per_mesh=64, num_keyframes=4)
+    return directory, manifest["shapes"]
@@ -0,0 +1,23 @@
+import struct
+
+from io_scene_dtst3d import bufferreader
+from io_scene_dtst3d.bufferreader import BufferReader, BufferWriter
+
+
+def test_pack_and_unpack():
+    writer = BufferWriter()
+    writer.pack('<iLf', -1, 7, 0.5)
+    writer.pack('<3h', 1, 2, 3)
+    reader = BufferReader(writer.getvalue())
+    assert reader.unpack('<iLf') == (-1, 7, 0.5)
+    assert reader.unpack('<3h') == (1, 2, 3)
+    assert reader.tell() == writer.tell() == 18
+
+
+def test_compiled_formats_are_bounded():
+    bufferreader._get_struct.cache_clear()
+    data = struct.pack('<1000i', *range(1000))
+    for count in range(1, 1000):
+        assert BufferReader(data).unpack(f'<{count}i')[-1] == count - 1
+    info = bufferreader._get_struct.cache_info()
+    assert info.currsize <= info.maxsize < 1000
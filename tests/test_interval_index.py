@@ -0,0 +1,44 @@
+import numpy as np
+
+from io_scene_dtst3d.tsshape import IntervalIndex
+
+
+def linear_find(firsts, counts, value):
+    """the scan TSShape used before IntervalIndex, the first interval holding value"""
+    for x in range(len(firsts)):
+        if firsts[x] <= value < firsts[x] + counts[x]:
+            return x
+    return -1
+
+
+def check_against_scan(firsts, counts):
+    index = IntervalIndex(firsts, counts)
+    values = list(range(-2, max(f + c for f, c in zip(firsts, counts)) + 3))
+    expected = [linear_find(firsts, counts, value) for value in values]
+    assert [index.find(value) for value in values] == expected
+    assert index.find_many(values).tolist() == expected
+
+
+def test_disjoint_intervals():
+    check_against_scan([0, 3, 10], [3, 7, 2])
+
+
+def test_unsorted_and_empty_intervals():
+    check_against_scan([10, 0, 5, 3], [2, 3, 0, 2])
+
+
+def test_nested_intervals():
+    # an outer interval holding inner ones, in both orders
+    check_against_scan([0, 2, 4], [10, 2, 1])
+    check_against_scan([2, 4, 0], [2, 1, 10])
+
+
+def test_overlapping_intervals():
+    check_against_scan([0, 3, 5, 1], [5, 4, 1, 8])
+
+
+def test_random_intervals():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        num_intervals = int(rng.integers(1, 8))
+        check_against_scan(rng.integers(0, 20, num_intervals).tolist(), rng.integers(0, 6, num_intervals).tolist())
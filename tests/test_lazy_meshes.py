@@ -0,0 +1,48 @@
+import numpy as np
+
+from io_scene_dtst3d.tsmesh import TSMesh, TSSkinnedMesh
+from io_scene_dtst3d.tsshape import LazyMeshList, TSShape
+
+
+def read_shape(path, lazy_meshes):
+    shape = TSShape(lazy_meshes=lazy_meshes)
+    with open(path, "rb") as f:
+        shape.read(f)
+    return shape
+
+
+def check_same_meshes(lazy, eager):
+    assert len(lazy.meshes) == len(eager.meshes)
+    for lazy_mesh, eager_mesh in zip(lazy.meshes, eager.meshes):
+        assert type(lazy_mesh) is type(eager_mesh)
+        if not isinstance(eager_mesh, TSMesh):
+            continue
+        np.testing.assert_array_equal(lazy_mesh.vertices, eager_mesh.vertices)
+        np.testing.assert_array_equal(lazy_mesh.normals, eager_mesh.normals)
+        np.testing.assert_array_equal(lazy_mesh.tvertices, eager_mesh.tvertices)
+        np.testing.assert_array_equal(lazy_mesh.indices, eager_mesh.indices)
+        np.testing.assert_array_equal(lazy_mesh.get_triangles()[0], eager_mesh.get_triangles()[0])
+        if isinstance(eager_mesh, TSSkinnedMesh):
+            np.testing.assert_array_equal(lazy_mesh.vertex_indices, eager_mesh.vertex_indices)
+            np.testing.assert_array_equal(lazy_mesh.weights, eager_mesh.weights)
+
+
+def test_lazy_meshes_match_eager_meshes(small_corpus):
+    directory, shapes = small_corpus
+    for name in shapes:
+        eager = read_shape(directory / name, False)
+        lazy = read_shape(directory / name, True)
+        assert isinstance(lazy.meshes, LazyMeshList)
+        assert lazy.meshes.num_decoded == sum(1 for mesh in eager.meshes if not isinstance(mesh, TSMesh))
+        check_same_meshes(lazy, eager)
+
+
+def test_lazy_meshes_decode_in_any_order(small_corpus):
+    directory, shapes = small_corpus
+    for name in shapes:
+        eager = read_shape(directory / name, False)
+        lazy = read_shape(directory / name, True)
+        # decoding backwards decodes meshes before the meshes they follow in the file
+        for x in reversed(range(len(lazy.meshes))):
+            lazy.meshes[x]
+        check_same_meshes(lazy, eager)
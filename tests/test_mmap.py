@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+import pytest
+
+from io_scene_dtst3d.tsmesh import TSMesh
+from io_scene_dtst3d.tsshape import TSShape
+
+
+def check_same_shape(shape, other):
+    assert shape.names == other.names
+    assert len(shape.nodes) == len(other.nodes)
+    assert len(shape.sequences) == len(other.sequences)
+    assert [material.name for material in shape.materials] == [material.name for material in other.materials]
+    np.testing.assert_array_equal(shape.node_rotations, other.node_rotations)
+    np.testing.assert_array_equal(shape.node_translations, other.node_translations)
+    assert len(shape.meshes) == len(other.meshes)
+    for mesh, other_mesh in zip(shape.meshes, other.meshes):
+        if isinstance(mesh, TSMesh):
+            np.testing.assert_array_equal(mesh.vertices, other_mesh.vertices)
+            np.testing.assert_array_equal(mesh.indices, other_mesh.indices)
+
+
+def test_mapped_reads_match_stream_reads(small_corpus):
+    directory, shapes = small_corpus
+    for name in shapes:
+        path = directory / name
+        streamed = TSShape()
+        streamed.read(io.BytesIO(path.read_bytes()))
+        for lazy_meshes in (False, True):
+            with TSShape(lazy_meshes=lazy_meshes) as mapped:
+                mapped.read_from_path(str(path), use_mmap=True)
+                check_same_shape(mapped, streamed)
+
+
+def test_mapped_arrays_outlive_the_mapping(small_corpus):
+    directory, shapes = small_corpus
+    path = directory / "v26_list_skinned.dts"
+    expected = TSShape()
+    expected.read(io.BytesIO(path.read_bytes()))
+
+    shape = TSShape()
+    shape.read_from_path(str(path), use_mmap=True)
+    # eager shapes release the mapping right away, the arrays are copies
+    for mesh, expected_mesh in zip(shape.meshes, expected.meshes):
+        if isinstance(mesh, TSMesh):
+            assert mesh.vertices.flags.writeable
+            np.testing.assert_array_equal(mesh.vertices, expected_mesh.vertices)
+
+
+def test_close_keeps_decoded_meshes(small_corpus):
+    directory, shapes = small_corpus
+    path = directory / "v27_strip_static.dts"
+    expected = TSShape()
+    expected.read(io.BytesIO(path.read_bytes()))
+
+    shape = TSShape(lazy_meshes=True)
+    shape.read_from_path(str(path), use_mmap=True)
+    decoded = shape.meshes[0]
+    shape.close()
+
+    np.testing.assert_array_equal(decoded.vertices, expected.meshes[0].vertices)
+    np.testing.assert_array_equal(decoded.indices, expected.meshes[0].indices)
+    assert shape.meshes[0] is decoded
+    with pytest.raises(ValueError):
+        shape.meshes[1]
+    shape.close() # closing twice is fine
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from io_scene_dtst3d.tsmesh import TSDrawPrimitive, TSDrawPrimitiveType, decode_primitives
+from io_scene_dtst3d.tsshape import TSShape
+
+
+def test_primitives_without_material_decode_to_minus_one():
+    flags = TSDrawPrimitiveType.Triangles | TSDrawPrimitiveType.Indexed
+    primitives = [TSDrawPrimitive(0, 3, flags | TSDrawPrimitiveType.NoMaterial), TSDrawPrimitive(3, 3, flags | 0)]
+    triangles, materials = decode_primitives(np.arange(6), primitives)
+    assert len(triangles) == 2
+    assert materials.tolist() == [-1, 0]
+
+
+def test_export_without_materials_imports_again(tmp_path):
+    bpy = pytest.importorskip("bpy")
+    from io_scene_dtst3d import export_dts, import_dts
+
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    me = bpy.data.meshes.new("Quad")
+    me.from_pydata([(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 1.0, 0.0), (0.0, 1.0, 0.0)], [], [(0, 1, 2, 3)])
+    ob = bpy.data.objects.new("Quad", me)
+    bpy.context.scene.collection.objects.link(ob)
+
+    path = str(tmp_path / "quad.dts")
+    export_dts.save_dts(path, bpy.context, verify=True)
+    shape = TSShape()
+    shape.read_from_path(path)
+    assert len(shape.materials) == 0
+    assert all(prim.has_no_material for prim in shape.meshes[0].primitives)
+
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    import_dts.load_dts(path, bpy.context)
+    imported = bpy.data.objects["Quad"]
+    assert len(imported.data.polygons) == 2
+    assert [slot.material for slot in imported.material_slots] == [None]
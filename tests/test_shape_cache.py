@@ -0,0 +1,157 @@
+import pathlib
+
+import numpy as np
+
+from io_scene_dtst3d import shapecache
+from io_scene_dtst3d.shapecache import ShapeCache, get_default_cache
+from io_scene_dtst3d.tsmesh import TSMesh
+from io_scene_dtst3d.tsshape import TSShape
+
+from generate_corpus import write_shape
+
+
+def write_small_shape(path, version=26, **kwargs):
+    spec = dict(version=version, num_objects=2, num_details=2, verts_per_mesh=64, strip=False, skinned=True,
+                num_nodes=3, num_sequences=1, num_keyframes=4, num_materials=2)
+    spec.update(kwargs)
+    write_shape(str(path), **spec)
+    return str(path)
+
+
+def get_entries(cache):
+    return sorted(p.name for p in pathlib.Path(cache.directory).glob("*.dtsc"))
+
+
+def read_cached(path, cache, lazy_meshes=False):
+    shape = TSShape(lazy_meshes=lazy_meshes)
+    shape.read_from_path(path, cache=cache)
+    return shape
+
+
+def forbid_file_reads(monkeypatch):
+    """make parsing the shape file fail, so only cache hits can read a shape"""
+    def read_path(self, path, use_mmap):
+        raise AssertionError("the shape was parsed instead of loaded from the cache")
+    monkeypatch.setattr(TSShape, "_read_path", read_path)
+
+
+def check_same_meshes(shape, path):
+    expected = TSShape()
+    with open(path, "rb") as f:
+        expected.read(f)
+    assert len(shape.meshes) == len(expected.meshes)
+    for mesh, expected_mesh in zip(shape.meshes, expected.meshes):
+        assert type(mesh) is type(expected_mesh)
+        if isinstance(mesh, TSMesh):
+            np.testing.assert_array_equal(mesh.vertices, expected_mesh.vertices)
+            np.testing.assert_array_equal(mesh.indices, expected_mesh.indices)
+
+
+def test_no_cache_unless_given(tmp_path, monkeypatch):
+    monkeypatch.setenv("DTST3D_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(shapecache, "_default_cache_from_env", True)
+    path = write_small_shape(tmp_path / "a.dts")
+    TSShape().read_from_path(path)
+    assert not (tmp_path / "cache").exists()
+    assert get_default_cache().directory == str(tmp_path / "cache")
+
+
+def test_hit(tmp_path, monkeypatch):
+    cache = ShapeCache(str(tmp_path / "cache"))
+    path = write_small_shape(tmp_path / "a.dts")
+    read_cached(path, cache)
+    assert len(get_entries(cache)) == 1
+
+    forbid_file_reads(monkeypatch)
+    shape = read_cached(path, cache)
+    check_same_meshes(shape, path)
+    assert shape.names == read_cached(path, cache).names
+
+
+def test_miss_after_the_file_changes(tmp_path):
+    cache = ShapeCache(str(tmp_path / "cache"))
+    path = write_small_shape(tmp_path / "a.dts")
+    read_cached(path, cache)
+    write_small_shape(tmp_path / "a.dts", num_objects=3)
+    shape = read_cached(path, cache)
+    assert len(shape.objects) == 3
+    assert len(get_entries(cache)) == 2
+
+
+def test_miss_after_the_parser_changes(tmp_path, monkeypatch):
+    cache = ShapeCache(str(tmp_path / "cache"))
+    path = write_small_shape(tmp_path / "a.dts")
+    read_cached(path, cache)
+    key = cache.get_key(path)
+
+    monkeypatch.setattr(shapecache, "PARSER_VERSION", "another parser")
+    assert cache.get_key(path) != key
+    read_cached(path, cache)
+    assert len(get_entries(cache)) == 2
+
+
+def test_eviction_under_the_size_cap(tmp_path, monkeypatch):
+    monkeypatch.setenv("DTST3D_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("DTST3D_CACHE_SIZE", "1")
+    monkeypatch.setattr(shapecache, "_default_cache_from_env", True)
+    cache = get_default_cache()
+    assert cache.max_size == 1024 * 1024
+
+    # each entry is about 400 KB, only the two most recent fit
+    paths = [write_small_shape(tmp_path / f"{x}.dts", verts_per_mesh=1024, num_sequences=1 + x) for x in range(4)]
+    for path in paths:
+        read_cached(path, cache)
+        assert sum(p.stat().st_size for p in pathlib.Path(cache.directory).glob("*.dtsc")) <= cache.max_size
+    assert get_entries(cache) == sorted(cache.get_key(path) + ".dtsc" for path in paths[-2:])
+
+    cache.clear()
+    assert get_entries(cache) == []
+
+
+def test_lazy_shapes_store_a_partial_entry(tmp_path, monkeypatch):
+    cache = ShapeCache(str(tmp_path / "cache"))
+    path = write_small_shape(tmp_path / "a.dts")
+
+    with read_cached(path, cache, lazy_meshes=True) as shape:
+        shape.meshes[0]
+        assert get_entries(cache) == [] # stored when closed
+    assert len(get_entries(cache)) == 1
+
+    forbid_file_reads(monkeypatch)
+    with read_cached(path, cache, lazy_meshes=True) as shape:
+        assert shape.meshes.num_decoded == 1
+        assert shape.meshes.is_decoded(0) and not shape.meshes.is_decoded(1)
+        # the other meshes are decoded from the shape file
+        check_same_meshes(shape, path)
+
+    # the entry was upgraded with every mesh when the shape was closed
+    with read_cached(path, cache, lazy_meshes=True) as shape:
+        assert shape.meshes.num_decoded == len(shape.meshes)
+
+
+def test_eager_reads_complete_a_partial_entry(tmp_path, monkeypatch):
+    cache = ShapeCache(str(tmp_path / "cache"))
+    path = write_small_shape(tmp_path / "a.dts")
+    with read_cached(path, cache, lazy_meshes=True) as shape:
+        shape.meshes[1]
+
+    forbid_file_reads(monkeypatch)
+    shape = read_cached(path, cache)
+    assert isinstance(shape.meshes, list)
+    check_same_meshes(shape, path)
+
+    # the eager read decoded the missing meshes and stored them
+    with read_cached(path, cache, lazy_meshes=True) as shape:
+        assert shape.meshes.num_decoded == len(shape.meshes)
+
+
+def test_loaded_sub_shapes_use_the_loaded_details(tmp_path):
+    cache = ShapeCache(str(tmp_path / "cache"))
+    path = write_small_shape(tmp_path / "a.dts")
+    read_cached(path, cache)
+    shape = read_cached(path, cache)
+    assert shape.num_sub_shapes == 1
+    details = shape.get_sub_shape_details(0)
+    assert len(details) == 2
+    assert all(any(detail is loaded for loaded in shape.details) for detail in details)
+    assert shape.get_sub_shape_for_object(1) == 0
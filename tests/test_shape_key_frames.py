@@ -0,0 +1,58 @@
+import numpy as np
+
+from io_scene_dtst3d.tsmesh import TSMesh, weld_vertices
+
+
+def make_animated_mesh(num_frames=4):
+    # vertices 0 and 3 match in every frame, vertices 1 and 4 only match in the first frame
+    base = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 1.0, 0.0], [-0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], dtype=np.float32)
+    frames = np.repeat(base[None], num_frames, axis=0)
+    frames += (np.arange(num_frames, dtype=np.float32) * 0.5)[:, None, None]
+    frames[1:, 4, 2] += 1.0
+    normals = np.tile(np.array([0.0, 0.0, 1.0], dtype=np.float32), (num_frames * len(base), 1))
+
+    mesh = TSMesh()
+    mesh.set_vertex_data(frames.reshape(-1, 3), normals, num_frames=num_frames)
+    return mesh, frames
+
+
+def test_frames_of_the_vertex_data():
+    mesh, frames = make_animated_mesh()
+    assert mesh.get_frame_count() == 4
+    np.testing.assert_array_equal(mesh.get_frame_vertices(0), frames[0])
+    keys = list(mesh.iter_frames_vertices())
+    assert len(keys) == 3
+    for key, frame in zip(keys, frames[1:]):
+        np.testing.assert_array_equal(key, frame)
+
+
+def test_welding_keeps_vertices_which_move_apart():
+    mesh, frames = make_animated_mesh()
+    first, remap = weld_vertices(mesh.get_frame_vertices(0), mesh.get_frame_normals(0))
+    assert remap.tolist() == [0, 1, 2, 0, 1]
+
+    first, remap = weld_vertices(mesh.get_frame_vertices(0), mesh.get_frame_normals(0), mesh.get_frame_digests())
+    assert first.tolist() == [0, 1, 2, 4]
+    assert remap.tolist() == [0, 1, 2, 0, 3]
+
+    # every original vertex finds its own position in every shape key through the remap
+    for key, frame in zip(mesh.iter_frames_vertices(first), frames[1:]):
+        np.testing.assert_array_equal(key[remap] + 0.0, frame + 0.0)
+
+
+def test_frames_one_at_a_time_match_all_at_once():
+    mesh, _ = make_animated_mesh(6)
+    first, _ = weld_vertices(mesh.get_frame_vertices(0), mesh.get_frame_normals(0), mesh.get_frame_digests())
+    together = list(mesh.iter_frames_vertices(first))
+    one_at_a_time = list(mesh.iter_frames_vertices(first, memory_limit=0))
+    assert len(together) == len(one_at_a_time) == 5
+    for a, b in zip(together, one_at_a_time):
+        assert a.dtype == b.dtype == np.float32 and a.flags.c_contiguous and b.flags.c_contiguous
+        np.testing.assert_array_equal(a, b)
+
+
+def test_mesh_without_vertex_animation_has_no_shape_keys():
+    mesh = TSMesh()
+    mesh.set_vertex_data(np.zeros((3, 3)), np.zeros((3, 3)))
+    assert mesh.get_frame_count() == 1
+    assert list(mesh.iter_frames_vertices()) == []
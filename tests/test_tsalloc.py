@@ -0,0 +1,30 @@
+import pytest
+
+from io_scene_dtst3d import tsalloc
+from io_scene_dtst3d.tsalloc import ShapeFormatError, TSAlloc
+
+
+def make_alloc(data: bytes) -> TSAlloc:
+    # only an 8-bit region
+    data += bytes(-len(data) % 4)
+    return TSAlloc(memoryview(data), len(data) // 4, 0, 0)
+
+
+@pytest.mark.parametrize("scan_size", [1, 3, 4096])
+def test_read8_strings(monkeypatch, scan_size):
+    monkeypatch.setattr(tsalloc, "_STRING_SCAN_SIZE", scan_size)
+    names = [b"Root", b"", b"Node1", b"a" * 300, b"Detail2"]
+    ts_alloc = make_alloc(b"\0".join(names) + b"\0" + b"\x01\x02")
+    assert ts_alloc.read8_strings(len(names)) == names
+    assert ts_alloc.ptr8 == sum(len(name) + 1 for name in names)
+    assert ts_alloc.read8_list(2) == [1, 2]
+
+
+def test_read8_strings_past_the_region():
+    ts_alloc = make_alloc(b"Root\0Node\0ab")
+    with pytest.raises(ShapeFormatError) as error:
+        ts_alloc.read8_strings(3)
+    assert error.value.region == "8-bit"
+    assert "ends after 2" in error.value.message
+    assert ts_alloc.ptr8 == 0
+    assert ts_alloc.read8_strings(0) == []
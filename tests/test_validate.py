@@ -0,0 +1,121 @@
+import json
+import struct
+
+import pytest
+
+from io_scene_dtst3d.shapefiles import find_shape_files
+from io_scene_dtst3d.tsshape import TSShape
+from io_scene_dtst3d.validate import get_summary, main, validate_buffer, validate_path
+
+
+def read_corpus_shape(small_corpus, name="v26_list_skinned.dts") -> bytes:
+    directory, _ = small_corpus
+    return (directory / name).read_bytes()
+
+
+def get_layout(data: bytes):
+    """size of the TSAlloc buffer and the file offsets of its 16 and 8-bit regions"""
+    size_mem_buffer, start_u16, start_u8 = struct.unpack_from('<iii', data, 4)
+    return size_mem_buffer * 4, 16 + start_u16 * 4, 16 + start_u8 * 4
+
+
+def get_issues(data: bytes):
+    return [(issue.kind, issue.region, issue.offset) for issue in validate_buffer(data).issues]
+
+
+def test_corpus_is_valid(small_corpus):
+    directory, shapes = small_corpus
+    for name in shapes:
+        result = validate_path(str(directory / name))
+        assert result.valid, result.to_dict()
+        assert result.version == shapes[name]["version"]
+
+
+def test_truncated_files(small_corpus):
+    data = read_corpus_shape(small_corpus)
+    buffer_size, _, _ = get_layout(data)
+    assert get_issues(data[:10]) == [("format", "header", 0)]
+    # the header promises a longer buffer
+    assert get_issues(data[:16 + buffer_size // 2]) == [("format", "header", 4)]
+    # the sequence count is the first value after the buffer
+    assert get_issues(data[:16 + buffer_size + 2]) == [("format", "sequences", 16 + buffer_size)]
+    assert [issue[:2] for issue in get_issues(data[:-1])] == [("format", "material list")]
+
+
+def test_corrupted_guards(small_corpus):
+    data = read_corpus_shape(small_corpus)
+    _, start16, start8 = get_layout(data)
+    # the first guard of each region is where the region starts
+    corrupted = bytearray(data)
+    corrupted[start16:start16 + 2] = struct.pack('<h', 7)
+    assert get_issues(bytes(corrupted)) == [("format", "16-bit", start16)]
+
+    corrupted = bytearray(data)
+    corrupted[start8] = 7
+    assert get_issues(bytes(corrupted)) == [("format", "8-bit", start8)]
+
+
+def test_counts_past_the_region(small_corpus):
+    data = bytearray(read_corpus_shape(small_corpus))
+    data[16:20] = struct.pack('<i', 1 << 20) # node count
+    issues = get_issues(bytes(data))
+    assert len(issues) == 1 and issues[0][:2] == ("format", "32-bit")
+
+
+def test_indices_out_of_range(small_corpus):
+    shape = TSShape()
+    shape.read_buffer(read_corpus_shape(small_corpus))
+    num_nodes = len(shape.nodes)
+    shape.nodes[1].parent_index = num_nodes + 5
+    shape.objects[0].node_index = num_nodes
+    shape.sequences[0].name_index = len(shape.names)
+
+    result = validate_buffer(shape.write_buffer(26))
+    assert [(issue.kind, issue.region, issue.offset) for issue in result.issues] == [("reference", "", -1)] * 3
+    assert [issue.message for issue in result.issues] == [
+        f"Node 1 has parent {num_nodes + 5} of {num_nodes}",
+        f"Object 0 has node {num_nodes} of {num_nodes}",
+        f"Sequence 0 has name {len(shape.names)} of {len(shape.names)}"]
+
+
+def test_unsupported_versions(small_corpus):
+    data = bytearray(read_corpus_shape(small_corpus))
+    for version in (18, 28):
+        data[0] = version
+        result = validate_buffer(bytes(data))
+        assert result.version == version
+        assert [(issue.kind, issue.region, issue.offset) for issue in result.issues] == [("unsupported", "header", 0)]
+
+
+def test_summary_and_exit_status(small_corpus, tmp_path, capsys):
+    data = read_corpus_shape(small_corpus)
+    (tmp_path / "good.dts").write_bytes(data)
+    (tmp_path / "bad.dts").write_bytes(data[:10])
+
+    output = tmp_path / "summary.json"
+    assert main([str(tmp_path / "good.dts"), "-j", "1", "-o", str(output)]) == 0
+    assert main([str(tmp_path), "-j", "1", "-o", str(output)]) == 1
+    summary = json.loads(output.read_text())
+    assert (summary["files"], summary["valid"], summary["invalid"]) == (2, 1, 1)
+    assert summary["issues"] == {"format": 1}
+    bad = next(result for result in summary["results"] if not result["valid"])
+    assert bad["path"] == str(tmp_path / "bad.dts")
+    assert bad["issues"] == [{"kind": "format", "message": bad["issues"][0]["message"], "region": "header", "offset": 0}]
+
+    capsys.readouterr()
+    assert main([str(tmp_path / "*.dts"), "-j", "1", "--failures-only"]) == 1
+    summary = json.loads(capsys.readouterr().out)
+    assert [result["path"] for result in summary["results"]] == [str(tmp_path / "bad.dts")]
+
+    missing = validate_path(str(tmp_path / "missing.dts"))
+    assert [issue.kind for issue in missing.issues] == ["io"]
+    assert get_summary([missing], 0.0)["issues"] == {"io": 1}
+
+
+def test_find_shape_files(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("a.dts", "B.DTS", "notes.txt", "sub/c.dts"):
+        (tmp_path / name).write_bytes(b"")
+    assert find_shape_files([str(tmp_path)]) == [str(tmp_path / "B.DTS"), str(tmp_path / "a.dts")]
+    assert find_shape_files([str(tmp_path)], recursive=True) == [str(tmp_path / "B.DTS"), str(tmp_path / "a.dts"), str(tmp_path / "sub" / "c.dts")]
+    assert find_shape_files([str(tmp_path / "**" / "*.dts"), str(tmp_path / "a.dts")]) == [str(tmp_path / "a.dts"), str(tmp_path / "sub" / "c.dts")]
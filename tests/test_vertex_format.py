@@ -0,0 +1,80 @@
+import io
+
+import numpy as np
+
+from io_scene_dtst3d.tsmesh import TSBasicVertexFormat, TSMesh, TSSkinnedMesh
+from io_scene_dtst3d.tsshape import TSShape
+
+
+def read_shape(path):
+    shape = TSShape()
+    shape.read(io.BytesIO(path.read_bytes()))
+    return shape
+
+
+def test_v27_vertex_format(small_corpus):
+    directory, shapes = small_corpus
+    for skinned in (False, True):
+        shape = read_shape(directory / f"v27_list_{'skinned' if skinned else 'static'}.dts")
+        vertex_format = shape.vertex_format
+        assert (vertex_format.tex_coord_offset, vertex_format.color_offset) == (48, 56)
+        assert vertex_format.num_bones == (1 if skinned else 0)
+        assert vertex_format.bone_offset == (60 if skinned else -1)
+        assert vertex_format.vertex_size == (80 if skinned else 60)
+        assert vertex_format.get_dtype().itemsize == vertex_format.vertex_size
+
+        # the meshes follow each other in the shape's vertex buffer
+        offset = 0
+        for mesh in shape.meshes:
+            if isinstance(mesh, TSMesh):
+                assert mesh.vertex_layout == (offset, len(mesh.vertices), vertex_format.vertex_size)
+                offset += len(mesh.vertices) * vertex_format.vertex_size
+
+
+def test_older_shapes_have_no_vertex_format(small_corpus):
+    directory, _ = small_corpus
+    shape = read_shape(directory / "v26_list_skinned.dts")
+    assert shape.vertex_format is None
+    assert all(mesh.vertex_layout == (-1, 0, 0) for mesh in shape.meshes if isinstance(mesh, TSMesh))
+
+
+def test_v27_vertex_records(small_corpus):
+    directory, _ = small_corpus
+    shape = read_shape(directory / "v27_strip_skinned.dts")
+    for mesh in shape.meshes:
+        if not isinstance(mesh, TSSkinnedMesh):
+            continue
+        records = mesh.get_vertex_records(shape.vertex_format)
+        assert records.dtype.itemsize == shape.vertex_format.vertex_size
+        np.testing.assert_array_equal(records["position"], mesh.vertices)
+        np.testing.assert_array_equal(records["normal"], mesh.normals)
+        np.testing.assert_array_equal(records["uv"], mesh.tvertices)
+        np.testing.assert_array_equal(records["uv2"], mesh.t2vertices)
+        assert not records["tangent"].any()
+
+        # every influence lands in the bone slots of its vertex
+        weights = records["bones"]["weights"].reshape(len(records), -1)
+        expected = np.bincount(mesh.vertex_indices, mesh.weights, minlength=len(records))
+        np.testing.assert_allclose(weights.sum(axis=1), expected, rtol=1e-6)
+        assert mesh.max_bones <= shape.vertex_format.num_bones * 4
+
+
+def test_format_for_written_meshes():
+    mesh = TSMesh()
+    mesh.set_vertex_data(np.zeros((3, 3)), np.zeros((3, 3)), np.zeros((3, 2)))
+    vertex_format = TSBasicVertexFormat.for_meshes([mesh])
+    assert (vertex_format.tex_coord_offset, vertex_format.bone_offset, vertex_format.num_bones) == (-1, -1, 0)
+    assert vertex_format.vertex_size == TSBasicVertexFormat.BaseSize
+
+    skinned = TSSkinnedMesh()
+    skinned.set_vertex_data(np.zeros((2, 3)), np.zeros((2, 3)), colors=np.ones((2, 4)))
+    skinned.set_skin_data([0, 1, 2, 3, 4], [0] * 5 + [1], [0, 1, 2, 3, 4, 0], [0.2] * 5 + [1.0])
+    vertex_format = TSBasicVertexFormat.for_meshes([mesh, skinned])
+    assert (vertex_format.tex_coord_offset, vertex_format.color_offset) == (48, 56)
+    assert (vertex_format.bone_offset, vertex_format.num_bones) == (60, 2)
+    assert vertex_format.vertex_size == 60 + 2 * TSBasicVertexFormat.BoneSize
+
+    records = skinned.get_vertex_records(vertex_format)
+    assert records["color"].tolist() == [[255] * 4] * 2
+    assert records["bones"]["indices"][0].ravel().tolist() == [0, 1, 2, 3, 4, 0, 0, 0]
+    np.testing.assert_allclose(records["bones"]["weights"][1].ravel(), [1.0] + [0.0] * 7)
@@ -0,0 +1,52 @@
+import numpy as np
+
+from io_scene_dtst3d.tsmesh import TSSkinnedMesh, weld_vertices
+
+
+def make_skinned_quad():
+    # two triangles with a seam, vertices 3 and 4 repeat vertices 0 and 2 with other texture coordinates
+    mesh = TSSkinnedMesh()
+    positions = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 1.0, 0.0), (0.0, 0.0, 0.0), (1.0, 1.0, 0.0), (0.0, 1.0, 0.0)]
+    normals = [(0.0, 0.0, 1.0)] * len(positions)
+    uvs = [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.5, 0.0), (0.5, 1.0), (0.0, 1.0)]
+    mesh.set_vertex_data(positions, normals, uvs)
+    vertex_indices = [0, 0, 1, 2, 3, 3, 4, 5, 5, 2]
+    bone_indices =   [0, 1, 0, 1, 0, 1, 1, 0, 5, 0]
+    weights =        [0.25, 0.75, 1.0, 1.0, 0.25, 0.75, 1.0, 0.5, 0.5, 0.0]
+    mesh.set_skin_data([10, 11], vertex_indices, bone_indices, weights)
+    return mesh
+
+
+def as_influences(weight_groups):
+    return sorted((vertex, bone, weight) for bone, weight, vertices in weight_groups for vertex in vertices)
+
+
+def test_groups_hold_each_influence_once():
+    mesh = make_skinned_quad()
+    weight_groups = mesh.get_weight_groups(len(mesh.vertices))
+    # bone 5 doesn't exist, its influence is dropped
+    assert as_influences(weight_groups) == [
+        (0, 0, 0.25), (0, 1, 0.75), (1, 0, 1.0), (2, 0, 0.0), (2, 1, 1.0),
+        (3, 0, 0.25), (3, 1, 0.75), (4, 1, 1.0), (5, 0, 0.5)]
+    # one group per bone and weight
+    assert [(bone, weight) for bone, weight, _ in weight_groups] == [
+        (0, 0.0), (0, 0.25), (0, 0.5), (0, 1.0), (1, 0.75), (1, 1.0)]
+    assert [vertices for bone, weight, vertices in weight_groups if (bone, weight) == (0, 0.25)] == [[0, 3]]
+
+
+def test_welded_duplicates_keep_one_influence_per_bone():
+    mesh = make_skinned_quad()
+    first, remap = weld_vertices(mesh.vertices, mesh.normals)
+    assert remap.tolist() == [0, 1, 2, 0, 2, 3]
+
+    weight_groups = mesh.get_weight_groups(len(first), remap)
+    assert as_influences(weight_groups) == [
+        (0, 0, 0.25), (0, 1, 0.75), (1, 0, 1.0), (2, 0, 0.0), (2, 1, 1.0), (3, 0, 0.5)]
+
+
+def test_out_of_range_vertices_are_dropped():
+    mesh = make_skinned_quad()
+    assert as_influences(mesh.get_weight_groups(2)) == [(0, 0, 0.25), (0, 1, 0.75), (1, 0, 1.0)]
+
+    empty = TSSkinnedMesh()
+    assert empty.get_weight_groups(0) == []
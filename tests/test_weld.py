@@ -0,0 +1,58 @@
+import numpy as np
+
+from io_scene_dtst3d.tsmesh import weld_vertices
+
+
+def test_negative_zero_welds_with_zero():
+    positions = np.array([[0.0, 1.0, -0.0], [-0.0, 1.0, 0.0]], dtype=np.float32)
+    normals = np.array([[0.0, -0.0, 1.0], [-0.0, 0.0, 1.0]], dtype=np.float32)
+    first, remap = weld_vertices(positions, normals)
+    assert first.tolist() == [0]
+    assert remap.tolist() == [0, 0]
+
+
+def test_welded_vertices_keep_first_use_order():
+    # sorting the packed keys would put vertex 2 first, welding keeps the original order
+    positions = np.array([[5.0, 0.0, 0.0], [1.0, 0.0, 0.0], [-3.0, 0.0, 0.0], [5.0, 0.0, 0.0], [1.0, 0.0, 0.0]], dtype=np.float32)
+    normals = np.zeros_like(positions)
+    normals[:, 2] = 1.0
+    first, remap = weld_vertices(positions, normals)
+    assert first.tolist() == [0, 1, 2]
+    assert remap.tolist() == [0, 1, 2, 0, 1]
+
+
+def test_normals_and_digests_keep_vertices_apart():
+    positions = np.zeros((3, 3), dtype=np.float32)
+    normals = np.array([[0.0, 0.0, 1.0], [0.0, 0.0, -1.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+    first, remap = weld_vertices(positions, normals)
+    assert first.tolist() == [0, 1]
+    assert remap.tolist() == [0, 1, 0]
+
+    first, remap = weld_vertices(positions, normals, np.array([7, 7, 8], dtype=np.uint64))
+    assert first.tolist() == [0, 1, 2]
+
+
+def test_remapped_triangles_match_the_original_ones():
+    rng = np.random.default_rng(0)
+    # few distinct values so many vertices match exactly
+    positions = rng.integers(-2, 3, (300, 3)).astype(np.float32)
+    positions[rng.random(positions.shape) < 0.2] *= -1.0 # mixes in -0.0
+    normals = np.zeros_like(positions)
+    normals[:, 2] = rng.integers(0, 2, 300) * 2.0 - 1.0
+    triangles = rng.integers(0, 300, (500, 3))
+
+    first, remap = weld_vertices(positions, normals)
+    assert len(first) < len(positions)
+    assert len(np.unique(remap)) == len(first)
+
+    welded = remap[triangles]
+    np.testing.assert_array_equal(positions[first][welded] + 0.0, positions[triangles] + 0.0)
+    np.testing.assert_array_equal(normals[first][welded], normals[triangles])
+    # each welded vertex is used before the next one is introduced
+    assert (np.maximum.accumulate(remap) - remap >= 0).all()
+    assert np.diff(np.maximum.accumulate(remap)).max() <= 1
+
+
+def test_no_vertices():
+    first, remap = weld_vertices(np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.float32))
+    assert len(first) == 0 and len(remap) == 0
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from io_scene_dtst3d.tsmesh import TSDrawPrimitive, TSDrawPrimitiveType, TSMesh, TSNullMesh, TSSkinnedMesh
+from io_scene_dtst3d.tsshape import SequenceFlags, SequenceKeyframes, TQuaternion16, TSShape, check_round_trip
+
+WRITE_VERSIONS = (24, 25, 26, 27)
+TRIANGLES = TSDrawPrimitiveType.Triangles | TSDrawPrimitiveType.Indexed
+
+
+def make_quad_mesh(mesh_class=TSMesh, offset=0.0):
+    mesh = mesh_class()
+    positions = np.array([(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 1.0, 0.0), (0.0, 1.0, 0.0)]) + offset
+    normals = np.tile([0.0, 0.0, 1.0], (4, 1))
+    uvs = [(0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)]
+    mesh.set_vertex_data(positions, normals, uvs)
+    return mesh
+
+
+def build_shape(no_material=False):
+    shape = TSShape()
+    root = shape.add_node("Root")
+    arm = shape.add_node("Arm", root, rotation=(0, 0, 0x5a82, 0x5a82), translation=(0.0, 0.0, 2.0))
+
+    if no_material:
+        material_flags = [TSDrawPrimitiveType.NoMaterial, TSDrawPrimitiveType.NoMaterial]
+    else:
+        material_flags = [shape.add_material("Metal"), shape.add_material("Paint")]
+
+    body = make_quad_mesh()
+    body.set_primitives([0, 1, 2, 0, 2, 3], [TSDrawPrimitive(0, 3, TRIANGLES | material_flags[0]),
+                                             TSDrawPrimitive(3, 3, TRIANGLES | material_flags[1])])
+    body_low = make_quad_mesh()
+    body_low.set_primitives([0, 1, 2], [TSDrawPrimitive(0, 3, TRIANGLES | material_flags[0])])
+    shape.add_object("Body", root, [body, body_low])
+
+    skin = make_quad_mesh(TSSkinnedMesh, offset=3.0)
+    skin.set_primitives([0, 1, 2, 0, 2, 3], [TSDrawPrimitive(0, 6, TRIANGLES | material_flags[1])])
+    skin.set_skin_data([root, arm], [0, 1, 2, 3, 3], [0, 0, 1, 1, 0], [1.0, 1.0, 1.0, 0.5, 0.5])
+    shape.add_object("Sleeve", arm, [skin, TSNullMesh()])
+
+    shape.add_sub_shape(0, 2, 0, 2)
+    shape.add_detail("Detail32", 32.0, object_detail_num=0, poly_count=4)
+    shape.add_detail("Detail8", 8.0, object_detail_num=1, poly_count=1)
+
+    keyframes = SequenceKeyframes()
+    keyframes.rotation_nodes = np.array([arm])
+    keyframes.rotations = np.array([[(0, 0, 0, TQuaternion16.MAX_VALUE), (0, 0, 0x5a82, 0x5a82), (0, 0, 0x7fff, 0)]])
+    keyframes.translation_nodes = np.array([arm])
+    keyframes.translations = np.array([[(0.0, 0.0, 2.0), (0.0, 0.5, 2.0), (0.0, 1.0, 2.0)]])
+    shape.add_sequence("Wave", keyframes, 1.5, SequenceFlags.Cyclic)
+
+    shape.set_bounds(np.concatenate([body.vertices, skin.vertices]))
+    return shape
+
+
+def check_same_shape(written, shape):
+    assert written.names == shape.names
+    assert [(node.name_index, node.parent_index) for node in written.nodes] == [(node.name_index, node.parent_index) for node in shape.nodes]
+    np.testing.assert_array_equal(written.default_rotations, shape.default_rotations)
+    np.testing.assert_array_equal(written.default_translations, shape.default_translations)
+    assert [material.name for material in written.materials] == [material.name for material in shape.materials]
+    assert [(detail.name_index, detail.size, detail.object_detail_num) for detail in written.details] == \
+           [(detail.name_index, detail.size, detail.object_detail_num) for detail in shape.details]
+
+    assert len(written.meshes) == len(shape.meshes)
+    for written_mesh, mesh in zip(written.meshes, shape.meshes):
+        assert type(written_mesh) is type(mesh)
+        if not isinstance(mesh, TSMesh):
+            continue
+        np.testing.assert_array_equal(written_mesh.vertices, mesh.vertices)
+        np.testing.assert_array_equal(written_mesh.normals, mesh.normals)
+        np.testing.assert_array_equal(written_mesh.tvertices, mesh.tvertices)
+        np.testing.assert_array_equal(written_mesh.indices, mesh.indices)
+        triangles, materials = written_mesh.get_triangles()
+        expected_triangles, expected_materials = mesh.get_triangles()
+        np.testing.assert_array_equal(triangles, expected_triangles)
+        np.testing.assert_array_equal(materials, expected_materials)
+        if isinstance(mesh, TSSkinnedMesh):
+            np.testing.assert_array_equal(written_mesh.node_indices, mesh.node_indices)
+            np.testing.assert_array_equal(written_mesh.vertex_indices, mesh.vertex_indices)
+            np.testing.assert_array_equal(written_mesh.bone_indices, mesh.bone_indices)
+            np.testing.assert_array_equal(written_mesh.weights, mesh.weights)
+
+    assert len(written.sequences) == 1
+    written_keyframes = written.get_sequence_keyframes(written.sequences[0])
+    keyframes = shape.get_sequence_keyframes(shape.sequences[0])
+    np.testing.assert_array_equal(written_keyframes.rotations, keyframes.rotations)
+    np.testing.assert_array_equal(written_keyframes.translations, keyframes.translations)
+    assert written.sequences[0].duration == shape.sequences[0].duration
+
+
+@pytest.mark.parametrize("version", WRITE_VERSIONS)
+def test_built_shape_round_trips(version):
+    shape = build_shape()
+    written = check_round_trip(shape.write_buffer(version))
+    check_same_shape(written, shape)
+    assert written.get_sub_shape_details(0) == written.details
+    assert (written.vertex_format is not None) == (version >= 27)
+
+
+@pytest.mark.parametrize("version", WRITE_VERSIONS)
+def test_primitives_without_material_round_trip(version):
+    shape = build_shape(no_material=True)
+    written = check_round_trip(shape.write_buffer(version))
+    check_same_shape(written, shape)
+    assert len(written.materials) == 0
+    for mesh in written.meshes:
+        if isinstance(mesh, TSMesh):
+            assert all(prim.has_no_material for prim in mesh.primitives)
+            assert (mesh.get_triangles()[1] == -1).all()
+
+
+@pytest.mark.parametrize("version", WRITE_VERSIONS)
+def test_read_shapes_are_written_back_unchanged(small_corpus, version):
+    directory, shapes = small_corpus
+    for name, spec in shapes.items():
+        if spec["version"] != version:
+            continue
+        data = (directory / name).read_bytes()
+        shape = TSShape()
+        shape.read_buffer(data)
+        assert shape.write_buffer(version) == data
+
+
+def test_unsupported_versions_are_refused():
+    shape = build_shape()
+    for version in (23, 28):
+        with pytest.raises(ValueError):
+            shape.write_buffer(version)
+